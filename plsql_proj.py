@@ -1,20 +1,74 @@
 """
 library_gui.py
-Single-file Tkinter GUI for librarydb (MySQL).
+Single-file Tkinter GUI for librarydb (MySQL, or embedded SQLite with --backend sqlite).
 Features:
  - Add members
  - Add publishers/authors/books and book copies
  - Issue books (select available copy)
  - Return books and calculate fine
  - View lists (Members, Books, Copies, Issued records)
+ - Headless bulk catalog import:  python plsql_proj.py import books.csv
+ - Circulation analytics (turnover, top titles, idle copies):  Analytics tab, or  python plsql_proj.py analytics
+ - Streaming exports:  python plsql_proj.py export loans loans.csv.gz --from 2024-01-01 [--member-id N]
+ - Embedded SQLite mode, no server needed:  python plsql_proj.py --backend sqlite [--sqlite-path :memory:]
+ - Instrumentation: --metrics / --metrics-dump metrics.json / --slow-query-ms N (also in the Logs tab)
 Configure DB connection below.
 """
 
-import mysql.connector
-from mysql.connector import errorcode
+import time
+_PROCESS_T0 = time.perf_counter()  # cold-start clock for the GUI's startup budget
+
+import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import date, timedelta, datetime
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import bisect
+import csv
+import gzip
+import heapq
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import types
+import unicodedata
+import urllib.parse
+
+# Slow or optional imports happen on first use so the GUI starts fast: mysql.connector is only
+# needed by the MySQL backend, numpy (optional) only to vectorize batch computations.
+mysql = None
+np = None
+
+def _mysql_connector():
+    """mysql.connector, or None if it isn't installed."""
+    global mysql
+    if mysql is None:
+        try:
+            import mysql.connector
+            import mysql.connector.errorcode
+        except ImportError:
+            return None
+    return mysql.connector
+
+def _numpy():
+    """numpy, or None if it isn't installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = False
+    return np or None
 
 # ----- CONFIG -----
 DB_CONFIG = {
@@ -25,30 +79,872 @@ DB_CONFIG = {
     "auth_plugin": "mysql_native_password"
 }
 
-# Set to True if you want this script to create tables (runs CREATE TABLE if not exists)
+# Storage backend: "mysql" (DB_CONFIG) or "sqlite" (embedded, zero setup; file path or ":memory:")
+DB_BACKEND = "mysql"
+SQLITE_PATH = "librarydb.sqlite3"
+SQLITE_BUSY_TIMEOUT = 5  # seconds a writer waits for the database lock
+
+# Set to True if you want this script to create tables (runs CREATE TABLE if not exists).
+# The SQLite backend always does.
 CREATE_SCHEMA = False
 
 # Fine policy
 FINE_PER_DAY = 5  # currency units per overdue day
+FINE_GRACE_DAYS = 0  # overdue days not charged
+FINE_CAP = None      # max fine per loan (None = no cap)
 DEFAULT_LOAN_DAYS = 14
+
+# Connection pool
+POOL_SIZE = 5                 # max open connections
+POOL_BORROW_TIMEOUT = 10      # seconds to wait for a free connection
+POOL_HEALTH_CHECK_AFTER = 30  # ping connections that sat idle longer than this (seconds)
+
+# Max rows per multi-row INSERT
+INSERT_CHUNK = 1000
+
+# Publisher/author name -> id cache (entries per table), and whether to preload it at startup
+NAME_CACHE_SIZE = 5000
+NAME_CACHE_WARM = False
+
+# Catalog search: max results, min term length for typo matching, max tokens a prefix expands to
+SEARCH_LIMIT = 50
+SEARCH_TYPO_MIN_LEN = 4
+SEARCH_MAX_EXPANSIONS = 2000
+
+# Dashboard stats snapshot lifetime (seconds)
+STATS_TTL = 60
+
+# Catalog paging
+CATALOG_PAGE_SIZE = 200
+
+# GUI tables: rows fetched per page, and how many unseen rows to keep loaded below the viewport
+GUI_PAGE_SIZE = 100
+GUI_PREFETCH_ROWS = 50
+
+# GUI background DB work: worker threads, and how often Tk picks up finished results (ms)
+DB_WORKERS = 4
+RESULT_POLL_MS = 30
+
+# Bulk import
+IMPORT_BATCH_SIZE = 500   # records per transaction
+
+# Circulation analytics (Analytics tab / `analytics`): loan rows per fetch while loading history,
+# days without a loan before an available copy counts as idle, and the length of top-N lists
+ANALYTICS_CHUNK = 50000
+ANALYTICS_IDLE_DAYS = 180
+ANALYTICS_TOP_N = 20
+ANALYTICS_GAP_WINDOW = 1000  # on the first load, ids missing among the newest this many may still commit
+
+# "Also borrowed" index: a new loan pairs its book with the member's previous CO_BORROW_WINDOW
+# loans; each book keeps its CO_BORROW_CAP strongest pairs at most (the weakest are pruned), so
+# memory is bounded by books x CO_BORROW_CAP. Saved to CO_BORROW_PATH (None = memory only).
+# A background thread catches it up with the journal right after each local issue, and every
+# CO_BORROW_POLL seconds for everyone else's.
+CO_BORROW_WINDOW = 10
+CO_BORROW_CAP = 64
+CO_BORROW_TOP_K = 8
+CO_BORROW_PATH = "librarydb_coborrow.json"
+CO_BORROW_POLL = 5
+
+# Streaming exports: rows per fetchmany() round trip, and how often progress is reported
+EXPORT_CHUNK = 5000
+EXPORT_PROGRESS_EVERY = 50000
+
+# Instrumentation (also --metrics): statements slower than SLOW_QUERY_MS go to the slow-query
+# log (last SLOW_LOG_SIZE kept in memory, appended as JSON lines to SLOW_QUERY_LOG if set)
+METRICS_ENABLED = False
+SLOW_QUERY_MS = 200
+SLOW_LOG_SIZE = 200
+SLOW_QUERY_LOG = None
+
+# History archival: returned loans older than this many days move to IssueReturnArchive, in
+# batches of ARCHIVE_BATCH rows (one short transaction each) with ARCHIVE_PAUSE seconds between
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH = 1000
+ARCHIVE_PAUSE = 0.05
+
+# Circulation event journal: how often the GUI tails it (ms), and how long a consumer waits for a
+# sequence gap (a write still committing) to fill before skipping it as rolled back (seconds)
+EVENT_POLL_MS = 3000
+EVENT_GAP_GRACE = 10
+
+# Headless HTTP/JSON service (`serve`) and the GUI's thin-client mode (--server URL)
+SERVICE_HOST = "127.0.0.1"   # local only by default; there is no TLS
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 16         # request threads (DB work is still bounded by POOL_SIZE)
+SERVICE_TOKEN = None         # if set, clients must send "Authorization: Bearer <token>"
+SERVICE_TIMEOUT = 30         # client request timeout (seconds)
+
+# Write-behind desk mode (--write-behind): issues and returns go to a local SQLite journal and are
+# answered at once; a flusher replays them to the database in batches, each op with an
+# idempotency key so a replay after a crash or timeout never applies twice
+WRITE_BEHIND = False
+WRITE_BEHIND_PATH = "librarydb_desk_journal.sqlite3"
+WRITE_BEHIND_BATCH = 50
+WRITE_BEHIND_RETRY = (1, 30)  # seconds before retrying a failed flush, doubling up to the max
+WRITE_BEHIND_KEEP_DAYS = 7    # synced ops stay in the local journal this long
+WRITE_BEHIND_MAX_ATTEMPTS = 5  # an op that keeps failing (not just the database being down) is set aside as failed
+WRITE_BEHIND_POLL_MS = 500    # how often the GUI picks up sync outcomes
+
+# GUI startup: each tab loads its data the first time it is shown, and the dashboard first shows
+# the counts cached by the previous run (None disables the cache). Time from process start to the
+# first live data is checked against STARTUP_BUDGET_MS; background work (search index, event
+# tail) starts STARTUP_DEFER_MS after the window is up so it doesn't compete with the first tab.
+DASHBOARD_SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".librarydb_dashboard.json")
+STARTUP_BUDGET_MS = 1500
+STARTUP_DEFER_MS = 500
 # -------------------
 
+# ---------- METRICS ----------
+# Off by default. When off, the only cost is a check of the module-level _metrics (None):
+# cursors come back unwrapped and the timing hooks return straight away.
+_HIST_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def _param_shape(params):
+    # "(int, str[12], None)" — types and sizes of bound parameters, never their values;
+    # long lists (multi-row VALUES, IN lists) become per-type counts: "[3000 params: int x2000, str x1000]"
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    if len(params) > 16:
+        counts = {}
+        for v in params:
+            t = type(v).__name__
+            counts[t] = counts.get(t, 0) + 1
+        return f"[{len(params)} params: " + ", ".join(f"{t} x{n}" for t, n in counts.items()) + "]"
+    parts = []
+    for v in params:
+        t = "None" if v is None else (f"str[{len(v)}]" if isinstance(v, str) else type(v).__name__)
+        if parts and parts[-1][0] == t:
+            parts[-1][1] += 1
+        else:
+            parts.append([t, 1])
+    return "(" + ", ".join(t if n == 1 else f"{t} x{n}" for t, n in parts) + ")"
+
+class Metrics:
+    """Per-operation counters and latency histograms, plus a ring buffer of slow statements."""
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log_size=SLOW_LOG_SIZE, slow_log_path=SLOW_QUERY_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+        self._ops = {}  # name -> [count, total_s, max_s, errors, buckets]
+        self.slow = deque(maxlen=slow_log_size)
+
+    def record(self, name, seconds, error=False):
+        ms = seconds * 1000
+        with self._lock:
+            op = self._ops.get(name)
+            if op is None:
+                op = self._ops[name] = [0, 0.0, 0.0, 0, [0] * (len(_HIST_BOUNDS_MS) + 1)]
+            op[0] += 1
+            op[1] += seconds
+            if seconds > op[2]:
+                op[2] = seconds
+            if error:
+                op[3] += 1
+            op[4][bisect.bisect_left(_HIST_BOUNDS_MS, ms)] += 1
+
+    def record_sql(self, name, sql, params, seconds, error=False):
+        self.record(name, seconds, error)
+        ms = seconds * 1000
+        if ms >= self.slow_ms:
+            entry = {"at": datetime.now().isoformat(timespec="milliseconds"), "op": name, "ms": round(ms, 2),
+                     "sql": " ".join(sql.split())[:500], "params": _param_shape(params)}
+            with self._lock:
+                self.slow.append(entry)
+                if self.slow_log_path:
+                    with open(self.slow_log_path, "a", encoding="utf-8") as fh:
+                        fh.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def _quantile(buckets, count, q):
+        # upper bound of the histogram bucket holding the q-th sample
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= q * count:
+                return _HIST_BOUNDS_MS[i] if i < len(_HIST_BOUNDS_MS) else None
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            ops = {k: (v[0], v[1], v[2], v[3], list(v[4])) for k, v in self._ops.items()}
+            slow = list(self.slow)
+        out = {}
+        for name, (count, total, mx, errors, buckets) in sorted(ops.items()):
+            out[name] = {"count": count, "errors": errors, "total_ms": round(total * 1000, 2),
+                         "mean_ms": round(total * 1000 / count, 3), "max_ms": round(mx * 1000, 3),
+                         "p50_le_ms": self._quantile(buckets, count, 0.5),
+                         "p95_le_ms": self._quantile(buckets, count, 0.95),
+                         "histogram": {f"le_{b}": n for b, n in zip(_HIST_BOUNDS_MS + ("inf",), buckets) if n}}
+        return {"since": self.started.isoformat(timespec="seconds"), "slow_query_ms": self.slow_ms,
+                "operations": out, "slow_queries": slow}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, indent=2)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+            self.slow.clear()
+            self.started = datetime.now()
+
+_metrics = None
+
+def enable_metrics(**kwargs):
+    """Start collecting (kwargs go to Metrics). Connections borrowed from now on are timed."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(**kwargs)
+    return _metrics
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+def get_metrics():
+    return _metrics
+
+def _caller_name(depth=2):
+    code = sys._getframe(depth).f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+class _TimedCursor:
+    """Cursor proxy that times execute/fetch calls, keyed by the calling function."""
+    def __init__(self, cur, metrics):
+        self._cur = cur
+        self._metrics = metrics
+        self._op = "?"
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def _execute(self, method, sql, params):
+        self._op = _caller_name(3)
+        t = time.perf_counter()
+        error = False
+        try:
+            return method(sql, params) if params is not None else method(sql)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._metrics.record_sql(f"sql.execute {self._op}", sql, params, time.perf_counter() - t, error)
+
+    def execute(self, sql, params=None):
+        return self._execute(self._cur.execute, sql, params)
+
+    def executemany(self, sql, seq):
+        return self._execute(self._cur.executemany, sql, seq)
+
+    def _fetch(self, method, *args):
+        t = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._metrics.record(f"sql.fetch {self._op}", time.perf_counter() - t)
+
+    def fetchone(self):
+        return self._fetch(self._cur.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cur.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cur.fetchall)
+
+def timed(name=None):
+    """Decorator: record the call's duration as an operation while metrics are on."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+        def inner(*args, **kwargs):
+            m = _metrics
+            if m is None:
+                return fn(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                m.record(label, time.perf_counter() - t)
+        inner.__name__ = fn.__name__
+        inner.__qualname__ = fn.__qualname__
+        inner.__doc__ = fn.__doc__
+        return inner
+    return wrap
+
 # ---------- DB HELPERS ----------
+# ---------- BACKENDS ----------
+# LibraryDB speaks MySQL-flavoured SQL with %s placeholders. A backend owns connecting, the
+# schema, and the few operations that can't be written portably; the SQLite backend also
+# rewrites the MySQL-isms in each statement.
+class Backend(ABC):
+    name = None
+    auto_create = False       # create/upgrade the schema on startup
+    max_connections = None    # cap on the pool size, if the backend needs one
+
+    @abstractmethod
+    def connect(self):
+        """A new DB-API connection."""
+
+    @abstractmethod
+    def schema(self):
+        """CREATE TABLE statements for an empty database."""
+
+    @abstractmethod
+    def is_duplicate_key(self, err):
+        """True if err is a unique-key violation."""
+
+    @abstractmethod
+    def claim_any_copy(self, cur, book_id):
+        """Mark one available copy of book_id as Issued in a single statement; its copy_id or None."""
+
+    @abstractmethod
+    def consecutive_insert_ids(self, cur):
+        """True if a multi-row INSERT always gets consecutive AUTO_INCREMENT ids."""
+
+    @abstractmethod
+    def first_insert_id(self, cur, rows):
+        """id of the first row of the multi-row INSERT just run on cur."""
+
+    @abstractmethod
+    def explain(self, cur, sql, params):
+        """Plan summary for sql: {"type", "key", "rows", "uses_index"}."""
+
+    @abstractmethod
+    def is_transient(self, err):
+        """True if err means the database was unreachable or busy (lost connection, lock timeout,
+        deadlock), so the same statement may well succeed when retried."""
+
+class MySQLBackend(Backend):
+    name = "mysql"
+
+    def __init__(self, config=None):
+        self.config = config or DB_CONFIG
+
+    def connect(self):
+        connector = _mysql_connector()
+        if connector is None:
+            raise RuntimeError("mysql-connector-python is not installed (or use --backend sqlite).")
+        try:
+            conn = connector.connect(**self.config)
+            return conn
+        except connector.Error as err:
+            if err.errno == connector.errorcode.ER_ACCESS_DENIED_ERROR:
+                raise RuntimeError("DB access denied — check username/password.")
+            elif err.errno == connector.errorcode.ER_BAD_DB_ERROR:
+                raise RuntimeError(f"Database '{self.config['database']}' does not exist.")
+            else:
+                raise
+
+    def schema(self):
+        return MYSQL_SCHEMA
+
+    def is_duplicate_key(self, err):
+        return mysql is not None and isinstance(err, mysql.connector.IntegrityError) \
+            and err.errno == mysql.connector.errorcode.ER_DUP_ENTRY
+
+    def claim_any_copy(self, cur, book_id):
+        # LAST_INSERT_ID(copy_id) hands the claimed copy_id back without a second lookup
+        cur.execute("""
+            UPDATE BookCopies SET availability='Issued', copy_id = LAST_INSERT_ID(copy_id)
+            WHERE book_id = %s AND availability='Available'
+            ORDER BY copy_id LIMIT 1
+        """, (book_id,))
+        return cur.lastrowid if cur.rowcount == 1 else None
+
+    def consecutive_insert_ids(self, cur):
+        # only guaranteed for "simple inserts" with innodb_autoinc_lock_mode 0 or 1
+        cur.execute("SELECT @@innodb_autoinc_lock_mode")
+        return cur.fetchone()[0] in (0, 1)
+
+    def first_insert_id(self, cur, rows):
+        return cur.lastrowid
+
+    def explain(self, cur, sql, params):
+        cur.execute("EXPLAIN " + sql, params)
+        plan = cur.fetchall()
+        first = plan[0] if plan else {}
+        if not isinstance(first, dict):
+            first = dict(zip([d[0] for d in cur.description], first))
+        key = first.get('key')
+        return {"type": first.get('type'), "key": key, "rows": first.get('rows'),
+                "uses_index": bool(key) or first.get('type') not in ('ALL', None)}
+
+    def is_transient(self, err):
+        connector = _mysql_connector()
+        if connector is None or not isinstance(err, connector.Error):
+            return False
+        # 1205 lock wait timeout, 1213 deadlock
+        return isinstance(err, (connector.OperationalError, connector.InterfaceError)) \
+            or err.errno in (1205, 1213)
+
+_SQLITE_REWRITES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bINSERT IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\s+LOCK IN SHARE MODE", re.I), ""),
+    (re.compile(r"\s+FOR UPDATE\s*$", re.I), ""),
+    (re.compile(r"ON DUPLICATE KEY UPDATE\s+\w+\s*=\s*\w+", re.I), "ON CONFLICT DO NOTHING"),
+    (re.compile(r"GROUP_CONCAT\((.+?)\s+SEPARATOR\s+('[^']*')\)", re.I | re.S), r"GROUP_CONCAT(\1, \2)"),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+    (re.compile(r"\bDATEDIFF\(([^,()]+),\s*([^,()]+)\)", re.I), r"CAST(julianday(\1) - julianday(\2) AS INTEGER)"),
+]
+# statements that need the write lock; SELECT ... FOR UPDATE takes it too, since SQLite has no row locks
+_SQLITE_WRITE_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|ALTER|DROP)\b|\bFOR UPDATE\s*$", re.I)
+
+@lru_cache(maxsize=1024)
+def _sqlite_sql(sql):
+    for pattern, repl in _SQLITE_REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+def _dict_row(cur, row):
+    return {d[0]: v for d, v in zip(cur.description, row)}
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+
+class _SQLiteCursor:
+    """DB-API cursor with the mysql.connector surface LibraryDB uses (dictionary rows, %s)."""
+    def __init__(self, conn, dictionary=False):
+        self._raw_conn = conn
+        self._cur = conn.cursor()
+        if dictionary:
+            self._cur.row_factory = _dict_row
+
+    def _begin_for(self, sql):
+        # writes take the write lock up front (BEGIN IMMEDIATE) so a transaction never
+        # deadlocks upgrading from a read lock; reads outside a transaction just autocommit
+        if not self._raw_conn.in_transaction and _SQLITE_WRITE_RE.search(sql):
+            self._cur.execute("BEGIN IMMEDIATE")
+
+    def execute(self, sql, params=()):
+        self._begin_for(sql)
+        self._cur.execute(_sqlite_sql(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq):
+        self._begin_for(sql)
+        self._cur.executemany(_sqlite_sql(sql), seq)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cur.fetchmany(size)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+class SQLiteConnection:
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, dictionary=False, buffered=None, **_):
+        return _SQLiteCursor(self._raw, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, **_):
+        self._raw.execute("SELECT 1")
+
+    def close(self):
+        self._raw.close()
+
+class SQLiteBackend(Backend):
+    name = "sqlite"
+    auto_create = True
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        # every ":memory:" connection is its own database, so the pool must share one
+        self.max_connections = 1 if self.path == ":memory:" else None
+        if sqlite3.sqlite_version_info < (3, 35):
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old; 3.35+ is required.")
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        pragmas = ["PRAGMA foreign_keys = ON",
+                   f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT * 1000)}",
+                   "PRAGMA cache_size = -65536",     # 64 MiB page cache
+                   "PRAGMA temp_store = MEMORY"]
+        if self.path != ":memory:":
+            pragmas += ["PRAGMA journal_mode = WAL",  # readers don't block the writer
+                        "PRAGMA synchronous = NORMAL",  # durable at checkpoints; safe with WAL
+                        "PRAGMA mmap_size = 268435456"]
+        for p in pragmas:
+            raw.execute(p)
+        return SQLiteConnection(raw)
+
+    def schema(self):
+        return SQLITE_SCHEMA
+
+    def is_duplicate_key(self, err):
+        return isinstance(err, sqlite3.IntegrityError) and "UNIQUE" in str(err)
+
+    def claim_any_copy(self, cur, book_id):
+        cur.execute("""
+            UPDATE BookCopies SET availability='Issued'
+            WHERE copy_id = (SELECT copy_id FROM BookCopies WHERE book_id = %s AND availability='Available'
+                             ORDER BY copy_id LIMIT 1)
+            RETURNING copy_id
+        """, (book_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def consecutive_insert_ids(self, cur):
+        return True  # one writer at a time
+
+    def first_insert_id(self, cur, rows):
+        return cur.lastrowid - rows + 1  # SQLite reports the last row's id
+
+    def explain(self, cur, sql, params):
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        details = [r['detail'] if isinstance(r, dict) else r[-1] for r in cur.fetchall()]
+        first = details[0] if details else ""
+        m = re.search(r"USING (?:COVERING )?INDEX (\w+)", first)
+        key = m.group(1) if m else ("PRIMARY" if "PRIMARY KEY" in first else None)
+        return {"type": first.split(" ", 1)[0] if first else None, "key": key, "rows": None,
+                "uses_index": key is not None or not first.startswith("SCAN")}
+
+    def is_transient(self, err):
+        # OperationalError also covers mistakes like "no such column", so go by the message
+        return isinstance(err, sqlite3.OperationalError) \
+            and any(s in str(err) for s in ("locked", "busy", "unable to open", "disk I/O"))
+
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend}
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[DB_BACKEND]()
+    return _backend
+
+def database_key():
+    """Identifies the configured database, for local files cached per database (None for :memory:)."""
+    backend = get_backend()
+    if backend.name == "sqlite":
+        return None if backend.path == ":memory:" else "sqlite:" + os.path.abspath(backend.path)
+    return f"{backend.name}://{DB_CONFIG['host']}/{DB_CONFIG['database']}"
+
+def configure_backend(name, **kwargs):
+    """Switch storage backend (closes the pool), e.g. configure_backend("sqlite", path=":memory:")."""
+    global _backend
+    close_pool()
+    _backend = BACKENDS[name](**kwargs)
+    return _backend
+
+def _connect():
+    return get_backend().connect()
+
+def is_transient(err):
+    """True if err is about reaching the database rather than about the work itself, so retrying
+    later may succeed: the service being unreachable or answering 503, a pool timeout, and the
+    backend's lock timeouts and lost connections."""
+    return isinstance(err, (ServiceUnavailable, PoolTimeout, ConnectionError, TimeoutError)) \
+        or get_backend().is_transient(err)
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class ServiceUnavailable(RuntimeError):
+    """RemoteLibraryDB couldn't reach the service, or it answered 503."""
+    pass
+
+class PooledConnection:
+    """Wraps a raw connection; close() hands it back to the pool instead of disconnecting."""
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        m = _metrics
+        return cur if m is None else _TimedCursor(cur, m)
+
+    def close(self):
+        if self._raw is not None:
+            self._pool.release(self)
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, borrow_timeout=POOL_BORROW_TIMEOUT,
+                 health_check_after=POOL_HEALTH_CHECK_AFTER, connect=_connect):
+        cap = get_backend().max_connections if connect is _connect else None
+        self.size = max(1, min(int(size), cap or int(size)))
+        self.borrow_timeout = borrow_timeout
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        # stats
+        self._borrows = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._replaced = 0
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.borrow_timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No free DB connection after {self.borrow_timeout}s "
+                                      f"({self._in_use} in use).")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if pooled is None:
+                pooled = PooledConnection(self, self._connect())
+            elif time.monotonic() - pooled.last_used > self.health_check_after:
+                pooled = self._check(pooled)
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        wait = time.monotonic() - start
+        with self._cond:
+            self._borrows += 1
+            if waited:
+                self._waits += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        if _metrics is not None:
+            _metrics.record("pool.acquire", wait)
+        return pooled
+
+    def _check(self, pooled):
+        # health check for connections that sat idle: ping, replace if dead
+        try:
+            pooled._raw.ping(reconnect=False)
+            return pooled
+        except Exception:
+            try:
+                pooled._raw.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._replaced += 1
+            return PooledConnection(self, self._connect())
+
+    def release(self, pooled):
+        raw = pooled._raw
+        broken = False
+        try:
+            if raw.in_transaction:
+                raw.rollback()  # never hand out a connection with half-done work
+        except Exception:
+            broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._open -= 1
+            else:
+                # fresh wrapper so a stale reference can't release the same connection twice
+                fresh = PooledConnection(self, raw)
+                self._idle.append(fresh)
+            pooled._raw = None
+            self._cond.notify()
+        if broken:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for p in idle:
+            try:
+                p._raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "borrows": self._borrows,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "replaced": self._replaced,
+                "avg_wait_ms": round(1000 * self._total_wait / self._borrows, 3) if self._borrows else 0.0,
+                "max_wait_ms": round(1000 * self._max_wait, 3),
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def configure_pool(**kwargs):
+    # replace the shared pool, e.g. with a bigger one for a load test
+    global _pool
+    close_pool()
+    with _pool_lock:
+        _pool = ConnectionPool(**kwargs)
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+class _UnitConnection:
+    """Shared connection handed out inside unit_of_work(); commit/close are left to the unit."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+@contextmanager
+def unit_of_work():
+    """One connection + one transaction for everything that calls get_conn() inside the block.
+    Commits on success, rolls back on error. Nested units join the outer one."""
+    outer = getattr(_local, "conn", None)
+    if outer is not None:
+        yield _UnitConnection(outer)
+        return
+    conn = get_pool().acquire()
+    _local.conn = conn
+    _local.on_commit = []
+    try:
+        yield _UnitConnection(conn)
+        conn.commit()
+        hooks = _local.on_commit
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.conn = None
+        _local.on_commit = []
+        conn.close()
+    for fn in hooks:
+        fn()
+
+def after_commit(fn):
+    """Run fn once the current unit of work commits (dropped on rollback); immediately if
+    there is no unit of work, i.e. the caller has already committed."""
+    if getattr(_local, "conn", None) is not None:
+        _local.on_commit.append(fn)
+    else:
+        fn()
+
 def get_conn():
+    # inside a unit of work everybody shares its connection; otherwise borrow from the pool
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return _UnitConnection(conn)
+    return get_pool().acquire()
+
+def _stream(sql, params=(), chunk_size=EXPORT_CHUNK, dictionary=True):
+    """Yield the rows of one query fetchmany() chunk by chunk on a non-buffered cursor
+    (server-side streaming on MySQL), so memory stays flat however large the result."""
+    conn = get_conn()
+    cur = conn.cursor(dictionary=dictionary)
+    done = False
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
-            raise RuntimeError("DB access denied — check username/password.")
-        elif err.errno == errorcode.ER_BAD_DB_ERROR:
-            raise RuntimeError(f"Database '{DB_CONFIG['database']}' does not exist.")
-        else:
-            raise
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                done = True
+                return
+            yield from rows
+    finally:
+        if not done:
+            # abandoned mid-stream: drain the unread result so the connection is reusable
+            consume = getattr(conn, "consume_results", None)
+            if consume is not None:
+                try:
+                    consume()
+                except Exception:
+                    pass
+        cur.close()
+        conn.close()
+
+def _placeholders(n, group="%s"):
+    # "%s,%s,%s" for IN (...) lists, or "(%s,%s),(%s,%s)" for multi-row VALUES
+    return ",".join([group] * n)
 
-def init_schema():
-    # Only run when CREATE_SCHEMA True — will create tables if missing.
-    schema_sql = [
+MYSQL_SCHEMA = [
     """CREATE TABLE IF NOT EXISTS Publishers (
         publisher_id INT AUTO_INCREMENT PRIMARY KEY,
         publisher_name VARCHAR(100) NOT NULL,
@@ -100,6 +996,55 @@ def init_schema():
         FOREIGN KEY (member_id) REFERENCES Members(member_id)
     )"""
     ]
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Publishers (
+        publisher_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        publisher_name VARCHAR(100) NOT NULL COLLATE NOCASE,
+        contact_email VARCHAR(100),
+        contact_phone VARCHAR(15)
+    )""",
+    """CREATE TABLE IF NOT EXISTS Authors (
+        author_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author_name VARCHAR(100) NOT NULL COLLATE NOCASE,
+        country VARCHAR(50)
+    )""",
+    """CREATE TABLE IF NOT EXISTS Books (
+        book_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title VARCHAR(150) NOT NULL,
+        publisher_id INTEGER REFERENCES Publishers(publisher_id) ON DELETE SET NULL ON UPDATE CASCADE,
+        publication_year INTEGER,
+        genre VARCHAR(50) COLLATE NOCASE
+    )""",
+    """CREATE TABLE IF NOT EXISTS BookAuthors (
+        book_id INTEGER REFERENCES Books(book_id) ON DELETE CASCADE,
+        author_id INTEGER REFERENCES Authors(author_id) ON DELETE CASCADE,
+        PRIMARY KEY (book_id, author_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS Members (
+        member_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        full_name VARCHAR(100) NOT NULL,
+        email VARCHAR(100),
+        phone VARCHAR(15),
+        membership_date DATE
+    )""",
+    """CREATE TABLE IF NOT EXISTS BookCopies (
+        copy_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER REFERENCES Books(book_id) ON DELETE CASCADE,
+        availability VARCHAR(9) DEFAULT 'Available' CHECK (availability IN ('Available','Issued'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS IssueReturn (
+        issue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        copy_id INTEGER REFERENCES BookCopies(copy_id),
+        member_id INTEGER REFERENCES Members(member_id),
+        issue_date DATE,
+        due_date DATE,
+        return_date DATE
+    )"""
+]
+
+def init_schema(progress=None):
+    # Only run when CREATE_SCHEMA True (or for SQLite) — will create tables if missing.
+    schema_sql = get_backend().schema()
     conn = get_conn()
     cur = conn.cursor()
     try:
@@ -109,204 +1054,3129 @@ def init_schema():
     finally:
         cur.close()
         conn.close()
+    migrate(progress)
+
+# ---------- MIGRATIONS ----------
+# (version, description, statements). statements is a list, or {backend name: list} where
+# the dialects differ. Append only; never edit a released entry.
+def _dedupe_names_sql(table, id_col, name_col):
+    keep = f"(SELECT {name_col} AS n, MIN({id_col}) AS keep_id FROM {table} GROUP BY {name_col} HAVING COUNT(*) > 1)"
+    return keep, f"DELETE t FROM {table} t JOIN {keep} k ON t.{name_col} = k.n AND t.{id_col} <> k.keep_id"
+
+_PUB_KEEP, _PUB_DELETE = _dedupe_names_sql("Publishers", "publisher_id", "publisher_name")
+_AUTH_KEEP, _AUTH_DELETE = _dedupe_names_sql("Authors", "author_id", "author_name")
+
+MIGRATIONS = [
+    (1, "indexes for open-loan, copy-availability and member/copy lookups", [
+        "CREATE INDEX idx_ir_open ON IssueReturn (return_date, due_date)",
+        "CREATE INDEX idx_ir_member_open ON IssueReturn (member_id, return_date)",
+        "CREATE INDEX idx_ir_copy_open ON IssueReturn (copy_id, return_date)",
+        "CREATE INDEX idx_copies_book_avail ON BookCopies (book_id, availability)",
+        "CREATE INDEX idx_books_genre ON Books (genre, book_id)",
+        "CREATE INDEX idx_books_year ON Books (publication_year, book_id)",
+    ]),
+    (2, "unique publisher/author names (merges existing duplicates into the lowest id)", {
+        "mysql": [
+            f"""UPDATE Books b JOIN Publishers p ON b.publisher_id = p.publisher_id
+                JOIN {_PUB_KEEP} k ON p.publisher_name = k.n
+                SET b.publisher_id = k.keep_id WHERE b.publisher_id <> k.keep_id""",
+            _PUB_DELETE,
+            f"""INSERT IGNORE INTO BookAuthors (book_id, author_id)
+                SELECT ba.book_id, k.keep_id FROM BookAuthors ba JOIN Authors a ON ba.author_id = a.author_id
+                JOIN {_AUTH_KEEP} k ON a.author_name = k.n WHERE a.author_id <> k.keep_id""",
+            _AUTH_DELETE,
+            "ALTER TABLE Publishers ADD UNIQUE KEY uq_publisher_name (publisher_name)",
+            "ALTER TABLE Authors ADD UNIQUE KEY uq_author_name (author_name)",
+        ],
+        "sqlite": [
+            """UPDATE Books SET publisher_id = (
+                 SELECT MIN(p2.publisher_id) FROM Publishers p1 JOIN Publishers p2 ON p2.publisher_name = p1.publisher_name
+                 WHERE p1.publisher_id = Books.publisher_id)
+               WHERE publisher_id IS NOT NULL""",
+            "DELETE FROM Publishers WHERE publisher_id NOT IN (SELECT MIN(publisher_id) FROM Publishers GROUP BY publisher_name)",
+            """INSERT OR IGNORE INTO BookAuthors (book_id, author_id)
+               SELECT ba.book_id, (SELECT MIN(a2.author_id) FROM Authors a2 WHERE a2.author_name = a.author_name)
+               FROM BookAuthors ba JOIN Authors a ON a.author_id = ba.author_id""",
+            "DELETE FROM Authors WHERE author_id NOT IN (SELECT MIN(author_id) FROM Authors GROUP BY author_name)",
+            "CREATE UNIQUE INDEX uq_publisher_name ON Publishers (publisher_name)",
+            "CREATE UNIQUE INDEX uq_author_name ON Authors (author_name)",
+        ],
+    }),
+    (3, "append-only circulation event journal", {
+        "mysql": ["""CREATE TABLE IF NOT EXISTS CirculationEvents (
+            seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+            created_at DATETIME NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            entity_id INT NOT NULL,
+            data VARCHAR(1000)
+        )"""],
+        "sqlite": ["""CREATE TABLE IF NOT EXISTS CirculationEvents (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at DATETIME NOT NULL,
+            kind TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            data TEXT
+        )"""],
+    }),
+    (4, "IssueReturnArchive for returned loans moved out of IssueReturn", [
+        """CREATE TABLE IF NOT EXISTS IssueReturnArchive (
+            issue_id INT PRIMARY KEY,
+            copy_id INT,
+            member_id INT,
+            issue_date DATE,
+            due_date DATE,
+            return_date DATE,
+            archived_at DATETIME NOT NULL
+        )""",
+        "CREATE INDEX idx_ira_member ON IssueReturnArchive (member_id, issue_id)",
+        "CREATE INDEX idx_ira_copy ON IssueReturnArchive (copy_id, issue_id)",
+    ]),
+    (5, "AppliedOps: idempotency keys of replayed write-behind desk operations", [
+        """CREATE TABLE IF NOT EXISTS AppliedOps (
+            op_key VARCHAR(64) PRIMARY KEY,
+            applied_at DATETIME NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            result TEXT
+        )""",
+    ]),
+]
+
+def _applied_migrations(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS SchemaMigrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(200),
+        applied_at DATETIME NOT NULL
+    )""")
+    cur.execute("SELECT version FROM SchemaMigrations")
+    return {r[0] for r in cur.fetchall()}
+
+def migrate(progress=None):
+    """Apply pending MIGRATIONS in order, recording each in SchemaMigrations. Safe to rerun."""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        done = _applied_migrations(cur)
+        applied = []
+        backend = get_backend().name
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            if isinstance(statements, dict):
+                statements = statements[backend]
+            # DDL commits implicitly in MySQL, so a failed migration is not rolled back;
+            # fix the cause and drop whatever it had created before rerunning
+            for sql in statements:
+                cur.execute(sql)
+            cur.execute("INSERT INTO SchemaMigrations (version, description, applied_at) VALUES (%s,%s,%s)",
+                        (version, description, datetime.now()))
+            conn.commit()
+            applied.append(version)
+            if progress:
+                progress(f"Applied migration {version}: {description}")
+        return applied
+    finally:
+        cur.close()
+        conn.close()
+
+def pending_migrations():
+    """Versions in MIGRATIONS this database hasn't applied yet."""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        done = _applied_migrations(cur)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return [version for version, _, _ in MIGRATIONS if version not in done]
+
+def check_schema():
+    """Fail fast on a database that is behind MIGRATIONS (e.g. an upgraded MySQL install, where
+    the schema isn't created on startup): writes would fail on the tables they add."""
+    pending = pending_migrations()
+    if pending:
+        raise RuntimeError(f"The database schema is out of date (pending migrations: {', '.join(map(str, pending))}); "
+                           "run `plsql_proj.py migrate`.")
+
+# ---------- FINES ----------
+class FinePolicy:
+    """Fine rules used by return_book and the batch overdue engine. Subclass and override
+    fine()/fines()/sql() for other rules; keep the three in agreement."""
+    def __init__(self, per_day=FINE_PER_DAY, grace_days=FINE_GRACE_DAYS, cap=FINE_CAP):
+        self.per_day = per_day
+        self.grace_days = int(grace_days)
+        self.cap = cap
+
+    @staticmethod
+    def days_late(due, as_of):
+        return max(0, (as_of - due).days) if due else 0
+
+    def fine(self, days_late):
+        f = max(0, days_late - self.grace_days) * self.per_day
+        return min(f, self.cap) if self.cap is not None else f
+
+    def fines(self, days_late):
+        """Vectorized fine(): NumPy array in, array out (a list works without NumPy)."""
+        if isinstance(days_late, (list, tuple)) or _numpy() is None or not isinstance(days_late, np.ndarray):
+            return [self.fine(int(d)) for d in days_late]
+        f = np.maximum(days_late - self.grace_days, 0) * self.per_day
+        return np.minimum(f, self.cap) if self.cap is not None else f
+
+    def sql(self, days_expr):
+        # same rule as a SQL expression; the numbers are config, not user input
+        f = f"(GREATEST(({days_expr}) - {int(self.grace_days)}, 0) * {float(self.per_day)!r})"
+        return f"LEAST({f}, {float(self.cap)!r})" if self.cap is not None else f
+
+class OverdueEngine:
+    """Batch days-late/fine computation over every open loan as of a date, streamed in
+    chunks from one unbuffered query and computed per chunk."""
+    def __init__(self, db, policy=None, as_of=None, chunk_size=10000):
+        self.db = db
+        self.policy = policy or db.fine_policy
+        self.as_of = as_of or date.today()
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self):
+        """Yield lists of overdue loan dicts with days_late and fine filled in."""
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("""
+                SELECT ir.issue_id, ir.member_id, m.full_name AS member_name, ir.copy_id,
+                  b.title AS book_title, ir.issue_date, ir.due_date
+                FROM IssueReturn ir
+                LEFT JOIN Members m ON ir.member_id = m.member_id
+                LEFT JOIN BookCopies c ON ir.copy_id = c.copy_id
+                LEFT JOIN Books b ON c.book_id = b.book_id
+                WHERE ir.return_date IS NULL AND ir.due_date < %s
+            """, (self.as_of,))
+            as_of = self.as_of.toordinal()
+            np = _numpy()
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                if np is not None:
+                    late = as_of - np.fromiter((r['due_date'].toordinal() for r in rows), dtype=np.int64, count=len(rows))
+                    fines = self.policy.fines(late).tolist()
+                    late = late.tolist()
+                else:
+                    late = [as_of - r['due_date'].toordinal() for r in rows]
+                    fines = self.policy.fines(late)
+                for r, d, f in zip(rows, late, fines):
+                    r['days_late'] = d
+                    r['fine'] = f
+                yield rows
+        finally:
+            cur.close()
+            conn.close()
+
+    def summary(self):
+        """Totals computed entirely in SQL with the policy's expression."""
+        days = "DATEDIFF(%s, due_date)"
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT COUNT(*) AS overdue_loans, COALESCE(SUM({self.policy.sql(days)}), 0) AS total_fines,
+                  COALESCE(MAX({days}), 0) AS max_days_late
+                FROM IssueReturn WHERE return_date IS NULL AND due_date < %s
+            """, (self.as_of, self.as_of, self.as_of))
+            r = cur.fetchone()
+            return {"as_of": self.as_of.isoformat(), "overdue_loans": int(r['overdue_loans']),
+                    "total_fines": float(r['total_fines']), "max_days_late": int(r['max_days_late'])}
+        finally:
+            cur.close()
+            conn.close()
+
+    def write_report(self, path, progress=print):
+        """Overdue report as CSV (one row per overdue loan); returns the totals."""
+        cols = ("issue_id", "member_id", "member_name", "copy_id", "book_title", "issue_date", "due_date", "days_late", "fine")
+        started = time.monotonic()
+        count, total, worst = 0, 0, 0
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(cols)
+            for rows in self.iter_chunks():
+                w.writerows([r[c] for c in cols] for r in rows)
+                count += len(rows)
+                total += sum(r['fine'] for r in rows)
+                worst = max(worst, max(r['days_late'] for r in rows))
+                if progress:
+                    progress(f"{count} overdue loans processed")
+        elapsed = time.monotonic() - started
+        return {"as_of": self.as_of.isoformat(), "overdue_loans": count, "total_fines": total,
+                "max_days_late": worst, "seconds": round(elapsed, 3), "report": path}
+
+# ---------- CACHES ----------
+class NameCache:
+    """Bounded LRU map of name -> id, safe to share between threads. Names are kept exactly as
+    given: whether two spellings are the same row is up to the column collation, not Python."""
+    def __init__(self, capacity=NAME_CACHE_SIZE):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name):
+        with self._lock:
+            row_id = self._data.get(name)
+            if row_id is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(name)
+            self.hits += 1
+            return row_id
+
+    def put(self, name, row_id):
+        with self._lock:
+            self._data[name] = row_id
+            self._data.move_to_end(name)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._data), "capacity": self.capacity, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+# ---------- SEARCH ----------
+_TOKEN_RE = re.compile(r"\w+")
+
+def _search_tokens(text):
+    if not text:
+        return []
+    # casefold + strip accents so "Garcia" finds "García"
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+def _deletes1(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def _within_one_edit(a, b):
+    # Damerau-Levenshtein distance <= 1 (one insert, delete, substitute or adjacent swap)
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                                  and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+class CatalogSearchIndex:
+    """In-memory inverted index over title, authors, publisher and genre.
+    Every query term matches tokens it is a prefix of; terms of SEARCH_TYPO_MIN_LEN+ chars
+    with no prefix match fall back to tokens one edit away (symmetric-delete lookup).
+    Terms are ANDed; results rank by exact-token hits, then newest book first.
+    Adding a book that is already indexed is a no-op."""
+    def __init__(self):
+        self.postings = {}     # token -> array('i') of book_ids
+        self.vocab = []        # sorted tokens, for prefix ranges
+        self.deletes = {}      # one-char deletion of a token -> tokens
+        self.indexed = bytearray()  # bitmap of the book_ids added so far
+        self.books = 0
+        self._lock = threading.Lock()
+
+    def add(self, book_id, title, authors=None, publisher=None, genre=None):
+        tokens = set()
+        for field in (title, authors, publisher, genre):
+            tokens.update(_search_tokens(field))
+        byte, bit = divmod(book_id, 8)
+        with self._lock:
+            if byte >= len(self.indexed):
+                self.indexed.extend(bytes(byte + 1 - len(self.indexed)))
+            elif self.indexed[byte] >> bit & 1:
+                return
+            self.indexed[byte] |= 1 << bit
+            for t in tokens:
+                plist = self.postings.get(t)
+                if plist is None:
+                    plist = self.postings[t] = array("i")
+                    bisect.insort(self.vocab, t)
+                    if len(t) >= SEARCH_TYPO_MIN_LEN:
+                        for d in _deletes1(t):
+                            self.deletes.setdefault(d, []).append(t)
+                plist.append(book_id)
+            self.books += 1
+
+    def _prefix_tokens(self, term):
+        lo = bisect.bisect_left(self.vocab, term)
+        hi = bisect.bisect_left(self.vocab, term + "\uffff")
+        return self.vocab[lo:lo + min(hi - lo, SEARCH_MAX_EXPANSIONS)]
+
+    def _typo_tokens(self, term):
+        cands = set(self.deletes.get(term, ()))
+        if term in self.postings:
+            cands.add(term)
+        for d in _deletes1(term):
+            if d in self.postings:
+                cands.add(d)
+            cands.update(self.deletes.get(d, ()))
+        return [t for t in cands if _within_one_edit(term, t)]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        terms = list(dict.fromkeys(_search_tokens(query)))
+        if not terms:
+            return []
+        with self._lock:
+            matched, exact = None, {}
+            for term in terms:
+                tokens = self._prefix_tokens(term)
+                if not tokens and len(term) >= SEARCH_TYPO_MIN_LEN:
+                    tokens = self._typo_tokens(term)
+                ids = set()
+                for t in tokens:
+                    ids.update(self.postings[t])
+                matched = ids if matched is None else matched & ids
+                if not matched:
+                    return []
+                for b in self.postings.get(term, ()):
+                    exact[b] = exact.get(b, 0) + 1
+        return heapq.nsmallest(limit, matched, key=lambda b: (-exact.get(b, 0), -b))
+
+    def stats(self):
+        with self._lock:
+            return {"books": self.books, "tokens": len(self.postings)}
 
 # ---------- APPLICATION LOGIC ----------
+class Conflict(ValueError):
+    """A write the library's rules turn down: copy not available, already returned, ..."""
+    pass
+
 class LibraryDB:
-    def __init__(self):
-        if CREATE_SCHEMA:
+    def __init__(self, fine_policy=None, warm_caches=NAME_CACHE_WARM, schema_check=True):
+        # schema_check=False leaves check_schema() to the caller (the GUI runs it off the main thread)
+        if CREATE_SCHEMA or get_backend().auto_create:
             init_schema()
+        elif schema_check:
+            check_schema()
+        self.fine_policy = fine_policy or FinePolicy()
+        self.publisher_cache = NameCache()
+        self.author_cache = NameCache()
+        self.search_index = None  # CatalogSearchIndex once build_search_index() has run
+        self._search_lock = threading.Lock()
+        self._search_backlogs = []  # one list per build in progress: books committed meanwhile
+        if warm_caches:
+            self.warm_name_caches()
+        # dashboard snapshot: (monotonic time taken, counts dict)
+        self._stats_lock = threading.Lock()
+        self._stats_snapshot = None
+        self.circulation = CirculationAnalytics(self)
+        self.coborrow = CoBorrowIndex(self)
+
+    def pool_stats(self):
+        return get_pool().stats()
+
+    # ---------- Stats ----------
+    def stats(self, max_age=STATS_TTL, refresh=False):
+        """Dashboard counts computed in the database, served from an in-process snapshot that
+        is at most max_age seconds old. Writes through this class keep the snapshot current."""
+        with self._stats_lock:
+            snap = self._stats_snapshot
+            if snap and not refresh and time.monotonic() - snap[0] <= max_age:
+                return dict(snap[1])
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("""
+                SELECT
+                  (SELECT COUNT(*) FROM Books) AS books,
+                  (SELECT COUNT(*) FROM Members) AS members,
+                  (SELECT COUNT(*) FROM IssueReturn WHERE return_date IS NULL) AS open_loans,
+                  (SELECT COUNT(*) FROM IssueReturn WHERE return_date IS NULL AND due_date < %s) AS overdue_loans,
+                  (SELECT COUNT(*) FROM BookCopies WHERE availability = 'Available') AS available_copies
+            """, (date.today(),))
+            counts = {k: int(v or 0) for k, v in cur.fetchone().items()}
+        finally:
+            cur.close()
+            conn.close()
+        with self._stats_lock:
+            self._stats_snapshot = (time.monotonic(), counts)
+        return dict(counts)
+
+    def invalidate_stats(self):
+        with self._stats_lock:
+            self._stats_snapshot = None
+
+    def _bump_stats(self, **deltas):
+        # apply a committed write to the cached snapshot instead of recounting
+        with self._stats_lock:
+            if self._stats_snapshot:
+                counts = self._stats_snapshot[1]
+                for k, d in deltas.items():
+                    counts[k] = counts.get(k, 0) + d
+
+    # ---------- Members ----------
+    def add_member(self, full_name, email=None, phone=None, membership_date=None):
+        if not membership_date:
+            membership_date = date.today()
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO Members (full_name, email, phone, membership_date) VALUES (%s,%s,%s,%s)",
+                        (full_name, email, phone, membership_date))
+            member_id = cur.lastrowid
+            self._journal(cur, [("member_added", member_id, {"full_name": full_name})])
+            conn.commit()
+            after_commit(lambda: self._bump_stats(members=1))
+            return member_id
+        finally:
+            cur.close()
+            conn.close()
+
+    def list_members_page(self, after_id=None, limit=CATALOG_PAGE_SIZE):
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            if after_id is None:
+                cur.execute("SELECT * FROM Members ORDER BY member_id DESC LIMIT %s", (int(limit),))
+            else:
+                cur.execute("SELECT * FROM Members WHERE member_id < %s ORDER BY member_id DESC LIMIT %s",
+                            (after_id, int(limit)))
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def list_members(self):
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SELECT * FROM Members ORDER BY member_id DESC")
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    # ---------- Publishers & Authors ----------
+    # Names are cached (LRU) once the row that holds them is committed; the
+    # unique name keys from migration 2 turn a concurrent insert of the same name into a
+    # duplicate-key error, answered by re-reading the winner's row.
+    NAME_TABLES = {
+        "publisher": ("Publishers", "publisher_id", "publisher_name"),
+        "author": ("Authors", "author_id", "author_name"),
+    }
+
+    def _name_cache(self, kind):
+        return self.publisher_cache if kind == "publisher" else self.author_cache
+
+    def _get_or_create(self, kind, name, extra):
+        cache = self._name_cache(kind)
+        row_id = cache.get(name)
+        if row_id is not None:
+            return row_id
+        table, id_col, name_col = self.NAME_TABLES[kind]
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SELECT {id_col} FROM {table} WHERE {name_col} = %s", (name,))
+            row = cur.fetchone()
+            if row:
+                row_id = row[0]
+            else:
+                cols = (name_col,) + tuple(extra)
+                try:
+                    cur.execute(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({_placeholders(len(cols))})",
+                                (name,) + tuple(extra.values()))
+                    row_id = cur.lastrowid
+                except Exception as err:
+                    if not get_backend().is_duplicate_key(err):
+                        raise
+                    # another desk inserted it first; a locking read sees its committed row
+                    cur.execute(f"SELECT {id_col} FROM {table} WHERE {name_col} = %s LOCK IN SHARE MODE", (name,))
+                    row_id = cur.fetchone()[0]
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+        after_commit(lambda: cache.put(name, row_id))
+        return row_id
+
+    def get_or_create_publisher(self, name, email=None, phone=None):
+        return self._get_or_create("publisher", name, {"contact_email": email, "contact_phone": phone})
+
+    def get_or_create_author(self, author_name, country=None):
+        return self._get_or_create("author", author_name, {"country": country})
+
+    def warm_name_caches(self, limit=NAME_CACHE_SIZE):
+        # newest rows first: recently added names are the likeliest to repeat
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            for kind, (table, id_col, name_col) in self.NAME_TABLES.items():
+                cache = self._name_cache(kind)
+                cur.execute(f"SELECT {id_col}, {name_col} FROM {table} ORDER BY {id_col} DESC LIMIT %s", (int(limit),))
+                for row_id, name in reversed(cur.fetchall()):
+                    cache.put(name, row_id)
+        finally:
+            cur.close()
+            conn.close()
+
+    def cache_stats(self):
+        return {"publishers": self.publisher_cache.stats(), "authors": self.author_cache.stats()}
+
+    # ---------- Books & Copies ----------
+    def _resolve_names(self, kind, cur, names):
+        """name -> id for every name: cache first, then one IN (...) lookup, one multi-row insert
+        for the missing ones, and one locking lookup for their ids (which also sees rows a
+        concurrent insert won). The column collation decides which spellings are the same row, so
+        rows are matched back to names exactly, and a name the lookups only return under another
+        spelling (other case or accents, e.g. "Garcia" for "García") is re-read on its own."""
+        cache = self._name_cache(kind)
+        table, id_col, name_col = self.NAME_TABLES[kind]
+        ids = {}
+        for n in names:
+            row_id = cache.get(n)
+            if row_id is not None:
+                ids[n] = row_id
+        def lookup(wanted, lock=""):
+            cur.execute(f"SELECT {id_col}, {name_col} FROM {table} WHERE {name_col} IN ({_placeholders(len(wanted))}){lock}",
+                        tuple(wanted))
+            wanted = set(wanted)
+            for row_id, name in cur.fetchall():
+                if name in wanted:
+                    ids[name] = row_id
+        uncached = [n for n in dict.fromkeys(names) if n not in ids]
+        if uncached:
+            lookup(uncached)
+        missing = [n for n in uncached if n not in ids]
+        if missing:
+            cur.execute(f"INSERT INTO {table} ({name_col}) VALUES {_placeholders(len(missing), '(%s)')} "
+                        f"ON DUPLICATE KEY UPDATE {name_col} = {name_col}", tuple(missing))
+            lookup(missing, " LOCK IN SHARE MODE")
+        for n in missing:
+            if n not in ids:
+                cur.execute(f"SELECT {id_col} FROM {table} WHERE {name_col} = %s LOCK IN SHARE MODE", (n,))
+                ids[n] = cur.fetchone()[0]
+        resolved = {n: ids[n] for n in names}
+        fresh = [(n, resolved[n]) for n in uncached]
+        after_commit(lambda: [cache.put(n, row_id) for n, row_id in fresh])
+        return resolved
+
+    def _resolve_authors(self, cur, names):
+        return self._resolve_names("author", cur, names)
+
+    def _resolve_publishers(self, cur, names):
+        return self._resolve_names("publisher", cur, names)
+
+    def add_book(self, title, publisher_name=None, publication_year=None, genre=None, authors_csv=None, copies=1):
+        book_id = self._add_book(title, publisher_name, publication_year, genre, authors_csv, copies)
+        # inside an outer unit the book isn't there until that unit commits
+        after_commit(lambda: self._bump_stats(books=1, available_copies=max(1, int(copies))))
+        after_commit(lambda: self._index_books([(book_id, title, authors_csv, publisher_name, genre)]))
+        return book_id
+
+    def _add_book(self, title, publisher_name, publication_year, genre, authors_csv, copies):
+        # one transaction, constant number of statements regardless of author/copy count
+        with unit_of_work() as conn:
+            cur = conn.cursor()
+            try:
+                pub_id = None
+                if publisher_name:
+                    pub_id = self.get_or_create_publisher(publisher_name)
+                cur.execute("INSERT INTO Books (title, publisher_id, publication_year, genre) VALUES (%s,%s,%s,%s)",
+                            (title, pub_id, publication_year, genre))
+                book_id = cur.lastrowid
+                # authors_csv: comma-separated list (duplicates dropped, order kept)
+                if authors_csv:
+                    authors = list(dict.fromkeys(a.strip() for a in authors_csv.split(",") if a.strip()))
+                    author_ids = list(dict.fromkeys(self._resolve_authors(cur, authors).values()))
+                    if author_ids:
+                        cur.execute(f"INSERT IGNORE INTO BookAuthors (book_id, author_id) VALUES {_placeholders(len(author_ids), '(%s,%s)')}",
+                                    tuple(v for aid in author_ids for v in (book_id, aid)))
+                # create copies, chunked multi-row inserts
+                n = max(1, int(copies))
+                for start in range(0, n, INSERT_CHUNK):
+                    k = min(INSERT_CHUNK, n - start)
+                    rows = _placeholders(k, "(%s,'Available')")
+                    cur.execute(f"INSERT INTO BookCopies (book_id, availability) VALUES {rows}", (book_id,) * k)
+                self._journal(cur, [("book_added", book_id, {"title": title, "copies": n})])
+                return book_id
+            finally:
+                cur.close()
+
+    def list_books_page(self, after_id=None, limit=CATALOG_PAGE_SIZE, genre=None, publisher=None, year=None):
+        """One catalog page, newest first. Pass the last book_id of the previous page as after_id.
+        Authors and copy counts come from one grouped pass each over just this page's books."""
+        where, params = [], []
+        if after_id is not None:
+            where.append("b.book_id < %s"); params.append(after_id)
+        if genre:
+            where.append("b.genre = %s"); params.append(genre)
+        if publisher:
+            where.append("p.publisher_name = %s"); params.append(publisher)
+        if year:
+            where.append("b.publication_year = %s"); params.append(year)
+        sql = """
+            SELECT b.book_id, b.title, p.publisher_name, b.publication_year, b.genre
+            FROM Books b LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
+        """
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY b.book_id DESC LIMIT %s"
+        params.append(int(limit))
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, tuple(params))
+            return self._fill_book_details(cur, cur.fetchall())
+        finally:
+            cur.close()
+            conn.close()
+
+    def _fill_book_details(self, cur, rows):
+        # authors and copy counts for just these books: one grouped pass each
+        if not rows:
+            return rows
+        ids = tuple(r['book_id'] for r in rows)
+        marks = _placeholders(len(ids))
+        cur.execute(f"""
+            SELECT ba.book_id, GROUP_CONCAT(a.author_name SEPARATOR ', ') AS authors
+            FROM BookAuthors ba JOIN Authors a ON a.author_id = ba.author_id
+            WHERE ba.book_id IN ({marks}) GROUP BY ba.book_id
+        """, ids)
+        authors = {r['book_id']: r['authors'] for r in cur.fetchall()}
+        cur.execute(f"""
+            SELECT book_id, COUNT(*) AS total_copies,
+              SUM(availability = 'Available') AS available_copies
+            FROM BookCopies WHERE book_id IN ({marks}) GROUP BY book_id
+        """, ids)
+        counts = {r['book_id']: r for r in cur.fetchall()}
+        for r in rows:
+            c = counts.get(r['book_id'], {})
+            r['authors'] = authors.get(r['book_id'])
+            r['total_copies'] = int(c.get('total_copies') or 0)
+            r['available_copies'] = int(c.get('available_copies') or 0)
+        return rows
+
+    def get_books(self, book_ids):
+        """Catalog rows for the given ids, in the same order."""
+        if not book_ids:
+            return []
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT b.book_id, b.title, p.publisher_name, b.publication_year, b.genre
+                FROM Books b LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
+                WHERE b.book_id IN ({_placeholders(len(book_ids))})
+            """, tuple(book_ids))
+            by_id = {r['book_id']: r for r in self._fill_book_details(cur, cur.fetchall())}
+            return [by_id[i] for i in book_ids if i in by_id]
+        finally:
+            cur.close()
+            conn.close()
+
+    # ---------- Search ----------
+    def iter_search_docs(self, chunk_size=5000):
+        """(book_id, title, authors, publisher, genre) for every book, streamed from one grouped query."""
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT b.book_id, b.title, GROUP_CONCAT(a.author_name SEPARATOR ', '), p.publisher_name, b.genre
+                FROM Books b
+                LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
+                LEFT JOIN BookAuthors ba ON ba.book_id = b.book_id
+                LEFT JOIN Authors a ON a.author_id = ba.author_id
+                GROUP BY b.book_id, b.title, p.publisher_name, b.genre
+            """)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+            conn.close()
+
+    def build_search_index(self, progress=None):
+        """Build a fresh index from one streamed snapshot and swap it in. Books committed while the
+        snapshot is read may be missing from it; _index_books() queues them for this build, and
+        they are added once the new index is in place."""
+        index = CatalogSearchIndex()
+        backlog = []
+        with self._search_lock:
+            self._search_backlogs.append(backlog)
+        try:
+            for n, doc in enumerate(self.iter_search_docs(), 1):
+                index.add(*doc)
+                if progress and n % 100000 == 0:
+                    progress(f"search index: {n} books")
+        except BaseException:
+            with self._search_lock:
+                self._search_backlogs.remove(backlog)
+            raise
+        with self._search_lock:
+            self._search_backlogs.remove(backlog)
+            self.search_index = index
+        for doc in backlog:  # the ones the snapshot already had are skipped by add()
+            index.add(*doc)
+        return index
+
+    def _index_books(self, docs):
+        """Add committed books, as (book_id, title, authors, publisher, genre), to the search index
+        and to the backlog of any build in progress."""
+        with self._search_lock:
+            for backlog in self._search_backlogs:
+                backlog.extend(docs)
+            index = self.search_index
+        if index is not None:
+            for doc in docs:
+                index.add(*doc)
+
+    def search_books(self, query, limit=SEARCH_LIMIT):
+        """Book ids matching query, best first. Uses the in-memory index once it is built,
+        otherwise a (slow) LIKE scan so search works during startup."""
+        if self.search_index is not None:
+            return self.search_index.search(query, limit)
+        terms = _search_tokens(query)
+        if not terms:
+            return []
+        where, params = [], []
+        for t in terms:
+            where.append("(b.title LIKE %s OR a.author_name LIKE %s OR p.publisher_name LIKE %s OR b.genre LIKE %s)")
+            params.extend([f"%{t}%"] * 4)
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT DISTINCT b.book_id FROM Books b
+                LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
+                LEFT JOIN BookAuthors ba ON ba.book_id = b.book_id
+                LEFT JOIN Authors a ON a.author_id = ba.author_id
+                WHERE {' AND '.join(where)} ORDER BY b.book_id DESC LIMIT %s
+            """, tuple(params) + (int(limit),))
+            return [r[0] for r in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+
+    def search_catalog(self, query, limit=SEARCH_LIMIT):
+        return self.get_books(self.search_books(query, limit))
+
+    def iter_books(self, page_size=CATALOG_PAGE_SIZE, **filters):
+        after = None
+        while True:
+            page = self.list_books_page(after, page_size, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]['book_id']
+
+    def list_books(self, **filters):
+        # whole catalog; prefer list_books_page/iter_books for anything large
+        return list(self.iter_books(**filters))
+
+    def list_copies_for_book(self, book_id):
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SELECT * FROM BookCopies WHERE book_id = %s ORDER BY copy_id", (book_id,))
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    # ---------- Issue & Return ----------
+    @staticmethod
+    def _require_member(cur, member_id):
+        # a business error rather than the foreign key violation the INSERT would raise
+        cur.execute("SELECT member_id FROM Members WHERE member_id = %s", (member_id,))
+        if not cur.fetchone():
+            raise Conflict("Member not found.")
+
+    def _open_loan(self, cur, copy_id, member_id, loan_days):
+        today = date.today()
+        due = today + timedelta(days=int(loan_days))
+        cur.execute("INSERT INTO IssueReturn (copy_id, member_id, issue_date, due_date) VALUES (%s,%s,%s,%s)",
+                    (copy_id, member_id, today, due))
+        return cur.lastrowid
+
+    def _loan_change(self, conn, issue_id):
+        # the row a new loan adds to the loan lists, read by primary key in the issuing
+        # transaction, which also journals it
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(self.ISSUED_SELECT + " WHERE ir.issue_id = %s", (issue_id,))
+            loan = cur.fetchone()
+            self._journal(cur, [self._issue_event(loan)])
+        finally:
+            cur.close()
+        return {"issue_id": issue_id, "copy_id": loan['copy_id'], "book_id": loan['book_id'],
+                "member_id": loan['member_id'], "loan": loan}
+
+    def issue_book(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self.issue_copy(copy_id, member_id, loan_days)["issue_id"]
+
+    def issue_copy(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        """issue_book() returning what changed: issue_id, copy_id, book_id, member_id and the new loan row."""
+        # the conditional UPDATE is the availability check: of two desks racing for one copy,
+        # exactly one sees rowcount 1
+        with unit_of_work() as conn:
+            cur = conn.cursor()
+            try:
+                self._require_member(cur, member_id)
+                cur.execute("UPDATE BookCopies SET availability='Issued' WHERE copy_id = %s AND availability='Available'",
+                            (copy_id,))
+                if cur.rowcount != 1:
+                    cur.execute("SELECT availability FROM BookCopies WHERE copy_id = %s", (copy_id,))
+                    if not cur.fetchone():
+                        raise Conflict("Copy not found.")
+                    raise Conflict("Copy is not available.")
+                issue_id = self._open_loan(cur, copy_id, member_id, loan_days)
+            finally:
+                cur.close()
+            change = self._loan_change(conn, issue_id)
+            after_commit(lambda: self._bump_stats(open_loans=1, available_copies=-1))
+            after_commit(self._after_issue)
+        return change
+
+    def issue_any_copy(self, book_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        """Issue whichever copy of book_id is free; the claim is a single UPDATE (see Backend.claim_any_copy).
+        Returns the same change dict as issue_copy()."""
+        with unit_of_work() as conn:
+            cur = conn.cursor()
+            try:
+                self._require_member(cur, member_id)
+                copy_id = get_backend().claim_any_copy(cur, book_id)
+                if copy_id is None:
+                    raise Conflict("No available copies for this book.")
+                issue_id = self._open_loan(cur, copy_id, member_id, loan_days)
+            finally:
+                cur.close()
+            change = self._loan_change(conn, issue_id)
+            after_commit(lambda: self._bump_stats(open_loans=1, available_copies=-1))
+            after_commit(self._after_issue)
+        return change
+
+    def issue_many(self, member_id, copy_ids, loan_days=DEFAULT_LOAN_DAYS, all_or_nothing=False):
+        """Check out a batch of copies to one member in one transaction with set-based statements.
+        Returns one result per distinct copy, in input order: {"copy_id", "ok", ...issue_copy() fields}
+        or {"copy_id", "ok": False, "error"}. With all_or_nothing, any failure rolls back the batch
+        (Conflict). Copies that can't be issued never block the rest."""
+        ids = list(dict.fromkeys(int(c) for c in copy_ids))
+        if not ids:
+            return []
+        today = date.today()
+        due = today + timedelta(days=int(loan_days))
+        with unit_of_work() as conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                self._require_member(cur, member_id)
+                # lock the batch's copies, then claim the free ones
+                cur.execute(f"SELECT copy_id, availability FROM BookCopies WHERE copy_id IN ({_placeholders(len(ids))}) "
+                            "FOR UPDATE", tuple(ids))
+                status = {r['copy_id']: r['availability'] for r in cur.fetchall()}
+                free = [c for c in ids if status.get(c) == 'Available']
+                loans = {}
+                if free:
+                    marks = _placeholders(len(free))
+                    cur.execute(f"UPDATE BookCopies SET availability='Issued' WHERE copy_id IN ({marks})", tuple(free))
+                    cur.execute(f"INSERT INTO IssueReturn (copy_id, member_id, issue_date, due_date) VALUES "
+                                f"{_placeholders(len(free), '(%s,%s,%s,%s)')}",
+                                tuple(v for c in free for v in (c, member_id, today, due)))
+                    cur.execute(self.ISSUED_SELECT + f" WHERE ir.copy_id IN ({marks}) AND ir.return_date IS NULL", tuple(free))
+                    loans = {r['copy_id']: r for r in cur.fetchall()}
+                    self._journal(cur, [self._issue_event(loans[c]) for c in free])
+            finally:
+                cur.close()
+            results = []
+            for c in ids:
+                loan = loans.get(c)
+                if loan:
+                    results.append({"copy_id": c, "ok": True, "issue_id": loan['issue_id'], "book_id": loan['book_id'],
+                                    "member_id": loan['member_id'], "loan": loan})
+                else:
+                    results.append({"copy_id": c, "ok": False,
+                                    "error": "Copy not found." if c not in status else "Copy is not available."})
+            failed = [r for r in results if not r['ok']]
+            if failed and all_or_nothing:
+                raise Conflict("; ".join(f"copy {r['copy_id']}: {r['error']}" for r in failed))
+            if loans:
+                after_commit(lambda: self._bump_stats(open_loans=len(loans), available_copies=-len(loans)))
+                after_commit(self._after_issue)
+        return results
+
+    # ---------- Write-behind replay ----------
+    def apply_ops(self, ops):
+        """Apply write-behind desk ops ({"key", "kind", "args"}) in order, each exactly once: its
+        idempotency key goes into AppliedOps in the op's own transaction, and a replayed key gets
+        the recorded outcome back. A rejected op (say the copy was issued elsewhere meanwhile) is
+        recorded as a conflict, and so is any other failure a retry can't fix (a constraint
+        violation, malformed args). Returns one {"key", "status": "done"|"conflict", "result"|"error"}
+        per op; a transient error (see is_transient) propagates and the caller retries the
+        remaining ops later."""
+        return [self._apply_op(op["key"], op["kind"], op.get("args") or {}) for op in ops]
+
+    def _applied_op(self, key):
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT status, result FROM AppliedOps WHERE op_key = %s", (key,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if row is None:
+            return None
+        return {"key": key, "status": row[0], ("result" if row[0] == "done" else "error"): json.loads(row[1])}
+
+    def _record_op(self, key, status, result):
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO AppliedOps (op_key, applied_at, status, result) VALUES (%s,%s,%s,%s)",
+                        (key, datetime.now(), status, json.dumps(result, default=_json_default)))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _run_op(self, kind, a):
+        if kind in ("issue", "issue_any"):
+            days = a.get('loan_days', DEFAULT_LOAN_DAYS)
+            if kind == "issue":
+                return self.issue_copy(a['copy_id'], a['member_id'], days)
+            return self.issue_any_copy(a['book_id'], a['member_id'], days)
+        if kind == "return":
+            return self.return_book(a['issue_id'])
+        if kind == "return_copy":
+            res = self.return_copies([a['copy_id']])[0]
+            if not res['ok']:
+                raise ValueError(res['error'])
+            return res
+        raise ValueError(f"Unknown operation {kind!r}.")
+
+    def _apply_op(self, key, kind, args):
+        prior = self._applied_op(key)
+        if prior is not None:
+            return prior
+        try:
+            with unit_of_work():
+                result = self._run_op(kind, args)
+                self._record_op(key, "done", result)
+            return {"key": key, "status": "done", "result": result}
+        except ValueError as e:
+            error = str(e)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            # retrying would only fail again and hold up every op queued behind this one
+            error = f"{type(e).__name__}: {e}"
+        try:
+            self._record_op(key, "conflict", error)
+        except Exception as e:
+            # a concurrent replay of the same key got there first
+            if not get_backend().is_duplicate_key(e):
+                raise
+            return self._applied_op(key)
+        return {"key": key, "status": "conflict", "error": error}
+
+    def build_coborrow_index(self, progress=None):
+        """Load the saved "also borrowed" index (building it from history if there is none), catch it
+        up, and keep it current on a background thread from then on."""
+        self.coborrow.ensure(progress)
+        self.coborrow.start()
+        return types.SimpleNamespace(**self.coborrow.stats())
+
+    def also_borrowed(self, book_id, limit=CO_BORROW_TOP_K):
+        """Books most often borrowed by members who borrowed book_id: [{book_id, title, score}].
+        Empty until the co-borrow index is ready."""
+        top = self.coborrow.top(book_id, limit)
+        if not top:
+            return []
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SELECT book_id, title FROM Books WHERE book_id IN ({_placeholders(len(top))})",
+                        tuple(b for b, n in top))
+            titles = dict(cur.fetchall())
+        finally:
+            cur.close()
+            conn.close()
+        return [{"book_id": b, "title": titles[b], "score": n} for b, n in top if b in titles]
+
+    def _after_issue(self):
+        # counted from the journal on the co-borrow thread, never on the issuing one
+        self.coborrow.notify()
+
+    def analytics(self, as_of=None, refresh=False):
+        """Utilization aggregates (see CirculationAnalytics), recomputed only when circulation changed."""
+        return self.circulation.compute(as_of, refresh)
+
+    # ---------- Streaming exports ----------
+    def iter_loans(self, start=None, end=None, member_id=None, open_only=False, include_archived=True,
+                   chunk_size=EXPORT_CHUNK):
+        """Stream loans (list_issued shape) with issue_date in [start, end], optionally one member's
+        or only open ones. Archived loans come first, then live ones, each in issue_id order."""
+        where, params = [], []
+        if start:
+            where.append("ir.issue_date >= %s"); params.append(start)
+        if end:
+            where.append("ir.issue_date <= %s"); params.append(end)
+        if member_id is not None:
+            where.append("ir.member_id = %s"); params.append(member_id)
+        if open_only:
+            where.append("ir.return_date IS NULL")
+        tail = (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ir.issue_id"
+        if include_archived and not open_only:
+            yield from _stream(self.ARCHIVED_SELECT + tail, tuple(params), chunk_size)
+        yield from _stream(self.ISSUED_SELECT + tail, tuple(params), chunk_size)
+
+    def iter_members(self, joined_from=None, joined_to=None, member_id=None, chunk_size=EXPORT_CHUNK):
+        """Stream members, optionally by membership_date range or one member_id."""
+        where, params = [], []
+        if joined_from:
+            where.append("membership_date >= %s"); params.append(joined_from)
+        if joined_to:
+            where.append("membership_date <= %s"); params.append(joined_to)
+        if member_id is not None:
+            where.append("member_id = %s"); params.append(member_id)
+        sql = "SELECT member_id, full_name, email, phone, membership_date FROM Members"
+        sql += (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY member_id"
+        return _stream(sql, tuple(params), chunk_size)
+
+    def iter_catalog(self, year_from=None, year_to=None, chunk_size=EXPORT_CHUNK):
+        """Stream the catalog (list_books_page shape) from one grouped query, optionally by publication year."""
+        where, params = [], []
+        if year_from:
+            where.append("b.publication_year >= %s"); params.append(year_from)
+        if year_to:
+            where.append("b.publication_year <= %s"); params.append(year_to)
+        return _stream(f"""
+            SELECT b.book_id, b.title, GROUP_CONCAT(a.author_name SEPARATOR ', ') AS authors, p.publisher_name,
+              b.publication_year, b.genre, COALESCE(c.total, 0) AS total_copies, COALESCE(c.available, 0) AS available_copies
+            FROM Books b
+            LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
+            LEFT JOIN BookAuthors ba ON ba.book_id = b.book_id
+            LEFT JOIN Authors a ON a.author_id = ba.author_id
+            LEFT JOIN (SELECT book_id, COUNT(*) AS total, SUM(CASE WHEN availability = 'Available' THEN 1 ELSE 0 END) AS available
+                       FROM BookCopies GROUP BY book_id) c ON c.book_id = b.book_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY b.book_id, b.title, p.publisher_name, b.publication_year, b.genre, c.total, c.available
+            ORDER BY b.book_id
+        """, tuple(params), chunk_size)
+
+    # ---------- Event journal ----------
+    def _journal(self, cur, events):
+        """Append (kind, entity_id, data) events to CirculationEvents with the caller's cursor,
+        i.e. in the caller's transaction: an event exists iff its change committed."""
+        if not events:
+            return
+        now = datetime.now()
+        for start in range(0, len(events), INSERT_CHUNK):
+            chunk = events[start:start + INSERT_CHUNK]
+            cur.execute(f"INSERT INTO CirculationEvents (created_at, kind, entity_id, data) VALUES "
+                        f"{_placeholders(len(chunk), '(%s,%s,%s,%s)')}",
+                        tuple(v for kind, entity_id, data in chunk
+                              for v in (now, kind, entity_id, json.dumps(data, separators=(",", ":"), default=_json_default))))
+
+    @staticmethod
+    def _issue_event(loan):
+        return ("issue", loan['issue_id'], {"copy_id": loan['copy_id'], "book_id": loan['book_id'],
+                                            "member_id": loan['member_id'], "due_date": loan['due_date']})
+
+    @staticmethod
+    def _return_event(rec, fine, was_overdue):
+        return ("return", rec['issue_id'], {"copy_id": rec['copy_id'], "book_id": rec['book_id'],
+                                            "member_id": rec['member_id'], "fine": fine, "was_overdue": was_overdue})
+
+    def read_events(self, after_seq=0, limit=1000):
+        """Journal events with seq > after_seq, oldest first: {seq, created_at, kind, entity_id, data}.
+        Prefer EventConsumer for tailing; it deals with sequence gaps."""
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SELECT seq, created_at, kind, entity_id, data FROM CirculationEvents WHERE seq > %s "
+                        "ORDER BY seq LIMIT %s", (int(after_seq), int(limit)))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+        for r in rows:
+            r['data'] = json.loads(r['data']) if r['data'] else {}
+        return rows
+
+    def last_event_seq(self):
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COALESCE(MAX(seq), 0) FROM CirculationEvents")
+            return int(cur.fetchone()[0])
+        finally:
+            cur.close()
+            conn.close()
+
+    def get_loans(self, issue_ids):
+        """Loan rows (list_issued shape) by issue_id, live or archived, e.g. to render journal events."""
+        ids = list(dict.fromkeys(int(i) for i in issue_ids))
+        if not ids:
+            return []
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(self.ISSUED_SELECT + f" WHERE ir.issue_id IN ({_placeholders(len(ids))})", tuple(ids))
+            rows = cur.fetchall()
+            missing = set(ids) - {r['issue_id'] for r in rows}
+            if missing:
+                cur.execute(self.ARCHIVED_SELECT + f" WHERE ir.issue_id IN ({_placeholders(len(missing))})", tuple(missing))
+                rows += cur.fetchall()
+            return sorted(rows, key=lambda r: r['issue_id'])
+        finally:
+            cur.close()
+            conn.close()
+
+    ISSUED_SELECT = """
+              SELECT ir.issue_id, ir.copy_id, ir.member_id, ir.issue_date, ir.due_date, ir.return_date,
+                m.full_name AS member_name,
+                c.book_id, b.title AS book_title
+              FROM IssueReturn ir
+              LEFT JOIN Members m ON ir.member_id = m.member_id
+              LEFT JOIN BookCopies c ON ir.copy_id = c.copy_id
+              LEFT JOIN Books b ON c.book_id = b.book_id
+    """
+    # same shape over archived history (returned loans moved out by archive_history)
+    ARCHIVED_SELECT = ISSUED_SELECT.replace("FROM IssueReturn ir", "FROM IssueReturnArchive ir")
+
+    def list_issued(self, include_archived=True):
+        # whole history; prefer list_issued_page for anything large
+        return list(self._issued_rows(self.ISSUED_SELECT, [], [], None, None, include_archived))
+
+    def _issued_rows(self, select, where, params, after_id, limit, include_archived=False):
+        # newest first from the live table, merged with the same query over the archive
+        where, params = list(where), list(params)
+        if after_id is not None:
+            where.append("ir.issue_id < %s"); params.append(after_id)
+        tail = (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ir.issue_id DESC"
+        if limit is not None:
+            tail += " LIMIT %s"
+            params.append(int(limit))
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(select + tail, tuple(params))
+            rows = cur.fetchall()
+            if not include_archived:
+                return rows
+            cur.execute(select.replace("FROM IssueReturn ir", "FROM IssueReturnArchive ir") + tail, tuple(params))
+            merged = heapq.merge(rows, cur.fetchall(), key=lambda r: r['issue_id'], reverse=True)
+            return list(merged)[:limit] if limit is not None else list(merged)
+        finally:
+            cur.close()
+            conn.close()
+
+    def _issued_page(self, where, params, after_id, limit, include_archived=False):
+        return self._issued_rows(self.ISSUED_SELECT, where, params, after_id, limit, include_archived)
+
+    def list_issued_page(self, after_id=None, limit=CATALOG_PAGE_SIZE, open_only=False, include_archived=False):
+        """Loans newest first, keyset-paginated on issue_id; open_only skips returned loans,
+        include_archived continues into IssueReturnArchive (one PK range query per table)."""
+        if open_only:
+            return self.list_open_loans(after_id, limit)
+        return self._issued_page([], [], after_id, limit, include_archived)
+
+    def member_history(self, member_id, after_id=None, limit=CATALOG_PAGE_SIZE):
+        """One member's loans, live and archived, newest first (idx_ir_member_open / idx_ira_member)."""
+        return self._issued_page(["ir.member_id = %s"], [member_id], after_id, limit, include_archived=True)
+
+    def loan_totals(self, member_id=None):
+        """Loan counts across live and archived history: {loans, open, returned, archived}."""
+        cond, params = ("WHERE member_id = %s", (member_id,)) if member_id is not None else ("", ())
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT
+                  (SELECT COUNT(*) FROM IssueReturn {cond}) AS live,
+                  (SELECT COUNT(*) FROM IssueReturn {cond + (' AND' if cond else 'WHERE')} return_date IS NULL) AS open_loans,
+                  (SELECT COUNT(*) FROM IssueReturnArchive {cond}) AS archived
+            """, params * 3)
+            r = {k: int(v or 0) for k, v in cur.fetchone().items()}
+        finally:
+            cur.close()
+            conn.close()
+        return {"loans": r['live'] + r['archived'], "open": r['open_loans'],
+                "returned": r['live'] - r['open_loans'] + r['archived'], "archived": r['archived']}
+
+    def archive_history(self, before=None, batch_size=ARCHIVE_BATCH, pause=ARCHIVE_PAUSE, dry_run=False, progress=print):
+        """Move returned loans with return_date < before (default: ARCHIVE_AFTER_DAYS ago) from
+        IssueReturn to IssueReturnArchive, batch_size rows per short transaction, pausing between
+        batches so desks are never locked out for long. Open loans are never moved; neither is the
+        newest loan, so MySQL can't hand its issue_id out again after a restart. Idempotent."""
+        before = before or date.today() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        cols = "issue_id, copy_id, member_id, issue_date, due_date, return_date"
+        pick = ("SELECT issue_id FROM IssueReturn WHERE return_date IS NOT NULL AND return_date < %s "
+                "AND issue_id < (SELECT MAX(issue_id) FROM IssueReturn) LIMIT %s")
+        if dry_run:
+            conn = get_conn()
+            cur = conn.cursor()
+            try:
+                cur.execute(f"SELECT COUNT(*) FROM ({pick.replace(' LIMIT %s', '')}) t", (before,))
+                return {"cutoff": before, "archived": 0, "eligible": int(cur.fetchone()[0]), "batches": 0}
+            finally:
+                cur.close()
+                conn.close()
+        total = batches = 0
+        while True:
+            with unit_of_work() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(pick, (before, int(batch_size)))
+                    ids = [r[0] for r in cur.fetchall()]
+                    if ids:
+                        marks = _placeholders(len(ids))
+                        # returned loans never change again, so copy-then-delete by id is safe
+                        cur.execute(f"INSERT INTO IssueReturnArchive ({cols}, archived_at) SELECT {cols}, %s "
+                                    f"FROM IssueReturn WHERE issue_id IN ({marks})", (datetime.now(), *ids))
+                        cur.execute(f"DELETE FROM IssueReturn WHERE issue_id IN ({marks}) AND return_date IS NOT NULL",
+                                    tuple(ids))
+                        self._journal(cur, [("history_archived", min(ids), {"loans": len(ids), "cutoff": before})])
+                finally:
+                    cur.close()
+            if not ids:
+                break
+            total += len(ids)
+            batches += 1
+            if progress and batches % 10 == 0:
+                progress(f"archived {total} loans")
+            if len(ids) < batch_size:
+                break
+            time.sleep(pause)
+        if progress:
+            progress(f"Archive finished: {total} loans returned before {before} in {batches} batches")
+        return {"cutoff": before, "archived": total, "batches": batches}
+
+    def list_open_loans(self, after_id=None, limit=CATALOG_PAGE_SIZE, member_id=None, copy_id=None, overdue_only=False):
+        """Loans not yet returned, filtered in SQL (idx_ir_open / idx_ir_member_open / idx_ir_copy_open)."""
+        where, params = ["ir.return_date IS NULL"], []
+        if member_id is not None:
+            where.append("ir.member_id = %s"); params.append(member_id)
+        if copy_id is not None:
+            where.append("ir.copy_id = %s"); params.append(copy_id)
+        if overdue_only:
+            where.append("ir.due_date < %s"); params.append(date.today())
+        return self._issued_page(where, params, after_id, limit)
+
+    def list_available_copies(self, book_id):
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SELECT * FROM BookCopies WHERE book_id = %s AND availability = 'Available' ORDER BY copy_id",
+                        (book_id,))
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    # hot queries whose plans must use an index: name -> (sql, sample params)
+    HOT_QUERIES = {
+        "open_loans": ("SELECT issue_id FROM IssueReturn ir WHERE ir.return_date IS NULL", ()),
+        "archive_candidates": ("SELECT issue_id FROM IssueReturn WHERE return_date IS NOT NULL AND return_date < %s",
+                               (date(2000, 1, 1),)),
+        "overdue_loans": ("SELECT COUNT(*) FROM IssueReturn WHERE return_date IS NULL AND due_date < %s", (date(2000, 1, 1),)),
+        "member_open_loans": ("SELECT issue_id FROM IssueReturn WHERE member_id = %s AND return_date IS NULL", (1,)),
+        "copy_open_loan": ("SELECT issue_id FROM IssueReturn WHERE copy_id = %s AND return_date IS NULL", (1,)),
+        "available_copies": ("SELECT copy_id FROM BookCopies WHERE book_id = %s AND availability = 'Available'", (1,)),
+        "publisher_by_name": ("SELECT publisher_id FROM Publishers WHERE publisher_name = %s", ("x",)),
+        "author_by_name": ("SELECT author_id FROM Authors WHERE author_name = %s", ("x",)),
+        "books_by_genre": ("SELECT book_id FROM Books WHERE genre = %s ORDER BY book_id DESC LIMIT 50", ("x",)),
+    }
+
+    def explain_hot_queries(self):
+        """EXPLAIN every HOT_QUERIES entry; uses_index is False when the plan is a full scan."""
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        try:
+            report = []
+            for name, (sql, params) in self.HOT_QUERIES.items():
+                report.append(dict(get_backend().explain(cur, sql, params), query=name))
+            return report
+        finally:
+            cur.close()
+            conn.close()
+
+    def return_book(self, issue_id):
+        """Close a loan. Returns the fine plus what changed (issue_id, copy_id, book_id, member_id,
+        due_date, return_date, was_overdue) so callers can patch their views without re-reading."""
+        today = date.today()
+        with unit_of_work() as conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                # the conditional UPDATE is the open-loan check: of two desks returning the same
+                # loan, exactly one sees rowcount 1
+                cur.execute("UPDATE IssueReturn SET return_date = %s WHERE issue_id = %s AND return_date IS NULL",
+                            (today, issue_id))
+                closed = cur.rowcount == 1
+                cur.execute("SELECT ir.*, c.book_id FROM IssueReturn ir LEFT JOIN BookCopies c ON ir.copy_id = c.copy_id "
+                            "WHERE ir.issue_id = %s", (issue_id,))
+                rec = cur.fetchone()
+                if not rec:
+                    raise Conflict("Issue record not found.")
+                if not closed:
+                    raise Conflict("Already returned.")
+                # mark copy available
+                cur.execute("UPDATE BookCopies SET availability='Available' WHERE copy_id = %s", (rec['copy_id'],))
+                # compute fine
+                days_late = self.fine_policy.days_late(rec['due_date'], today)
+                fine = self.fine_policy.fine(days_late)
+                was_overdue = rec['due_date'] is not None and rec['due_date'] < today
+                self._journal(cur, [self._return_event(rec, fine, was_overdue)])
+            finally:
+                cur.close()
+            after_commit(lambda: self._bump_stats(open_loans=-1, available_copies=1,
+                                                  overdue_loans=-1 if was_overdue else 0))
+        return {"days_late": days_late, "fine": fine, "issue_id": rec['issue_id'], "copy_id": rec['copy_id'],
+                "book_id": rec['book_id'], "member_id": rec['member_id'], "due_date": rec['due_date'],
+                "return_date": today, "was_overdue": was_overdue}
+
+    def return_many(self, issue_ids):
+        """Close a batch of loans in one transaction with set-based statements. Returns one result
+        per distinct issue_id, in input order: return_book()'s dict plus "ok", or {"issue_id", "ok": False, "error"}."""
+        ids = list(dict.fromkeys(int(i) for i in issue_ids))
+        if not ids:
+            return []
+        today = date.today()
+        with unit_of_work() as conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute("SELECT ir.issue_id, ir.copy_id, ir.member_id, ir.due_date, ir.return_date, c.book_id "
+                            "FROM IssueReturn ir LEFT JOIN BookCopies c ON ir.copy_id = c.copy_id "
+                            f"WHERE ir.issue_id IN ({_placeholders(len(ids))}) FOR UPDATE", tuple(ids))
+                recs = {r['issue_id']: r for r in cur.fetchall()}
+                closing = [i for i in ids if i in recs and recs[i]['return_date'] is None]
+                if closing:
+                    cur.execute(f"UPDATE IssueReturn SET return_date = %s WHERE issue_id IN ({_placeholders(len(closing))})",
+                                (today, *closing))
+                    copies = [recs[i]['copy_id'] for i in closing]
+                    cur.execute(f"UPDATE BookCopies SET availability='Available' WHERE copy_id IN ({_placeholders(len(copies))})",
+                                tuple(copies))
+                days = [self.fine_policy.days_late(recs[i]['due_date'], today) for i in closing]
+                fines = dict(zip(closing, zip(days, self.fine_policy.fines(days))))
+                overdue = {i for i in closing if recs[i]['due_date'] is not None and recs[i]['due_date'] < today}
+                self._journal(cur, [self._return_event(recs[i], fines[i][1], i in overdue) for i in closing])
+            finally:
+                cur.close()
+            if closing:
+                after_commit(lambda: self._bump_stats(open_loans=-len(closing), available_copies=len(closing),
+                                                      overdue_loans=-len(overdue)))
+        results = []
+        for i in ids:
+            rec = recs.get(i)
+            if i in fines:
+                d, fine = fines[i]
+                was_overdue = i in overdue
+                results.append({"issue_id": i, "ok": True, "days_late": d, "fine": fine, "copy_id": rec['copy_id'],
+                                "book_id": rec['book_id'], "member_id": rec['member_id'], "due_date": rec['due_date'],
+                                "return_date": today, "was_overdue": was_overdue})
+            else:
+                results.append({"issue_id": i, "ok": False,
+                                "error": "Issue record not found." if rec is None else "Already returned."})
+        return results
+
+    def return_copies(self, copy_ids):
+        """return_many() for scanned copy barcodes: finds each copy's open loan (idx_ir_copy_open) and
+        closes them in the same transaction. Copies with no open loan get {"copy_id", "ok": False, "error"}."""
+        ids = list(dict.fromkeys(int(c) for c in copy_ids))
+        if not ids:
+            return []
+        with unit_of_work() as conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(f"SELECT copy_id, issue_id FROM IssueReturn WHERE copy_id IN ({_placeholders(len(ids))}) "
+                            "AND return_date IS NULL", tuple(ids))
+                open_loans = {r['copy_id']: r['issue_id'] for r in cur.fetchall()}
+            finally:
+                cur.close()
+            by_issue = {r['issue_id']: r for r in self.return_many([open_loans[c] for c in ids if c in open_loans])}
+        return [by_issue[open_loans[c]] if c in open_loans else {"copy_id": c, "ok": False, "error": "Copy is not on loan."}
+                for c in ids]
+
+class EventConsumer:
+    """Tails the circulation journal from a sequence number (None = from now on).
+    seq is allocated when a write inserts its event, so with concurrent writers a later seq can
+    commit first: poll() stops in front of a gap and only skips it once it has stayed open for
+    gap_grace seconds (the write was rolled back). Works with LibraryDB or RemoteLibraryDB."""
+    def __init__(self, db, after_seq=0, batch=1000, gap_grace=EVENT_GAP_GRACE):
+        self.db = db
+        self.position = db.last_event_seq() if after_seq is None else int(after_seq)
+        self.batch = batch
+        self.gap_grace = gap_grace
+        self._gap = None  # (first missing seq, monotonic time first seen)
+
+    @property
+    def waiting(self):
+        """True while poll() is held up in front of a sequence gap."""
+        return self._gap is not None
+
+    def poll(self):
+        events = []
+        for e in self.db.read_events(self.position, self.batch):
+            expected = self.position + 1
+            if e['seq'] != expected:
+                if self._gap is None or self._gap[0] != expected:
+                    self._gap = (expected, time.monotonic())
+                if time.monotonic() - self._gap[1] < self.gap_grace:
+                    break
+            self._gap = None
+            events.append(e)
+            self.position = e['seq']
+        return events
+
+    def follow(self, interval=1.0, stop=None):
+        """Yield events as they commit until stop (a threading.Event) is set."""
+        while stop is None or not stop.is_set():
+            events = self.poll()
+            yield from events
+            if len(events) < self.batch:
+                if stop is not None:
+                    stop.wait(interval)
+                else:
+                    time.sleep(interval)
+
+# ---------- BULK IMPORT ----------
+def _split_authors(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return list(dict.fromkeys(a.strip() for a in value if a and a.strip()))
+
+def _opt_int(value, default=None):
+    if value is None or value == "":
+        return default
+    return int(value)
+
+def iter_catalog_records(path, fmt=None):
+    """Stream (record_no, record) from a CSV (header row) or JSONL file, one record at a time.
+    Columns/keys: title, publisher, publication_year, genre, authors (comma separated or list), copies."""
+    fmt = fmt or ("jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    with open(path, newline="", encoding="utf-8") as fh:
+        if fmt == "csv":
+            rows = csv.DictReader(fh)
+        else:
+            rows = (json.loads(line) for line in fh if line.strip())
+        for n, r in enumerate(rows, 1):
+            try:
+                rec = {
+                    "title": (r.get("title") or "").strip(),
+                    "publisher": (r.get("publisher") or r.get("publisher_name") or "").strip() or None,
+                    "publication_year": _opt_int(r.get("publication_year") or r.get("year")),
+                    "genre": (r.get("genre") or "").strip() or None,
+                    "authors": _split_authors(r.get("authors")),
+                    "copies": max(1, _opt_int(r.get("copies"), 1)),
+                }
+            except (ValueError, TypeError):
+                rec = None  # malformed number; the importer counts it as skipped
+            yield n, rec
+
+class BulkImporter:
+    """Headless catalog import: batches of records go in with multi-row inserts, one
+    transaction per batch, with a checkpoint file so an interrupted run resumes."""
+    def __init__(self, db, batch_size=IMPORT_BATCH_SIZE, checkpoint_path=None, progress=print):
+        self.db = db
+        self.batch_size = max(1, int(batch_size))
+        self.checkpoint_path = checkpoint_path
+        self.progress = progress or (lambda msg: None)
+        # in-memory dedupe across the whole run (name -> id)
+        self.publisher_ids = {}
+        self.author_ids = {}
+        self.imported = 0
+        self.skipped = 0
+        self._consecutive_ids = None
+
+    # ----- checkpoint -----
+    def load_checkpoint(self, source):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, encoding="utf-8") as fh:
+            cp = json.load(fh)
+        if cp.get("source") != os.path.abspath(source):
+            raise RuntimeError(f"Checkpoint {self.checkpoint_path} belongs to {cp.get('source')}, not {source}.")
+        return int(cp.get("records_done", 0))
+
+    def save_checkpoint(self, source, records_done):
+        if not self.checkpoint_path:
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"source": os.path.abspath(source), "records_done": records_done,
+                       "imported": self.imported, "skipped": self.skipped}, fh)
+        os.replace(tmp, self.checkpoint_path)
+
+    # ----- run -----
+    def run(self, path, fmt=None):
+        done = self.load_checkpoint(path)
+        if done:
+            self.progress(f"Resuming {path} after record {done}")
+        started = time.monotonic()
+        batch, last_no = [], done
+        for n, rec in iter_catalog_records(path, fmt):
+            if n <= done:
+                continue
+            last_no = n
+            if not rec or not rec["title"]:
+                self.skipped += 1
+                continue
+            batch.append(rec)
+            if len(batch) >= self.batch_size:
+                self._flush(batch, path, last_no, started)
+                batch = []
+        self._flush(batch, path, last_no, started)
+        elapsed = time.monotonic() - started
+        self.progress(f"Import finished: {self.imported} books, {self.skipped} skipped, "
+                      f"{self.imported / elapsed if elapsed else 0:.0f} rows/s")
+        return {"imported": self.imported, "skipped": self.skipped, "seconds": round(elapsed, 3)}
+
+    def _flush(self, batch, path, last_no, started):
+        if batch:
+            with unit_of_work() as conn:
+                cur = conn.cursor()
+                try:
+                    self._write_batch(cur, batch)
+                finally:
+                    cur.close()
+            self.imported += len(batch)
+            self.db.invalidate_stats()
+        # checkpoint only after the batch is committed
+        self.save_checkpoint(path, last_no)
+        elapsed = time.monotonic() - started
+        if batch:
+            self.progress(f"{self.imported} books imported ({self.imported / elapsed if elapsed else 0:.0f} rows/s)")
+
+    def _resolve_cached(self, cache, resolve, cur, names):
+        new = list(dict.fromkeys(n for n in names if n not in cache))
+        if new:
+            cache.update(resolve(cur, new))
+        return cache
+
+    def _insert_books(self, cur, batch):
+        if self._consecutive_ids is None:
+            self._consecutive_ids = get_backend().consecutive_insert_ids(cur)
+        values = [(r["title"], self.publisher_ids.get(r["publisher"]) if r["publisher"] else None,
+                   r["publication_year"], r["genre"]) for r in batch]
+        if not self._consecutive_ids:
+            ids = []
+            for v in values:
+                cur.execute("INSERT INTO Books (title, publisher_id, publication_year, genre) VALUES (%s,%s,%s,%s)", v)
+                ids.append(cur.lastrowid)
+            return ids
+        ids = []
+        for start in range(0, len(values), INSERT_CHUNK):
+            chunk = values[start:start + INSERT_CHUNK]
+            cur.execute(f"INSERT INTO Books (title, publisher_id, publication_year, genre) VALUES "
+                        f"{_placeholders(len(chunk), '(%s,%s,%s,%s)')}", tuple(x for v in chunk for x in v))
+            first = get_backend().first_insert_id(cur, len(chunk))
+            ids.extend(range(first, first + len(chunk)))
+        return ids
+
+    def _write_batch(self, cur, batch):
+        self._resolve_cached(self.publisher_ids, self.db._resolve_publishers, cur,
+                             [r["publisher"] for r in batch if r["publisher"]])
+        self._resolve_cached(self.author_ids, self.db._resolve_authors, cur,
+                             [a for r in batch for a in r["authors"]])
+        book_ids = self._insert_books(cur, batch)
+        after_commit(lambda: self.db._index_books([(b, r["title"], ", ".join(r["authors"]), r["publisher"], r["genre"])
+                                                   for b, r in zip(book_ids, batch)]))
+        links, copies = [], []
+        for book_id, r in zip(book_ids, batch):
+            for aid in dict.fromkeys(self.author_ids[a] for a in r["authors"]):
+                links.append((book_id, aid))
+            copies.extend([book_id] * r["copies"])
+        for start in range(0, len(links), INSERT_CHUNK):
+            chunk = links[start:start + INSERT_CHUNK]
+            cur.execute(f"INSERT IGNORE INTO BookAuthors (book_id, author_id) VALUES {_placeholders(len(chunk), '(%s,%s)')}",
+                        tuple(x for l in chunk for x in l))
+        for start in range(0, len(copies), INSERT_CHUNK):
+            chunk = copies[start:start + INSERT_CHUNK]
+            rows = _placeholders(len(chunk), "(%s,'Available')")
+            cur.execute(f"INSERT INTO BookCopies (book_id, availability) VALUES {rows}", tuple(chunk))
+        self.db._journal(cur, [("books_imported", book_ids[0], {"books": len(book_ids), "first_book_id": book_ids[0],
+                                                                "last_book_id": book_ids[-1], "copies": len(copies)})])
+
+# ---------- ANALYTICS ----------
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _group_sums(keys, n, columns):
+    """For each column, per-key sums over n keys (None = count). bincount when numpy is there."""
+    np = _numpy()
+    if np is not None:
+        keys = np.asarray(keys, dtype=np.int64)
+        return [np.bincount(keys, weights=None if c is None else np.asarray(c, dtype=np.float64), minlength=n).tolist()
+                for c in columns]
+    out = []
+    for c in columns:
+        sums = [0] * n
+        if c is None:
+            for k in keys:
+                sums[k] += 1
+        else:
+            for k, v in zip(keys, c):
+                sums[k] += v
+        out.append(sums)
+    return out
+
+class CirculationAnalytics:
+    """Utilization over all loan history, live and archived: loans per copy, turnover by genre and
+    publisher, top titles, idle copies and average loan duration.
+    Loans are held as compact integer columns (copy_id, issue day, return day; days since 1970,
+    -1 = open), loaded once in chunks and then topped up with what was issued or returned since.
+    Results are cached until the circulation journal moves (an EventConsumer, so a write still
+    committing behind a sequence gap counts as a move), so a repeat call is free until
+    circulation changes. The per-loan pass is vectorized when numpy is installed."""
+    # archiving moves rows between the tables but never creates ids, so both are read past the
+    # high-water mark, in one statement so that a loan archived meanwhile is read exactly once
+    LOAN_SELECT = " UNION ALL ".join(
+        "SELECT issue_id, copy_id, DATEDIFF(issue_date, '1970-01-01'), "
+        f"COALESCE(DATEDIFF(return_date, '1970-01-01'), -1) FROM {table} WHERE issue_id > %s"
+        for table in ("IssueReturn", "IssueReturnArchive"))
+
+    def __init__(self, db, chunk_size=ANALYTICS_CHUNK, idle_days=ANALYTICS_IDLE_DAYS, top_n=ANALYTICS_TOP_N,
+                 gap_grace=EVENT_GAP_GRACE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.idle_days = idle_days
+        self.top_n = top_n
+        self.gap_grace = gap_grace
+        self.loan_copy = array('i')
+        self.issue_day = array('i')
+        self.return_day = array('i')
+        self.high_water = 0  # largest issue_id loaded
+        self._gaps = {}      # issue_id missing below high_water -> monotonic time first missed
+        self._open = {}      # issue_id -> column position, loans open when last seen
+        self._lock = threading.Lock()
+        self._events = None  # EventConsumer; the cache is good while it sees nothing new
+        self._cached = None  # (as_of, result)
+
+    def refresh_loans(self):
+        """Load the loans not loaded yet and the returns of loans that were open.
+        issue_id is allocated at INSERT, so with concurrent desks a lower id can commit after a
+        higher one was loaded: ids missing below the high-water mark are read again on each
+        refresh until they turn up or have been missing for gap_grace seconds (the insert was
+        rolled back or the row deleted), the way EventConsumer treats sequence gaps."""
+        now = time.monotonic()
+        self._gaps = {i: t for i, t in self._gaps.items() if now - t < self.gap_grace}
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            hw = top = self.high_water
+            watch = hw  # missing ids above this become gaps
+            if not hw:
+                # first load: only the newest ids can still be uncommitted
+                cur.execute("SELECT GREATEST((SELECT COALESCE(MAX(issue_id), 0) FROM IssueReturn), "
+                            "(SELECT COALESCE(MAX(issue_id), 0) FROM IssueReturnArchive))")
+                watch = max(0, cur.fetchone()[0] - ANALYTICS_GAP_WINDOW)
+            low = min(self._gaps, default=hw + 1) - 1
+            seen = set()
+            cur.execute(self.LOAN_SELECT, (low, low))
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                if low < hw:
+                    # read from the lowest gap up: of the rows below hw, keep the late ones
+                    late = [r for r in rows if r[0] <= hw and r[0] in self._gaps]
+                    for r in late:
+                        del self._gaps[r[0]]
+                    rows = late + [r for r in rows if r[0] > hw]
+                    if not rows:
+                        continue
+                ids, copies, issued, returned = zip(*rows)
+                start = len(self.loan_copy)
+                self.loan_copy.extend(copies)
+                self.issue_day.extend(issued)
+                self.return_day.extend(returned)
+                if -1 in returned:
+                    self._open.update((i, start + k) for k, (i, r) in enumerate(zip(ids, returned)) if r < 0)
+                newest = max(ids)
+                top = max(top, newest)
+                if newest > watch:
+                    seen.update(i for i in ids if i > watch)
+            if top > hw:
+                self._gaps.update((i, now) for i in range(watch + 1, top) if i not in seen)
+                self.high_water = top
+            if self._open:
+                cur.execute("SELECT issue_id FROM IssueReturn WHERE return_date IS NULL")
+                closed = sorted(set(self._open).difference(r[0] for r in cur.fetchall()))
+                for start in range(0, len(closed), INSERT_CHUNK):
+                    chunk = tuple(closed[start:start + INSERT_CHUNK])
+                    for table in ("IssueReturn", "IssueReturnArchive"):
+                        cur.execute(f"SELECT issue_id, DATEDIFF(return_date, '1970-01-01') FROM {table} "
+                                    f"WHERE issue_id IN ({_placeholders(len(chunk))}) AND return_date IS NOT NULL", chunk)
+                        for issue_id, day in cur.fetchall():
+                            self.return_day[self._open.pop(issue_id)] = day
+        finally:
+            cur.close()
+            conn.close()
+
+    def _load_catalog(self):
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT b.book_id, b.title, b.genre, p.publisher_name FROM Books b "
+                        "LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id ORDER BY b.book_id")
+            books = cur.fetchall()
+            cur.execute("SELECT copy_id, book_id, availability FROM BookCopies ORDER BY copy_id")
+            return books, cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _per_copy(self, copy_ids):
+        # the one pass over every loan: loans, latest issue day and returned-loan days per copy_id
+        np = _numpy()
+        n = max(max(copy_ids, default=0), max(self.loan_copy, default=0)) + 1
+        if np is not None:
+            lc = np.array(self.loan_copy, dtype=np.int64)
+            issued = np.array(self.issue_day, dtype=np.int64)
+            returned = np.array(self.return_day, dtype=np.int64)
+            done = returned >= 0
+            loans = np.bincount(lc, minlength=n)
+            dur_sum = np.bincount(lc[done], weights=(returned - issued)[done], minlength=n)
+            dur_n = np.bincount(lc[done], minlength=n)
+            last = np.full(n, -1, dtype=np.int64)
+            np.maximum.at(last, lc, issued)
+            idx = np.array(copy_ids, dtype=np.int64)
+            return loans[idx].tolist(), last[idx].tolist(), dur_sum[idx].tolist(), dur_n[idx].tolist()
+        loans, last, dur_sum, dur_n = [0] * n, [-1] * n, [0] * n, [0] * n
+        for c, i, r in zip(self.loan_copy, self.issue_day, self.return_day):
+            loans[c] += 1
+            if i > last[c]:
+                last[c] = i
+            if r >= 0:
+                dur_sum[c] += r - i
+                dur_n[c] += 1
+        return ([loans[c] for c in copy_ids], [last[c] for c in copy_ids],
+                [dur_sum[c] for c in copy_ids], [dur_n[c] for c in copy_ids])
+
+    def _journal_moved(self):
+        # new events since the last call, or one still committing behind a sequence gap
+        if self._events is None:
+            self._events = EventConsumer(self.db, None)
+            return True
+        moved = False
+        while True:
+            events = self._events.poll()
+            moved = moved or bool(events)
+            if len(events) < self._events.batch:
+                return moved or self._events.waiting
+
+    def compute(self, as_of=None, refresh=False):
+        """{summary, by_genre, by_publisher, top_titles, idle_copies}; refresh ignores the cache."""
+        as_of = as_of or date.today()
+        with self._lock:
+            moved = self._journal_moved()
+            if not refresh and not moved and self._cached and self._cached[0] == as_of:
+                return self._cached[1]
+            started = time.perf_counter()
+            self.refresh_loans()
+            books, copies = self._load_catalog()
+            result = self._aggregate(books, copies, as_of)
+            result["summary"].update(as_of=as_of.isoformat(), event_seq=self._events.position,
+                                     engine="numpy" if _numpy() else "python",
+                                     seconds=round(time.perf_counter() - started, 3))
+            self._cached = (as_of, result)
+            return result
+
+    def _aggregate(self, books, copies, as_of):
+        genres, publishers, book_pos = {}, {}, {}
+        book_genre, book_pub = [], []
+        for k, (book_id, title, genre, publisher) in enumerate(books):
+            book_pos[book_id] = k
+            book_genre.append(genres.setdefault(genre or "(none)", len(genres)))
+            book_pub.append(publishers.setdefault(publisher or "(none)", len(publishers)))
+        copies = [c for c in copies if c[1] in book_pos]  # a book added between the two reads
+        copy_ids = [c[0] for c in copies]
+        copy_book = [book_pos[c[1]] for c in copies]
+        loans, last, dur_sum, dur_n = self._per_copy(copy_ids)
+
+        def groups(keys, n, names):
+            ncopies, nloans, days, returned = _group_sums(keys, n, (None, loans, dur_sum, dur_n))
+            return [{"name": name, "copies": int(ncopies[g]), "loans": int(nloans[g]),
+                     "turnover": round(nloans[g] / ncopies[g], 2) if ncopies[g] else 0.0,
+                     "avg_loan_days": round(days[g] / returned[g], 1) if returned[g] else None}
+                    for name, g in names.items()]
+
+        book_stats = groups(copy_book, len(books), {b[0]: k for k, b in enumerate(books)})
+        by_genre = groups([book_genre[b] for b in copy_book], len(genres), genres)
+        by_publisher = groups([book_pub[b] for b in copy_book], len(publishers), publishers)
+        top = heapq.nlargest(self.top_n, range(len(books)), key=lambda k: book_stats[k]["loans"])
+        top_titles = [dict(book_stats[k], book_id=books[k][0], title=books[k][1], genre=books[k][2])
+                      for k in top if book_stats[k]["loans"]]
+        for row in top_titles:
+            del row["name"]
+
+        today = as_of.toordinal() - _EPOCH_ORDINAL
+        cutoff = today - self.idle_days
+        idle = [k for k, c in enumerate(copies) if c[2] == 'Available' and last[k] < cutoff]
+        idle.sort(key=lambda k: last[k])
+        idle_copies = [{"copy_id": copies[k][0], "book_id": copies[k][1], "title": books[copy_book[k]][1],
+                        "last_issued": date.fromordinal(last[k] + _EPOCH_ORDINAL).isoformat() if last[k] >= 0 else None,
+                        "idle_days": today - last[k] if last[k] >= 0 else None}
+                       for k in idle[:self.top_n]]
+        returned = sum(dur_n)
+        summary = {"books": len(books), "copies": len(copies), "loans": len(self.loan_copy), "open_loans": len(self._open),
+                   "loans_per_copy": round(sum(loans) / len(copies), 2) if copies else 0.0,
+                   "max_loans_per_copy": max(loans, default=0), "never_loaned_copies": loans.count(0),
+                   "avg_loan_days": round(sum(dur_sum) / returned, 1) if returned else None,
+                   "idle_copies": len(idle), "idle_after_days": self.idle_days}
+        return {"summary": summary,
+                "by_genre": sorted(by_genre, key=lambda g: -g["turnover"]),
+                "by_publisher": heapq.nlargest(self.top_n, by_publisher, key=lambda g: g["loans"]),
+                "top_titles": top_titles, "idle_copies": idle_copies}
+
+class CoBorrowIndex:
+    """"Members who borrowed this also borrowed": per book, sparse counts of the other books its
+    borrowers took. A loan of book B by member M adds 1 to (B, X) and (X, B) for each distinct
+    book X among M's previous `window` loans, unless B is one of them, so a replay of the same
+    history always gives the same counts. Built once from history, then kept current from
+    the circulation journal's issue events (this desk's and everyone else's), and saved with
+    its journal position so a restart only replays what happened since. After start(), a
+    background thread does the catching up; failures go to metrics (coborrow.catch_up errors)
+    and stats()["last_error"], and the next round retries from the same position."""
+    PREVIOUS_SQL = """
+        SELECT book_id FROM (
+          SELECT ir.issue_id, c.book_id FROM IssueReturn ir JOIN BookCopies c ON c.copy_id = ir.copy_id
+          WHERE ir.member_id = %s AND ir.issue_id < %s
+          UNION ALL
+          SELECT ir.issue_id, c.book_id FROM IssueReturnArchive ir JOIN BookCopies c ON c.copy_id = ir.copy_id
+          WHERE ir.member_id = %s AND ir.issue_id < %s
+        ) t ORDER BY issue_id DESC LIMIT %s
+    """
+
+    def __init__(self, db, path=CO_BORROW_PATH, window=CO_BORROW_WINDOW, cap=CO_BORROW_CAP, interval=CO_BORROW_POLL):
+        self.db = db
+        self.path = path
+        self.window = window
+        self.cap = cap
+        self.interval = interval
+        self.related = {}         # book_id -> {other book_id: count}
+        self.floor_issue_id = 0   # loans up to this issue_id were counted by build()
+        self.pruned = 0
+        self.events = None        # EventConsumer at the applied journal position; None until ready
+        self.last_error = None    # of the last background catch-up, None if it succeeded
+        self._lock = threading.Lock()      # guards related
+        self._catching = threading.Lock()  # one catch-up at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.events is not None
+
+    def _count(self, related, book_id, previous):
+        if book_id in previous:
+            return
+        for other in set(previous):
+            for a, b in ((book_id, other), (other, book_id)):
+                counts = related.get(a)
+                if counts is None:
+                    counts = related[a] = {}
+                counts[b] = counts.get(b, 0) + 1
+                if len(counts) > self.cap:
+                    # keep the strongest half; a weak pair that keeps recurring comes back
+                    keep = heapq.nlargest(self.cap // 2, counts.items(), key=lambda kv: kv[1])
+                    related[a] = dict(keep)
+                    self.pruned += len(counts) - len(keep)
+
+    def build(self, progress=None):
+        """Count the whole loan history, live and archived, member by member in issue order."""
+        position = self.db.last_event_seq()
+        related, floor = {}, 0
+        member, recent = None, None
+        rows = _stream("""
+            SELECT member_id, issue_id, book_id FROM (
+              SELECT ir.member_id, ir.issue_id, c.book_id FROM IssueReturn ir JOIN BookCopies c ON c.copy_id = ir.copy_id
+              UNION ALL
+              SELECT ir.member_id, ir.issue_id, c.book_id FROM IssueReturnArchive ir JOIN BookCopies c ON c.copy_id = ir.copy_id
+            ) t ORDER BY member_id, issue_id
+        """, dictionary=False)
+        for n, (member_id, issue_id, book_id) in enumerate(rows, 1):
+            if member_id != member:
+                member, recent = member_id, deque(maxlen=self.window)
+            self._count(related, book_id, recent)
+            recent.append(book_id)
+            floor = max(floor, issue_id)
+            if progress and n % 1000000 == 0:
+                progress(f"co-borrow index: {n} loans")
+        with self._lock:
+            self.related, self.floor_issue_id = related, floor
+        self.events = EventConsumer(self.db, position)
+        if progress:
+            progress(f"co-borrow index built: {len(related)} books, {self.pairs()} pairs")
+
+    def catch_up(self):
+        """Count the loans journaled since the last call; returns how many. No-op until ready."""
+        if not self.ready or not self._catching.acquire(blocking=False):
+            return 0
+        consumer = self.events
+        saved = (consumer.position, consumer._gap)
+        try:
+            updates = []
+            while True:
+                events = consumer.poll()
+                for e in events:
+                    if e['kind'] != "issue" or e['entity_id'] <= self.floor_issue_id:
+                        continue
+                    member_id, book_id = e['data']['member_id'], e['data']['book_id']
+                    conn = get_conn()
+                    cur = conn.cursor()
+                    try:
+                        cur.execute(self.PREVIOUS_SQL, (member_id, e['entity_id'], member_id, e['entity_id'], self.window))
+                        updates.append((book_id, [r[0] for r in cur.fetchall()]))
+                    finally:
+                        cur.close()
+                        conn.close()
+                if len(events) < consumer.batch:
+                    break
+            with self._lock:
+                for book_id, previous in updates:
+                    self._count(self.related, book_id, previous)
+            return len(updates)
+        except Exception:
+            consumer.position, consumer._gap = saved  # nothing was applied; retry from here
+            raise
+        finally:
+            self._catching.release()
+
+    def start(self):
+        """Catch up on a background thread every `interval` seconds, and soon after notify()."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._follow, name="coborrow-follow", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """A loan was committed here: have the background thread catch up now."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop the background thread, then save."""
+        self.stop()
+        self.save()
+
+    def _follow(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            t = time.perf_counter()
+            try:
+                self.catch_up()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            if _metrics is not None:
+                _metrics.record("coborrow.catch_up", time.perf_counter() - t, error=self.last_error is not None)
+
+    def top(self, book_id, k=CO_BORROW_TOP_K):
+        """[(other book_id, count)], strongest first."""
+        with self._lock:
+            counts = self.related.get(int(book_id))
+            return heapq.nlargest(k, counts.items(), key=lambda kv: kv[1]) if counts else []
+
+    def pairs(self):
+        with self._lock:
+            return sum(len(c) for c in self.related.values())
+
+    def stats(self):
+        return {"ready": self.ready, "books": len(self.related), "pairs": self.pairs(), "pruned": self.pruned,
+                "position": self.events.position if self.ready else None, "window": self.window, "cap": self.cap,
+                "following": self._thread is not None and self._thread.is_alive(), "last_error": self.last_error}
+
+    def save(self):
+        if not self.path or not self.ready or database_key() is None:
+            return
+        with self._lock:
+            data = {"database": database_key(), "window": self.window, "position": self.events.position,
+                    "floor_issue_id": self.floor_issue_id,
+                    "related": {b: [v for pair in counts.items() for v in pair] for b, counts in self.related.items()}}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore the saved index of this database; False if there is none."""
+        if not self.path or database_key() is None:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if data.get("database") != database_key() or data.get("window") != self.window:
+            return False
+        related = {int(b): dict(zip(flat[::2], flat[1::2])) for b, flat in data["related"].items()}
+        with self._lock:
+            self.related, self.floor_issue_id = related, data["floor_issue_id"]
+        self.events = EventConsumer(self.db, data["position"])
+        return True
+
+    def ensure(self, progress=None):
+        """Load or build, then catch up with the journal and save."""
+        if not self.ready and not self.load():
+            self.build(progress)
+        self.catch_up()
+        self.save()
+
+# ---------- EXPORTS ----------
+EXPORT_COLUMNS = {
+    "loans": ("issue_id", "copy_id", "book_id", "book_title", "member_id", "member_name",
+              "issue_date", "due_date", "return_date"),
+    "members": ("member_id", "full_name", "email", "phone", "membership_date"),
+    "catalog": ("book_id", "title", "authors", "publisher_name", "publication_year", "genre",
+                "total_copies", "available_copies"),
+}
+
+def _open_export(path):
+    # "-" is stdout; a .gz suffix compresses
+    if path == "-":
+        return nullcontext(sys.stdout)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def write_export(rows, path, columns, fmt=None, progress=print, every=EXPORT_PROGRESS_EVERY):
+    """Write a row stream as CSV (header row) or JSONL, one row at a time. fmt defaults to the
+    file extension (.csv / .jsonl, optionally + .gz). Returns the number of rows written."""
+    base = path[:-3] if path.endswith(".gz") else path
+    fmt = fmt or ("jsonl" if base.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    n = 0
+    t0 = time.monotonic()
+    with _open_export(path) as fh:
+        if fmt == "csv":
+            writer = csv.writer(fh)
+            writer.writerow(columns)
+            emit = lambda r: writer.writerow([r.get(c) for c in columns])
+        else:
+            emit = lambda r: fh.write(json.dumps({c: r.get(c) for c in columns}, default=_json_default) + "\n")
+        for n, r in enumerate(rows, 1):
+            emit(r)
+            if progress and n % every == 0:
+                progress(f"exported {n} rows ({n / max(time.monotonic() - t0, 1e-9):.0f} rows/s)")
+    if progress:
+        progress(f"Export finished: {n} rows to {path} in {time.monotonic() - t0:.1f}s")
+    return n
+
+# ---------- ISSUE LOAD TEST ----------
+def run_issue_load_test(db, desks=8, seconds=10.0, books=10, copies_per_book=3, any_copy_ratio=0.5, progress=print):
+    """Simulated desks hammer issue_book/issue_any_copy/return_book on a scratch set of books,
+    then the loans are checked for double issues. Meant for a local test database: it
+    writes rows and deletes them again afterwards, journal events included, so event
+    consumers (the co-borrow index, the GUI's event tail) never see loans that are gone."""
+    import random
+    tag = f"loadtest-{int(time.time())}"
+    member_id = db.add_member(tag)
+    book_ids = [db.add_book(f"{tag} #{i}", copies=copies_per_book) for i in range(books)]
+    copy_ids = [c['copy_id'] for b in book_ids for c in db.list_copies_for_book(b)]
+    counts = {"issued": 0, "conflicts": 0, "returned": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+    latencies = []
+
+    def desk(n):
+        rnd = random.Random(n)
+        mine = []
+        local = {k: 0 for k in counts}
+        lat = []
+        while time.monotonic() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                if mine and (rnd.random() < 0.4 or len(mine) > copies_per_book):
+                    db.return_book(mine.pop(rnd.randrange(len(mine))))
+                    local["returned"] += 1
+                elif rnd.random() < any_copy_ratio:
+                    mine.append(db.issue_any_copy(rnd.choice(book_ids), member_id)["issue_id"])
+                    local["issued"] += 1
+                else:
+                    mine.append(db.issue_book(rnd.choice(copy_ids), member_id))
+                    local["issued"] += 1
+            except ValueError:
+                local["conflicts"] += 1  # lost the race or nothing free — expected
+            except Exception:
+                local["errors"] += 1
+            lat.append(time.perf_counter() - t0)
+        with lock:
+            for k, v in local.items():
+                counts[k] += v
+            latencies.extend(lat)
+
+    if progress:
+        progress(f"{desks} desks, {books} books x {copies_per_book} copies, {seconds}s ...")
+    threads = [threading.Thread(target=desk, args=(i,)) for i in range(desks)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        marks = _placeholders(len(copy_ids))
+        # a copy with more than one open loan is a double issue
+        cur.execute(f"""SELECT copy_id FROM IssueReturn WHERE return_date IS NULL AND copy_id IN ({marks})
+                        GROUP BY copy_id HAVING COUNT(*) > 1""", tuple(copy_ids))
+        double_issued = [r[0] for r in cur.fetchall()]
+        # availability must agree with the open loans
+        cur.execute(f"""SELECT c.copy_id FROM BookCopies c
+                        LEFT JOIN IssueReturn ir ON ir.copy_id = c.copy_id AND ir.return_date IS NULL
+                        WHERE c.copy_id IN ({marks})
+                          AND ((c.availability = 'Issued') <> (ir.issue_id IS NOT NULL))""", tuple(copy_ids))
+        inconsistent = [r[0] for r in cur.fetchall()]
+        # clean up the scratch rows and the events they journaled
+        cur.execute(f"SELECT issue_id FROM IssueReturn WHERE copy_id IN ({marks})", tuple(copy_ids))
+        issue_ids = [r[0] for r in cur.fetchall()]
+        scratch = ((("issue", "return"), issue_ids), (("book_added",), book_ids), (("member_added",), [member_id]))
+        for kinds, ids in scratch:
+            for start in range(0, len(ids), INSERT_CHUNK):
+                chunk = ids[start:start + INSERT_CHUNK]
+                cur.execute(f"DELETE FROM CirculationEvents WHERE kind IN ({_placeholders(len(kinds))}) "
+                            f"AND entity_id IN ({_placeholders(len(chunk))})", (*kinds, *chunk))
+        cur.execute(f"DELETE FROM IssueReturn WHERE copy_id IN ({marks})", tuple(copy_ids))
+        cur.execute(f"DELETE FROM Books WHERE book_id IN ({_placeholders(len(book_ids))})", tuple(book_ids))
+        cur.execute("DELETE FROM Members WHERE member_id = %s", (member_id,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    db.invalidate_stats()
+
+    latencies.sort()
+    ops = len(latencies)
+    pct = lambda p: round(1000 * latencies[min(ops - 1, int(p * ops))], 3) if ops else None
+    report = dict(counts, desks=desks, seconds=round(elapsed, 3), ops=ops,
+                  ops_per_s=round(ops / elapsed, 1) if elapsed else 0.0,
+                  issues_per_s=round(counts["issued"] / elapsed, 1) if elapsed else 0.0,
+                  p50_ms=pct(0.50), p95_ms=pct(0.95), p99_ms=pct(0.99),
+                  double_issued=double_issued, inconsistent=inconsistent,
+                  ok=not double_issued and not inconsistent and not counts["errors"])
+    if progress:
+        progress(json.dumps(report))
+    return report
+
+# ---------- BENCHMARKS ----------
+# name -> (books, copies per book, members, loans); loans are mostly returned history
+BENCH_SCALES = {
+    "tiny": (1000, 2, 200, 3000),
+    "small": (10000, 2, 2000, 30000),
+    "medium": (100000, 2, 20000, 300000),
+    "large": (1000000, 2, 200000, 3000000),
+}
+BENCH_OPEN_LOAN_RATIO = 0.05  # share of loans still out
+
+def _bulk_insert(cur, table, cols, rows):
+    group = "(" + ",".join(["%s"] * len(cols)) + ")"
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        cur.execute(f"INSERT INTO {table} ({', '.join(cols)}) VALUES {_placeholders(len(chunk), group)}",
+                    tuple(v for r in chunk for v in r))
+
+def seed_synthetic_library(db, books, copies_per_book, members, loans, seed=42, progress=print):
+    """Fill an empty database with a deterministic synthetic library (same seed, same data).
+    Ids are explicit so every backend ends up with identical rows."""
+    import random
+    rnd = random.Random(seed)
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM Books")
+        if cur.fetchone()[0]:
+            raise RuntimeError("Benchmark seeding needs an empty database (or pass --reuse).")
+    finally:
+        cur.close()
+        conn.close()
+    genres = ["Fiction", "Mystery", "SF", "Fantasy", "History", "Science", "Poetry", "Children", "Biography", "Travel"]
+    syllables = ["ka", "lo", "mi", "ren", "to", "sa", "vel", "dor", "an", "qui", "bel", "ost"]
+    word = lambda: "".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))).capitalize()
+    n_pub, n_auth = max(1, books // 200), max(1, books // 20)
+    today = date.today()
+    batch = 50000
+
+    def write(table, cols, gen, total):
+        rows = []
+        for r in gen:
+            rows.append(r)
+            if len(rows) >= batch:
+                with unit_of_work() as conn:
+                    c = conn.cursor()
+                    _bulk_insert(c, table, cols, rows)
+                    c.close()
+                rows = []
+        if rows:
+            with unit_of_work() as conn:
+                c = conn.cursor()
+                _bulk_insert(c, table, cols, rows)
+                c.close()
+        if progress:
+            progress(f"seeded {total} {table}")
+
+    write("Publishers", ("publisher_id", "publisher_name"),
+          ((i, f"{word()} Press {i}") for i in range(1, n_pub + 1)), n_pub)
+    write("Authors", ("author_id", "author_name"),
+          ((i, f"{word()} {word()} {i}") for i in range(1, n_auth + 1)), n_auth)
+    write("Books", ("book_id", "title", "publisher_id", "publication_year", "genre"),
+          ((i, f"{word()} {word()} {word()}", rnd.randint(1, n_pub), rnd.randint(1900, today.year), rnd.choice(genres))
+           for i in range(1, books + 1)), books)
+    write("BookAuthors", ("book_id", "author_id"),
+          ((b, a) for b in range(1, books + 1) for a in sorted(rnd.sample(range(1, n_auth + 1), min(n_auth, rnd.randint(1, 2))))),
+          books)
+    n_copies = books * copies_per_book
+    write("Members", ("member_id", "full_name", "email", "membership_date"),
+          ((i, f"{word()} {word()}", f"m{i}@example.org", today - timedelta(days=rnd.randint(0, 3650)))
+           for i in range(1, members + 1)), members)
+    n_open = min(int(loans * BENCH_OPEN_LOAN_RATIO), n_copies)
+    open_copies = set(rnd.sample(range(1, n_copies + 1), n_open))
+    write("BookCopies", ("copy_id", "book_id", "availability"),
+          ((c, (c - 1) // copies_per_book + 1, "Issued" if c in open_copies else "Available")
+           for c in range(1, n_copies + 1)), n_copies)
+
+    def loan_rows():
+        open_list = sorted(open_copies)
+        for i in range(1, loans + 1):
+            member = rnd.randint(1, members)
+            if i > loans - n_open:  # the newest loans are the open ones, one per issued copy
+                copy = open_list[i - (loans - n_open) - 1]
+                issued = today - timedelta(days=rnd.randint(0, 30))
+                yield (i, copy, member, issued, issued + timedelta(days=DEFAULT_LOAN_DAYS), None)
+            else:
+                copy = rnd.randint(1, n_copies)
+                issued = today - timedelta(days=rnd.randint(31, 1095))
+                returned = issued + timedelta(days=rnd.randint(1, 30))
+                yield (i, copy, member, issued, issued + timedelta(days=DEFAULT_LOAN_DAYS), returned)
+    write("IssueReturn", ("issue_id", "copy_id", "member_id", "issue_date", "due_date", "return_date"), loan_rows(), loans)
+    db.invalidate_stats()
+
+def _latency_summary(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    pct = lambda p: round(1000 * samples[min(n - 1, int(p * n))], 3)
+    total = sum(samples)
+    return {"n": n, "mean_ms": round(1000 * total / n, 3), "p50_ms": pct(0.50), "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99), "max_ms": round(1000 * samples[-1], 3), "ops_per_s": round(n / total, 1) if total else None}
+
+def benchmark_operations(db, rnd):
+    """name -> zero-arg callable. GUI load paths use the same fetches and window sizes as the tabs."""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT (SELECT MAX(book_id) FROM Books), (SELECT MAX(member_id) FROM Members)")
+        max_book, max_member = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+    window = max(GUI_PAGE_SIZE, 18 + GUI_PREFETCH_ROWS)
+
+    def issue_return():
+        try:
+            res = db.issue_any_copy(rnd.randint(1, max_book), rnd.randint(1, max_member))
+        except ValueError:
+            return
+        db.return_book(res["issue_id"])
+
+    def issue_return_copy():
+        book = rnd.randint(1, max_book)
+        copies = db.list_available_copies(book)
+        if copies:
+            db.return_book(db.issue_book(copies[0]['copy_id'], rnd.randint(1, max_member)))
+
+    return {
+        "list_books_page.first": lambda: db.list_books_page(),
+        "list_books_page.deep": lambda: db.list_books_page(rnd.randint(1, max_book)),
+        "list_books_page.genre": lambda: db.list_books_page(genre="Poetry"),
+        "list_books.full": lambda: db.list_books(),
+        "list_issued.full": lambda: db.list_issued(),
+        "list_open_loans.page": lambda: db.list_open_loans(),
+        "stats.uncached": lambda: db.stats(refresh=True),
+        "stats.cached": lambda: db.stats(),
+        "issue_any_copy+return_book": issue_return,
+        "issue_book+return_book": issue_return_copy,
+        "add_book.3_authors_5_copies": lambda: db.add_book(f"Bench {rnd.random()}", "Bench Press", 2020, "SF",
+                                                           "Bench A, Bench B, Bench C", 5),
+        "search_catalog": lambda: db.search_catalog(rnd.choice(["ka", "lo mi", "press", "dorsa", "velqui"])),
+        "gui.load_members": lambda: db.list_members_page(None, window),
+        "gui.load_books": lambda: db.list_books_page(None, window),
+        "gui.load_issued_list": lambda: db.list_open_loans(None, window),
+        "gui.load_logs": lambda: db.list_issued_page(None, window),
+        "gui.load_dashboard": lambda: db.stats(),
+    }
+
+def run_benchmarks(db, repeat=20, full_scan_repeat=3, seed=42, only=None, progress=print):
+    import random
+    rnd = random.Random(seed)
+    ops = benchmark_operations(db, rnd)
+    t0 = time.perf_counter()
+    db.build_search_index()
+    results = {"build_search_index": _latency_summary([time.perf_counter() - t0])}
+    for name, fn in ops.items():
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        n = full_scan_repeat if name.endswith(".full") else repeat
+        fn()  # warm-up
+        samples = []
+        for _ in range(n):
+            t = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t)
+        results[name] = _latency_summary(samples)
+        if progress:
+            progress(f"{name:<32} p50={results[name]['p50_ms']}ms p99={results[name]['p99_ms']}ms")
+    return results
+
+def compare_benchmarks(current, baseline, tolerance=0.25, metric="p50_ms", floor_ms=0.5):
+    """Operations whose metric got more than tolerance slower than the baseline run.
+    Differences under floor_ms are noise and ignored."""
+    regressions = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        b, c = base[metric], cur[metric]
+        if c - b > floor_ms and c > b * (1 + tolerance):
+            regressions.append({"op": name, "baseline": b, "current": c, "ratio": round(c / b, 2) if b else None})
+    return regressions
+
+# ---------- HTTP SERVICE ----------
+# `serve` runs LibraryDB headless behind a small HTTP/JSON API, so every desk shares one
+# connection pool, one set of caches and one search index. RemoteLibraryDB is the client side;
+# `--server URL` runs LibraryGUI on it as a thin client.
+def _json_default(o):
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    if hasattr(o, "__float__"):  # Decimal from MySQL aggregates
+        return float(o)
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+class BadRequest(ValueError):
+    pass
+
+def _qint(q, name, default=None):
+    v = q.get(name)
+    if v in (None, ""):
+        return default
+    try:
+        return int(v)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+
+def _need(body, name):
+    if body.get(name) in (None, ""):
+        raise BadRequest(f"{name} is required")
+    return body[name]
+
+class LibraryService:
+    """Maps (method, path) to LibraryDB calls. dispatch() -> (status, JSON-able payload)."""
+    def __init__(self, db):
+        self.db = db
+        self.routes = [
+            ("GET", r"/health", self.health),
+            ("GET", r"/stats", lambda m, q, b: db.stats(refresh=q.get("refresh") == "1")),
+            ("GET", r"/metrics", lambda m, q, b: _metrics.snapshot() if _metrics is not None else {"enabled": False}),
+            ("GET", r"/members", lambda m, q, b: db.list_members_page(_qint(q, "after"), _qint(q, "limit", CATALOG_PAGE_SIZE))),
+            ("POST", r"/members", lambda m, q, b: {"member_id": db.add_member(_need(b, "full_name"), b.get("email"), b.get("phone"))}),
+            ("GET", r"/books", lambda m, q, b: db.list_books_page(_qint(q, "after"), _qint(q, "limit", CATALOG_PAGE_SIZE),
+                                                                 genre=q.get("genre"), publisher=q.get("publisher"),
+                                                                 year=_qint(q, "year"))),
+            ("POST", r"/books", lambda m, q, b: {"book_id": db.add_book(_need(b, "title"), b.get("publisher"),
+                                                                         b.get("publication_year"), b.get("genre"),
+                                                                         b.get("authors"), b.get("copies", 1))}),
+            ("GET", r"/books/(\d+)", self.book),
+            ("GET", r"/books/(\d+)/also", lambda m, q, b: db.also_borrowed(int(m.group(1)), _qint(q, "limit", CO_BORROW_TOP_K))),
+            ("GET", r"/coborrow", lambda m, q, b: db.coborrow.stats()),
+            ("GET", r"/books/(\d+)/copies", lambda m, q, b: (db.list_available_copies if q.get("available") == "1"
+                                                             else db.list_copies_for_book)(int(m.group(1)))),
+            ("GET", r"/search", lambda m, q, b: db.search_catalog(q.get("q", ""), _qint(q, "limit", SEARCH_LIMIT))),
+            ("GET", r"/search/index", lambda m, q, b: dict(db.search_index.stats(), ready=True) if db.search_index is not None
+                                                      else {"books": 0, "ready": False}),
+            ("GET", r"/loans", self.loans),
+            ("GET", r"/events", lambda m, q, b: db.read_events(_qint(q, "after", 0), min(_qint(q, "limit", 1000), 10000))),
+            ("GET", r"/loans/totals", lambda m, q, b: db.loan_totals(_qint(q, "member_id"))),
+            ("GET", r"/analytics", self.analytics),
+            ("GET", r"/events/last", lambda m, q, b: {"seq": db.last_event_seq()}),
+            ("POST", r"/loans", self.issue),
+            ("POST", r"/loans/batch", lambda m, q, b: db.issue_many(_need(b, "member_id"), _need(b, "copy_ids"),
+                                                                   b.get("loan_days", DEFAULT_LOAN_DAYS),
+                                                                   bool(b.get("all_or_nothing")))),
+            ("POST", r"/loans/(\d+)/return", lambda m, q, b: db.return_book(int(m.group(1)))),
+            ("POST", r"/ops", lambda m, q, b: db.apply_ops(_need(b, "ops"))),
+            ("POST", r"/returns", lambda m, q, b: db.return_copies(b["copy_ids"]) if b.get("copy_ids")
+                                                  else db.return_many(_need(b, "issue_ids"))),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), fn) for method, pattern, fn in self.routes]
+
+    def health(self, m, q, b):
+        return {"ok": True, "backend": get_backend().name, "pool": self.db.pool_stats()}
+
+    def book(self, m, q, b):
+        rows = self.db.get_books([int(m.group(1))])
+        if not rows:
+            return 404, {"error": "Book not found."}
+        return rows[0]
+
+    def analytics(self, m, q, b):
+        try:
+            as_of = date.fromisoformat(q["as_of"]) if q.get("as_of") else None
+        except ValueError:
+            raise BadRequest("as_of must be YYYY-MM-DD")
+        return self.db.analytics(as_of, refresh=q.get("refresh") == "1")
+
+    def loans(self, m, q, b):
+        after, limit = _qint(q, "after"), _qint(q, "limit", CATALOG_PAGE_SIZE)
+        if q.get("ids"):
+            try:
+                return self.db.get_loans(int(i) for i in q["ids"].split(","))
+            except ValueError:
+                raise BadRequest("ids must be a comma separated list of integers")
+        if q.get("member_history"):
+            return self.db.member_history(_qint(q, "member_history"), after, limit)
+        if q.get("open") == "1":
+            return self.db.list_open_loans(after, limit, member_id=_qint(q, "member_id"), copy_id=_qint(q, "copy_id"),
+                                           overdue_only=q.get("overdue") == "1")
+        return self.db.list_issued_page(after, limit, include_archived=q.get("archived") == "1")
+
+    def issue(self, m, q, b):
+        member_id, days = _need(b, "member_id"), b.get("loan_days", DEFAULT_LOAN_DAYS)
+        if b.get("copy_id") is not None:
+            return self.db.issue_copy(b["copy_id"], member_id, days)
+        return self.db.issue_any_copy(_need(b, "book_id"), member_id, days)
+
+    def dispatch(self, method, path, query, body):
+        allowed = False
+        for m_, pattern, fn in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if m_ != method:
+                allowed = True
+                continue
+            try:
+                res = fn(match, query, body)
+            except Conflict as e:  # business-rule rejections: not available, already returned, ...
+                return 409, {"error": str(e)}
+            except ValueError as e:  # BadRequest, or a value that didn't parse
+                return 400, {"error": str(e)}
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                return 503, {"error": str(e)}  # the database is busy or down; worth retrying
+            if isinstance(res, tuple):
+                return res
+            return 200, res
+        return (405, {"error": "Method not allowed"}) if allowed else (404, {"error": "No such endpoint"})
+
+# http.server is only imported by `serve` (make_http_server); these mixins hold the logic
+class _ServiceHandler:
+    server_version = "LibraryService/1"
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        token = self.server.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            return self._send(401, {"error": "Unauthorized"})
+        url = urllib.parse.urlsplit(self.path)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+        except ValueError as e:
+            return self._send(400, {"error": f"Bad JSON: {e}"})
+        try:
+            status, payload = self.server.service.dispatch(method, url.path.rstrip("/") or "/", query, body)
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._send(status, payload)
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+class _PooledHTTPServer:
+    """HTTPServer that handles requests on a fixed thread pool; DB concurrency is further
+    bounded by the connection pool."""
+    def __init__(self, address, handler, service, workers=SERVICE_WORKERS, token=SERVICE_TOKEN, verbose=False):
+        super().__init__(address, handler)
+        self.service = service
+        self.token = token
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+def make_http_server(address, service, workers=SERVICE_WORKERS, token=SERVICE_TOKEN, verbose=False):
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    handler = type("ServiceHandler", (_ServiceHandler, BaseHTTPRequestHandler), {})
+    server_cls = type("LibraryHTTPServer", (_PooledHTTPServer, HTTPServer), {})
+    return server_cls(address, handler, service, workers=workers, token=token, verbose=verbose)
+
+def run_service(db, host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS, token=SERVICE_TOKEN, verbose=False):
+    server = make_http_server((host, port), LibraryService(db), workers=workers, token=token, verbose=verbose)
+    threading.Thread(target=db.build_search_index, name="search-index", daemon=True).start()
+    threading.Thread(target=db.build_coborrow_index, name="coborrow-index", daemon=True).start()
+    print(f"Serving on http://{host}:{server.server_address[1]} ({workers} workers, {get_backend().name} backend)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.coborrow.close()
+
+class RemoteLibraryDB:
+    """The LibraryDB methods the GUI uses, over the HTTP service. Rejections come back as
+    Conflict (409) or BadRequest (400), ValueErrors like the local calls; an unreachable service
+    or a 503 raises ServiceUnavailable, any other error status RuntimeError. Dates arrive as ISO strings."""
+    def __init__(self, base_url, token=SERVICE_TOKEN, timeout=SERVICE_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _call(self, method, path, params=None, body=None):
+        import urllib.error
+        import urllib.request
+        url = self.base_url + path
+        params = {k: (1 if v is True else v) for k, v in (params or {}).items() if v not in (None, False)}
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        headers = {"Accept": "application/json"}
+        data = None
+        if body is not None:
+            data = json.dumps(body, default=_json_default).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urllib.request.Request(url, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                msg = json.loads(e.read()).get("error") or str(e)
+            except ValueError:
+                msg = str(e)
+            if e.code == 409:
+                raise Conflict(msg) from None
+            if e.code == 400:
+                raise BadRequest(msg) from None
+            if e.code == 503:
+                raise ServiceUnavailable(msg) from None
+            raise RuntimeError(f"server error {e.code}: {msg}") from None
+        except (urllib.error.URLError, OSError) as e:  # refused, DNS, timed out
+            raise ServiceUnavailable(f"{self.base_url} unreachable: {getattr(e, 'reason', e)}") from None
+
+    def health(self):
+        return self._call("GET", "/health")
+
+    def stats(self, max_age=None, refresh=False):
+        return self._call("GET", "/stats", {"refresh": refresh})
+
+    def add_member(self, full_name, email=None, phone=None):
+        return self._call("POST", "/members", body={"full_name": full_name, "email": email, "phone": phone})["member_id"]
+
+    def list_members_page(self, after_id=None, limit=CATALOG_PAGE_SIZE):
+        return self._call("GET", "/members", {"after": after_id, "limit": limit})
+
+    def add_book(self, title, publisher_name=None, publication_year=None, genre=None, authors_csv=None, copies=1):
+        return self._call("POST", "/books", body={"title": title, "publisher": publisher_name, "publication_year": publication_year,
+                                                  "genre": genre, "authors": authors_csv, "copies": copies})["book_id"]
+
+    def list_books_page(self, after_id=None, limit=CATALOG_PAGE_SIZE, genre=None, publisher=None, year=None):
+        return self._call("GET", "/books", {"after": after_id, "limit": limit, "genre": genre, "publisher": publisher, "year": year})
+
+    def list_copies_for_book(self, book_id):
+        return self._call("GET", f"/books/{int(book_id)}/copies")
+
+    def list_available_copies(self, book_id):
+        return self._call("GET", f"/books/{int(book_id)}/copies", {"available": True})
+
+    def build_search_index(self, progress=None):
+        # the server owns the index; report its state
+        return types.SimpleNamespace(**self._call("GET", "/search/index"))
+
+    def search_catalog(self, query, limit=SEARCH_LIMIT):
+        return self._call("GET", "/search", {"q": query, "limit": limit})
+
+    def build_coborrow_index(self, progress=None):
+        return types.SimpleNamespace(**self._call("GET", "/coborrow"))
+
+    def also_borrowed(self, book_id, limit=CO_BORROW_TOP_K):
+        return self._call("GET", f"/books/{int(book_id)}/also", {"limit": limit})
+
+    def issue_copy(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self._call("POST", "/loans", body={"copy_id": copy_id, "member_id": member_id, "loan_days": loan_days})
+
+    def issue_book(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self.issue_copy(copy_id, member_id, loan_days)["issue_id"]
+
+    def issue_any_copy(self, book_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self._call("POST", "/loans", body={"book_id": book_id, "member_id": member_id, "loan_days": loan_days})
+
+    def issue_many(self, member_id, copy_ids, loan_days=DEFAULT_LOAN_DAYS, all_or_nothing=False):
+        return self._call("POST", "/loans/batch", body={"member_id": member_id, "copy_ids": list(copy_ids),
+                                                        "loan_days": loan_days, "all_or_nothing": all_or_nothing})
+
+    def return_book(self, issue_id):
+        return self._call("POST", f"/loans/{int(issue_id)}/return")
+
+    def return_many(self, issue_ids):
+        return self._call("POST", "/returns", body={"issue_ids": list(issue_ids)})
+
+    def return_copies(self, copy_ids):
+        return self._call("POST", "/returns", body={"copy_ids": list(copy_ids)})
+
+    def apply_ops(self, ops):
+        return self._call("POST", "/ops", body={"ops": ops})
+
+    def read_events(self, after_seq=0, limit=1000):
+        return self._call("GET", "/events", {"after": after_seq, "limit": limit})
+
+    def last_event_seq(self):
+        return self._call("GET", "/events/last")["seq"]
+
+    def get_loans(self, issue_ids):
+        return self._call("GET", "/loans", {"ids": ",".join(str(int(i)) for i in issue_ids)}) if issue_ids else []
+
+    def list_issued_page(self, after_id=None, limit=CATALOG_PAGE_SIZE, open_only=False, include_archived=False):
+        return self._call("GET", "/loans", {"after": after_id, "limit": limit, "open": open_only, "archived": include_archived})
+
+    def member_history(self, member_id, after_id=None, limit=CATALOG_PAGE_SIZE):
+        return self._call("GET", "/loans", {"member_history": member_id, "after": after_id, "limit": limit})
+
+    def loan_totals(self, member_id=None):
+        return self._call("GET", "/loans/totals", {"member_id": member_id})
+
+    def analytics(self, as_of=None, refresh=False):
+        return self._call("GET", "/analytics", {"as_of": as_of, "refresh": refresh})
+
+    def list_open_loans(self, after_id=None, limit=CATALOG_PAGE_SIZE, member_id=None, copy_id=None, overdue_only=False):
+        return self._call("GET", "/loans", {"after": after_id, "limit": limit, "open": True, "member_id": member_id,
+                                            "copy_id": copy_id, "overdue": overdue_only})
+
+# ---------- WRITE-BEHIND ----------
+class WriteBehindDB:
+    """Desk-side write-behind over a LibraryDB or RemoteLibraryDB. Issues and returns are
+    committed to a local SQLite journal and answered at once with {"queued": True, "op_id", ...};
+    a flusher thread replays them in order through the wrapped db's apply_ops(), WRITE_BEHIND_BATCH
+    at a time, and backs off while the database is unreachable. Outcomes (done, conflict when
+    the database rejected the op, or failed when it could not be applied at all) are put on
+    `completed`. Everything else goes straight through."""
+    # pending ops of a kind that may not be queued twice for the same target
+    _UNIQUE = {"issue": "copy_id", "return": "issue_id", "return_copy": "copy_id"}
+
+    def __init__(self, db, path=WRITE_BEHIND_PATH, batch=WRITE_BEHIND_BATCH, start=True):
+        self.db = db
+        self.path = path
+        self.batch = batch
+        self.completed = queue.SimpleQueue()  # (op, outcome)
+        self.last_flush = None
+        self.last_error = None
+        self._isolate = False  # replay one op at a time until the one that keeps failing is found
+        self._lock = threading.Lock()  # the journal connection is shared by desk and flusher threads
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        # autocommit + synchronous FULL: an op is on disk before the desk is told it's queued
+        for stmt in ("PRAGMA journal_mode = WAL", "PRAGMA synchronous = FULL",
+                     """CREATE TABLE IF NOT EXISTS DeskOps (
+                        op_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        op_key TEXT NOT NULL UNIQUE,
+                        kind TEXT NOT NULL,
+                        args TEXT NOT NULL,
+                        created_at TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        outcome TEXT)""",
+                     "CREATE INDEX IF NOT EXISTS idx_deskops_status ON DeskOps (status, op_id)"):
+            self._conn.execute(stmt)
+        self._conn.execute("DELETE FROM DeskOps WHERE status != 'pending' AND created_at < ?",
+                           ((datetime.now() - timedelta(days=WRITE_BEHIND_KEEP_DAYS)).isoformat(" "),))
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def _enqueue(self, kind, **args):
+        key = os.urandom(16).hex()
+        with self._lock:
+            field = self._UNIQUE.get(kind)
+            if field is not None:
+                for (raw,) in self._conn.execute("SELECT args FROM DeskOps WHERE status = 'pending' AND kind = ?", (kind,)):
+                    if json.loads(raw)[field] == args[field]:
+                        raise Conflict(f"Already queued ({kind} of {field.split('_')[0]} {args[field]}).")
+            op_id = self._conn.execute("INSERT INTO DeskOps (op_key, kind, args, created_at) VALUES (?,?,?,?)",
+                                       (key, kind, json.dumps(args), datetime.now().isoformat(" ", "seconds"))).lastrowid
+        self._wake.set()
+        return dict(args, ok=True, queued=True, op_id=op_id, key=key, kind=kind)
+
+    def issue_copy(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self._enqueue("issue", copy_id=int(copy_id), member_id=int(member_id), loan_days=int(loan_days))
+
+    def issue_book(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        # there is no issue_id until the op is synced; this returns the queued op
+        return self.issue_copy(copy_id, member_id, loan_days)
+
+    def issue_any_copy(self, book_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
+        return self._enqueue("issue_any", book_id=int(book_id), member_id=int(member_id), loan_days=int(loan_days))
+
+    def return_book(self, issue_id):
+        return self._enqueue("return", issue_id=int(issue_id))
+
+    def issue_many(self, member_id, copy_ids, loan_days=DEFAULT_LOAN_DAYS, all_or_nothing=False):
+        # each copy is queued (and later applied) on its own, so all_or_nothing can't hold here
+        return self._queue_each(lambda c: self.issue_copy(c, member_id, loan_days), copy_ids)
+
+    def return_copies(self, copy_ids):
+        return self._queue_each(lambda c: self._enqueue("return_copy", copy_id=c), copy_ids)
+
+    def _queue_each(self, enqueue, copy_ids):
+        results = []
+        for c in dict.fromkeys(int(c) for c in copy_ids):
+            try:
+                results.append(enqueue(c))
+            except ValueError as e:
+                results.append({"copy_id": c, "ok": False, "error": str(e)})
+        return results
+
+    def flush(self):
+        """Replay pending ops in order until none are left; returns how many were synced. While
+        the database is unreachable (is_transient) the error propagates, leaving the rest queued.
+        Any other failure is narrowed down by replaying one op at a time; the op that fails on
+        its own propagates too, and on its WRITE_BEHIND_MAX_ATTEMPTS-th failure it is set aside
+        as failed, so it can't hold up the ops queued behind it."""
+        synced = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT op_id, op_key, kind, args, attempts FROM DeskOps "
+                                          "WHERE status = 'pending' ORDER BY op_id LIMIT ?",
+                                          (1 if self._isolate else self.batch,)).fetchall()
+            if not rows:
+                return synced
+            ops = [{"key": key, "kind": kind, "args": json.loads(args)} for _, key, kind, args, _ in rows]
+            try:
+                outcomes = self.db.apply_ops(ops)
+                self.last_flush, self.last_error = datetime.now(), None
+                self._isolate = False
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if is_transient(e):
+                    raise
+                if len(rows) > 1:
+                    self._isolate = True
+                    continue
+                op_id, attempts = rows[0][0], rows[0][4] + 1
+                if attempts < WRITE_BEHIND_MAX_ATTEMPTS:
+                    with self._lock:
+                        self._conn.execute("UPDATE DeskOps SET attempts = ? WHERE op_id = ?", (attempts, op_id))
+                    raise
+                outcomes = [{"key": ops[0]["key"], "status": "failed", "error": self.last_error}]
+                self.last_error = None  # reported as failed; the database itself is fine
+            with self._lock:
+                self._conn.executemany("UPDATE DeskOps SET status = ?, outcome = ? WHERE op_id = ?",
+                                       [(out['status'], json.dumps(out, default=_json_default), row[0])
+                                        for row, out in zip(rows, outcomes)])
+            for op, out in zip(ops, outcomes):
+                self.completed.put((op, out))
+            synced += sum(out['status'] != "failed" for out in outcomes)
+
+    def _run(self):
+        delay = WRITE_BEHIND_RETRY[0]
+        while not self._stop.is_set():
+            try:
+                self.flush()
+                delay = WRITE_BEHIND_RETRY[0]
+                self._wake.wait(WRITE_BEHIND_RETRY[1])
+            except Exception:
+                self._wake.wait(delay)
+                delay = min(delay * 2, WRITE_BEHIND_RETRY[1])
+            self._wake.clear()
+
+    def status(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM DeskOps GROUP BY status").fetchall())
+        return {"pending": counts.get("pending", 0), "synced": counts.get("done", 0), "conflicts": counts.get("conflict", 0),
+                "failed": counts.get("failed", 0), "last_flush": self.last_flush, "last_error": self.last_error}
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+# ---------- GUI ----------
+class DBExecutor:
+    """Runs LibraryDB calls on worker threads and delivers results on the Tk thread (a
+    root.after poll drains a queue, so Tk is only ever touched from the main loop).
+    Jobs submitted under the same key collapse: an older job that hasn't started is
+    cancelled, and only the latest job's result is delivered."""
+    def __init__(self, root, workers=DB_WORKERS, on_busy=None):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="librarydb")
+        self.results = queue.SimpleQueue()
+        self.on_busy = on_busy
+        self.busy = 0
+        self._latest = {}  # key -> newest Future; Tk thread only
+        self._closed = False
+        self.root.after(RESULT_POLL_MS, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, **kwargs):
+        if key is not None:
+            self.cancel(key)
+        fut = self.pool.submit(fn, *args, **kwargs)
+        if key is not None:
+            self._latest[key] = fut
+        self._set_busy(1)
+        # done callbacks run on the worker (or here, if already done) — only hand off to the queue
+        fut.add_done_callback(lambda f: self.results.put((f, key, on_done, on_error)))
+        return fut
+
+    def cancel(self, key):
+        fut = self._latest.pop(key, None)
+        if fut is not None:
+            fut.cancel()  # no effect once running; its result is dropped on delivery instead
+
+    def _set_busy(self, delta):
+        self.busy += delta
+        if self.on_busy:
+            self.on_busy(self.busy)
+
+    def _poll(self):
+        if self._closed:
+            return
+        while True:
+            try:
+                fut, key, on_done, on_error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._set_busy(-1)
+            if fut.cancelled():
+                continue
+            if key is not None:
+                if self._latest.get(key) is not fut:
+                    continue  # superseded by a newer request
+                del self._latest[key]
+            exc = fut.exception()
+            try:
+                if exc is not None:
+                    (on_error or self._show_error)(exc)
+                elif on_done:
+                    on_done(fut.result())
+            except Exception as e:
+                self._show_error(e)
+        self.root.after(RESULT_POLL_MS, self._poll)
+
+    @staticmethod
+    def _show_error(exc):
+        messagebox.showerror("db error", str(exc))
+
+    def shutdown(self):
+        self._closed = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class PagedTable:
+    """Treeview fed by a keyset-paginated query: loads the visible window plus a prefetch
+    margin, pulls the next page as the user scrolls near the bottom, and keeps loaded rows.
+    fetch(after_key, limit) -> rows; key(row) -> the keyset value (also used as the row iid).
+    With an executor, pages are fetched in the background. With metrics on, fetch and
+    Treeview population are timed as gui.<name>.fetch / gui.<name>.render."""
+    def __init__(self, parent, columns, fetch, row_values, key, height=18,
+                 page_size=GUI_PAGE_SIZE, prefetch=GUI_PREFETCH_ROWS, executor=None, name="table"):
+        self.fetch = fetch
+        self.name = name
+        self.row_values = row_values
+        self.key = key
+        self.height = height
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.executor = executor
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', height=height)
+        for c in columns:
+            self.tree.heading(c, text=c)
+        self.scroll = ttk.Scrollbar(self.frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scroll.pack(side='right', fill='y')
+        self.after_key = None
+        self.exhausted = False
+        self._pending = False
 
-    # ---------- Members ----------
-    def add_member(self, full_name, email=None, phone=None, membership_date=None):
-        if not membership_date:
-            membership_date = date.today()
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
-            cur.execute("INSERT INTO Members (full_name, email, phone, membership_date) VALUES (%s,%s,%s,%s)",
-                        (full_name, email, phone, membership_date))
-            conn.commit()
-            return cur.lastrowid
-        finally:
-            cur.close()
-            conn.close()
+    def pack(self, **kw):
+        self.frame.pack(**kw)
 
-    def list_members(self):
-        conn = get_conn()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("SELECT * FROM Members ORDER BY member_id DESC")
-            return cur.fetchall()
-        finally:
-            cur.close()
-            conn.close()
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self.after_key = None
+        self.exhausted = False
+        self._pending = False
+        self.load_more(max(self.page_size, self.height + self.prefetch))
 
-    # ---------- Publishers & Authors ----------
-    def get_or_create_publisher(self, name, email=None, phone=None):
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
-            cur.execute("SELECT publisher_id FROM Publishers WHERE publisher_name = %s", (name,))
-            row = cur.fetchone()
-            if row:
-                return row[0]
-            cur.execute("INSERT INTO Publishers (publisher_name, contact_email, contact_phone) VALUES (%s,%s,%s)",
-                        (name, email, phone))
-            conn.commit()
-            return cur.lastrowid
-        finally:
-            cur.close()
-            conn.close()
+    def load_more(self, limit=None):
+        if self.exhausted:
+            self._pending = False
+            return
+        limit = limit or self.page_size
+        if self.executor is None:
+            self._pending = False
+            try:
+                rows = self._fetch(self.after_key, limit)
+            except Exception as e:
+                messagebox.showerror("db error", str(e))
+                return
+            self._append(rows, limit)
+            return
+        # keyed on the table: a reload supersedes a page still in flight
+        self._pending = True
+        self.executor.submit(self._fetch, self.after_key, limit, key=self,
+                             on_done=lambda rows: self._append(rows, limit),
+                             on_error=self._failed)
 
-    def get_or_create_author(self, author_name, country=None):
-        conn = get_conn()
-        cur = conn.cursor()
+    def _fetch(self, after_key, limit):
+        m = _metrics
+        if m is None:
+            return self.fetch(after_key, limit)
+        t = time.perf_counter()
         try:
-            cur.execute("SELECT author_id FROM Authors WHERE author_name = %s", (author_name,))
-            row = cur.fetchone()
-            if row:
-                return row[0]
-            cur.execute("INSERT INTO Authors (author_name, country) VALUES (%s,%s)", (author_name, country))
-            conn.commit()
-            return cur.lastrowid
+            return self.fetch(after_key, limit)
         finally:
-            cur.close()
-            conn.close()
+            m.record(f"gui.{self.name}.fetch", time.perf_counter() - t)
 
-    # ---------- Books & Copies ----------
-    def add_book(self, title, publisher_name=None, publication_year=None, genre=None, authors_csv=None, copies=1):
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
-            pub_id = None
-            if publisher_name:
-                pub_id = self.get_or_create_publisher(publisher_name)
-            cur.execute("INSERT INTO Books (title, publisher_id, publication_year, genre) VALUES (%s,%s,%s,%s)",
-                        (title, pub_id, publication_year, genre))
-            book_id = cur.lastrowid
-            # authors_csv: comma-separated list
-            if authors_csv:
-                authors = [a.strip() for a in authors_csv.split(",") if a.strip()]
-                for a in authors:
-                    author_id = self.get_or_create_author(a)
-                    # link
-                    c2 = conn.cursor()
-                    c2.execute("INSERT IGNORE INTO BookAuthors (book_id, author_id) VALUES (%s,%s)", (book_id, author_id))
-                    c2.close()
-            # create copies
-            for _ in range(max(1, int(copies))):
-                cur.execute("INSERT INTO BookCopies (book_id, availability) VALUES (%s,'Available')", (book_id,))
-            conn.commit()
-            return book_id
-        finally:
-            cur.close()
-            conn.close()
+    def show_rows(self, rows):
+        # fixed result set (e.g. search hits): replaces the contents, no further paging
+        if self.executor is not None:
+            self.executor.cancel(self)
+        self.tree.delete(*self.tree.get_children())
+        self._append(rows, len(rows) + 1)
 
-    def list_books(self):
-        conn = get_conn()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("""
-                SELECT b.book_id, b.title, p.publisher_name, b.publication_year, b.genre,
-                  (SELECT GROUP_CONCAT(a.author_name SEPARATOR ', ') 
-                      FROM Authors a JOIN BookAuthors ba ON a.author_id = ba.author_id WHERE ba.book_id = b.book_id) AS authors,
-                  (SELECT COUNT(*) FROM BookCopies c WHERE c.book_id = b.book_id) AS total_copies,
-                  (SELECT COUNT(*) FROM BookCopies c WHERE c.book_id = b.book_id AND c.availability='Available') AS available_copies
-                FROM Books b LEFT JOIN Publishers p ON b.publisher_id = p.publisher_id
-                ORDER BY b.book_id DESC
-            """)
-            return cur.fetchall()
-        finally:
-            cur.close()
-            conn.close()
+    def _failed(self, exc):
+        self._pending = False
+        messagebox.showerror("db error", str(exc))
 
-    def list_copies_for_book(self, book_id):
-        conn = get_conn()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("SELECT * FROM BookCopies WHERE book_id = %s ORDER BY copy_id", (book_id,))
-            return cur.fetchall()
-        finally:
-            cur.close()
-            conn.close()
+    def _append(self, rows, limit):
+        self._pending = False
+        t = time.perf_counter()
+        for r in rows:
+            iid = str(self.key(r))
+            if not self.tree.exists(iid):  # may already be there via insert_row()
+                self.tree.insert('', 'end', iid=iid, values=self.row_values(r))
+        if _metrics is not None:
+            _metrics.record(f"gui.{self.name}.render", time.perf_counter() - t)
+        if rows:
+            self.after_key = self.key(rows[-1])
+        self.exhausted = len(rows) < limit
 
-    # ---------- Issue & Return ----------
-    def issue_book(self, copy_id, member_id, loan_days=DEFAULT_LOAN_DAYS):
-        conn = get_conn()
-        cur = conn.cursor()
-        try:
-            # ensure copy is available
-            cur.execute("SELECT availability FROM BookCopies WHERE copy_id = %s", (copy_id,))
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("Copy not found.")
-            if row[0] != 'Available':
-                raise ValueError("Copy is not available.")
-            today = date.today()
-            due = today + timedelta(days=int(loan_days))
-            cur.execute("INSERT INTO IssueReturn (copy_id, member_id, issue_date, due_date) VALUES (%s,%s,%s,%s)",
-                        (copy_id, member_id, today, due))
-            cur.execute("UPDATE BookCopies SET availability='Issued' WHERE copy_id = %s", (copy_id,))
-            conn.commit()
-            return cur.lastrowid
-        finally:
-            cur.close()
-            conn.close()
+    # targeted updates for rows this desk just wrote; rows not loaded yet are left to paging
+    def insert_row(self, row):
+        """Show a new row at the top (tables are newest-first), or refresh it if already shown."""
+        iid = str(self.key(row))
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self.row_values(row))
+        else:
+            self.tree.insert('', 0, iid=iid, values=self.row_values(row))
 
-    def list_issued(self):
-        conn = get_conn()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("""
-              SELECT ir.issue_id, ir.copy_id, ir.member_id, ir.issue_date, ir.due_date, ir.return_date,
-                m.full_name AS member_name,
-                b.title AS book_title
-              FROM IssueReturn ir
-              LEFT JOIN Members m ON ir.member_id = m.member_id
-              LEFT JOIN BookCopies c ON ir.copy_id = c.copy_id
-              LEFT JOIN Books b ON c.book_id = b.book_id
-              ORDER BY ir.issue_id DESC
-            """)
-            return cur.fetchall()
-        finally:
-            cur.close()
-            conn.close()
+    def remove_row(self, key):
+        if self.tree.exists(str(key)):
+            self.tree.delete(str(key))
 
-    def return_book(self, issue_id):
-        conn = get_conn()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("SELECT * FROM IssueReturn WHERE issue_id = %s", (issue_id,))
-            rec = cur.fetchone()
-            if not rec:
-                raise ValueError("Issue record not found.")
-            if rec['return_date'] is not None:
-                raise ValueError("Already returned.")
-            today = date.today()
-            cur.execute("UPDATE IssueReturn SET return_date = %s WHERE issue_id = %s", (today, issue_id))
-            # mark copy available
-            cur.execute("UPDATE BookCopies SET availability='Available' WHERE copy_id = %s", (rec['copy_id'],))
-            conn.commit()
-            # compute fine
-            due = rec['due_date']
-            if due and today > due:
-                days_late = (today - due).days
-                fine = days_late * FINE_PER_DAY
-            else:
-                days_late = 0
-                fine = 0
-            return {"days_late": days_late, "fine": fine}
-        finally:
-            cur.close()
-            conn.close()
+    def set_cells(self, key, **values):
+        if self.tree.exists(str(key)):
+            for col, v in values.items():
+                self.tree.set(str(key), col, v)
+
+    def add_to_cell(self, key, column, delta):
+        if self.tree.exists(str(key)):
+            self.tree.set(str(key), column, int(self.tree.set(str(key), column) or 0) + delta)
+
+    def _on_scroll(self, first, last):
+        self.scroll.set(first, last)
+        if self.exhausted or self._pending:
+            return
+        loaded = len(self.tree.get_children())
+        if loaded and (1.0 - float(last)) * loaded < self.prefetch:
+            self._pending = True
+            self.tree.after_idle(self.load_more)
 
-# ---------- GUI ----------
 class LibraryGUI:
-    def __init__(self, root):
-        self.db = LibraryDB()
+    def __init__(self, root, db=None, startup_probe=False):
+        # db: a LibraryDB, or a RemoteLibraryDB to run as a thin client of `serve`
+        self.db = db or LibraryDB()
         self.root = root
         self.root.title("Library Manager — because humans need books")
         self.root.geometry("1000x650")
+        # ms since process start: window_ms, snapshot_ms (cached dashboard), first_data_ms
+        self.startup = {}
+        self._startup_probe = startup_probe
+        self._ready_text = "Ready"
+
+        self.status = ttk.Label(root, text="Ready", anchor='w', padding=(8, 2))
+        self.status.pack(side='bottom', fill='x')
+        self.write_behind = isinstance(self.db, WriteBehindDB)
+        if self.write_behind:
+            self.sync_status = ttk.Label(root, text="Sync: starting", anchor='w', padding=(8, 2))
+            self.sync_status.pack(side='bottom', fill='x')
+            self.root.after(WRITE_BEHIND_POLL_MS, self.poll_sync)
+        self.bg = DBExecutor(root, on_busy=self._set_busy)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True)
@@ -315,35 +4185,259 @@ class LibraryGUI:
         self.tab_members = ttk.Frame(self.notebook)
         self.tab_books = ttk.Frame(self.notebook)
         self.tab_issue = ttk.Frame(self.notebook)
+        self.tab_analytics = ttk.Frame(self.notebook)
         self.tab_logs = ttk.Frame(self.notebook)
 
         self.notebook.add(self.tab_dashboard, text="Dashboard")
         self.notebook.add(self.tab_members, text="Members")
         self.notebook.add(self.tab_books, text="Books")
         self.notebook.add(self.tab_issue, text="Issue / Return")
+        self.notebook.add(self.tab_analytics, text="Analytics")
         self.notebook.add(self.tab_logs, text="Logs")
 
         self.setup_dashboard()
         self.setup_members_tab()
         self.setup_books_tab()
         self.setup_issue_tab()
+        self.setup_analytics_tab()
         self.setup_logs_tab()
 
+        # nothing is fetched until a tab is first shown
+        self._tab_loaders = {str(self.tab_dashboard): self.load_dashboard, str(self.tab_members): self.load_members,
+                             str(self.tab_books): self.load_books, str(self.tab_issue): self.load_issued_list,
+                             str(self.tab_analytics): self.load_analytics, str(self.tab_logs): self.load_logs}
+        self._loaded_tabs = set()
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.events = None
+        # the connection check runs in the background too: the window doesn't wait for the server
+        self.bg.submit(self._probe_db, key="probe", on_error=self._probe_failed)
+        self.root.after_idle(self._window_ready)
+        if startup_probe:
+            self.root.after(30000, lambda: self._finish_probe("timed out waiting for data"))
+
+    def _set_busy(self, n):
+        self.status.config(text=f"Working… ({n} pending)" if n else self._ready_text)
+        self.root.config(cursor="watch" if n else "")
+
+    def on_tab_changed(self, event=None):
+        tab = self.notebook.select()
+        if tab in self._tab_loaders and tab not in self._loaded_tabs:
+            self._loaded_tabs.add(tab)
+            self._tab_loaders[tab]()
+
+    def _window_ready(self):
+        self._startup_mark("window_ms")
+        self.on_tab_changed()
+        self.root.after(STARTUP_DEFER_MS, self._start_background)
+
+    def _start_background(self):
+        # search works via SQL until the in-memory index is ready
+        self.bg.submit(self.db.build_search_index, key="search_index",
+                       on_done=lambda ix: self.status.config(text=f"Search index ready ({ix.books} books)"))
+        # other desks' issues/returns arrive through the event journal
+        self.bg.submit(EventConsumer, self.db, None, key="events", on_done=self._start_event_tail)
+        self.bg.submit(self.db.build_coborrow_index, key="coborrow")
+
+    def _startup_mark(self, what):
+        if what not in self.startup:
+            self.startup[what] = round((time.perf_counter() - _PROCESS_T0) * 1000, 1)
+        return self.startup[what]
+
+    def _first_data(self):
+        if "first_data_ms" in self.startup:
+            return
+        ms = self._startup_mark("first_data_ms")
+        over = ms > STARTUP_BUDGET_MS
+        self._ready_text = f"Ready — started in {ms:.0f} ms"
+        if over:
+            self._ready_text += f" (over the {STARTUP_BUDGET_MS} ms budget)"
+        if _metrics is not None:
+            # a start over the budget counts as an error of gui.startup.first_data
+            _metrics.record("gui.startup.first_data", ms / 1000, error=over)
+        self.status.config(text=self._ready_text)
+        if self._startup_probe:
+            self._finish_probe()
+
+    def _finish_probe(self, error=None):
+        # --startup-probe: report the timings as one JSON line and quit
+        print(json.dumps(dict(self.startup, budget_ms=STARTUP_BUDGET_MS, **({"error": error} if error else {}))), flush=True)
+        self.close()
+
+    @property
+    def direct_db(self):
+        # the LibraryDB / RemoteLibraryDB under a write-behind wrapper
+        return self.db.db if self.write_behind else self.db
+
+    def _probe_db(self):
+        if isinstance(self.direct_db, RemoteLibraryDB):
+            self.direct_db.health()
+        else:
+            check_schema()
+
+    def _probe_failed(self, e):
+        self._ready_text = f"Not connected: {e}"
+        self.status.config(text=self._ready_text)
+        print("Could not connect to DB:", e)
+        if self._startup_probe:
+            self._finish_probe(str(e))
+            return
+        if self.write_behind:
+            self._ready_text = "Offline: issues and returns are queued on this desk"
+            self.status.config(text=self._ready_text)
+            return
+        messagebox.showerror("DB Connection Error", f"Could not connect to DB: {e}")
+
+    def poll_sync(self):
+        """Apply the outcomes of synced write-behind ops and show the queue depth."""
+        conflicts = []
+        while True:
+            try:
+                op, out = self.db.completed.get_nowait()
+            except queue.Empty:
+                break
+            a = op['args']
+            what = {"issue": f"checkout of copy {a.get('copy_id')}", "issue_any": f"checkout of book {a.get('book_id')}",
+                    "return": f"return of issue {a.get('issue_id')}", "return_copy": f"return of copy {a.get('copy_id')}"}[op['kind']]
+            if out['status'] != "done":
+                self.log(f"Sync {out['status']}, {what}: {out['error']}")
+                conflicts.append(f"{what}: {out['error']}")
+            elif op['kind'] in ("issue", "issue_any"):
+                self.log(f"Synced {what} to member_id={a['member_id']}, issue_id={out['result']['issue_id']}")
+                self.apply_issue(out['result'])
+            else:
+                self.log(f"Synced {what}. Days late: {out['result']['days_late']}. Fine: {out['result']['fine']}.")
+                self.apply_return(out['result'])
+        st = self.db.status()
+        if st['last_error']:
+            text = f"Sync: offline, {st['pending']} queued ({st['last_error']})"
+        else:
+            text = f"Sync: {st['pending']} queued" + (f", last sync {st['last_flush']:%H:%M:%S}" if st['last_flush'] else "")
+        if st['conflicts']:
+            text += f", {st['conflicts']} conflicts"
+        if st['failed']:
+            text += f", {st['failed']} failed"
+        self.sync_status.config(text=text)
+        if conflicts:
+            messagebox.showwarning("Sync conflict", "Not applied by the database:\n" + "\n".join(conflicts))
+        self.root.after(WRITE_BEHIND_POLL_MS, self.poll_sync)
+
+    def _queued(self, res, what):
+        # write-behind: the op is in the desk journal; poll_sync applies the outcome once synced
+        if not res.get("queued"):
+            return False
+        self.log(f"Queued {what} (op {res['op_id']})")
+        return True
+
+    def _start_event_tail(self, consumer):
+        self.events = consumer
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+
+    def poll_events(self):
+        self.bg.submit(self._fetch_events, key="events", on_done=self.apply_events,
+                       on_error=lambda e: self.root.after(EVENT_POLL_MS, self.poll_events))
+
+    def _fetch_events(self):
+        events = self.events.poll()
+        loans = self.db.get_loans({e['entity_id'] for e in events if e['kind'] in ("issue", "return")})
+        return events, {l['issue_id']: l for l in loans}
+
+    def apply_events(self, result):
+        # idempotent, so this desk's own writes (already applied) are harmless
+        events, loans = result
+        for e in events:
+            loan = loans.get(e['entity_id'])
+            if e['kind'] == "issue" and loan:
+                self.logs_table.insert_row(loan)
+                if loan['return_date'] is None:
+                    self.issued_table.insert_row(loan)
+            elif e['kind'] == "return":
+                self.issued_table.remove_row(e['entity_id'])
+                if loan:
+                    self.logs_table.set_cells(e['entity_id'], return_date=loan['return_date'])
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+
+    def close(self):
+        self.bg.shutdown()
+        if self.write_behind:
+            self.db.close()
+        if isinstance(self.direct_db, LibraryDB):
+            self.direct_db.coborrow.close()
+        self.root.destroy()
+
     # ----- Dashboard -----
     def setup_dashboard(self):
         f = ttk.Frame(self.tab_dashboard, padding=12)
         f.pack(fill='both', expand=True)
         ttk.Label(f, text="Library Dashboard", font=("Segoe UI", 18)).pack(anchor='w')
+        self.dash = None
         self.dashboard_stats = ttk.Label(f, text="Loading stats...")
         self.dashboard_stats.pack(anchor='w', pady=10)
-        ttk.Button(f, text="Refresh Stats", command=self.load_dashboard).pack(anchor='w')
-        self.load_dashboard()
-
-    def load_dashboard(self):
-        books = self.db.list_books()
-        members = self.db.list_members()
-        issued = [ir for ir in self.db.list_issued() if ir['return_date'] is None]
-        txt = f"Total books records: {len(books)}   Total members: {len(members)}   Currently issued copies: {len(issued)}"
+        ttk.Button(f, text="Refresh Stats", command=lambda: self.load_dashboard(refresh=True)).pack(anchor='w')
+        cached = self._read_dashboard_snapshot()
+        if cached:
+            self.show_stats(cached['stats'], as_of=cached['at'])
+            self._startup_mark("snapshot_ms")
+
+    def _snapshot_key(self):
+        # one cached snapshot per database
+        return self.direct_db.base_url if isinstance(self.direct_db, RemoteLibraryDB) else database_key()
+
+    def _read_dashboard_snapshot(self):
+        key = self._snapshot_key()
+        if not DASHBOARD_SNAPSHOT_PATH or key is None:
+            return None
+        try:
+            with open(DASHBOARD_SNAPSHOT_PATH, encoding="utf-8") as fh:
+                cached = json.load(fh).get(key)
+            return cached if set(cached['stats']) >= {"books", "members", "open_loans", "overdue_loans", "available_copies"} else None
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return None
+
+    def _save_dashboard_snapshot(self, st):
+        key = self._snapshot_key()
+        if not DASHBOARD_SNAPSHOT_PATH or key is None:
+            return
+        try:
+            with open(DASHBOARD_SNAPSHOT_PATH, encoding="utf-8") as fh:
+                snaps = json.load(fh)
+        except (OSError, ValueError):
+            snaps = {}
+        if not isinstance(snaps, dict):
+            snaps = {}
+        snaps[key] = {"at": datetime.now().isoformat(sep=" ", timespec="seconds"), "stats": st}
+        tmp = DASHBOARD_SNAPSHOT_PATH + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(snaps, fh, default=_json_default)
+            os.replace(tmp, DASHBOARD_SNAPSHOT_PATH)
+        except OSError:
+            pass  # only a cache
+
+    def _apply_stats(self, **deltas):
+        # keep the dashboard in step with this desk's writes without re-querying
+        if self.dash:
+            for k, d in deltas.items():
+                self.dash[k] = self.dash.get(k, 0) + d
+            self.show_stats(self.dash)
+
+    def load_dashboard(self, refresh=False):
+        # timed on the worker, like the tables' gui.<name>.fetch
+        self.bg.submit(timed("gui.dashboard.fetch")(self.db.stats), refresh=refresh,
+                       key="dashboard", on_done=self._stats_loaded)
+
+    def _stats_loaded(self, st):
+        self.show_stats(st)
+        self._first_data()
+        self._save_dashboard_snapshot(self.dash)
+
+    def show_stats(self, st, as_of=None):
+        # as_of: when a cached snapshot was taken; a live load replaces it
+        self.dash = {k: st[k] for k in ("books", "members", "open_loans", "overdue_loans", "available_copies")}
+        txt = (f"Total books records: {st['books']}   Total members: {st['members']}   "
+               f"Currently issued copies: {st['open_loans']}   Overdue: {st['overdue_loans']}   "
+               f"Available copies: {st['available_copies']}")
+        if as_of:
+            txt += f"\n(as of {as_of} — refreshing…)"
         self.dashboard_stats.config(text=txt)
 
     # ----- Members tab -----
@@ -371,12 +4465,12 @@ class LibraryGUI:
         # Members list
         ttk.Label(right, text="Members", font=("Segoe UI", 12)).pack(anchor='w')
         columns = ("member_id", "full_name", "email", "phone", "membership_date")
-        self.members_tree = ttk.Treeview(right, columns=columns, show='headings', height=18)
-        for c in columns:
-            self.members_tree.heading(c, text=c)
-        self.members_tree.pack(fill='both', expand=True)
+        self.members_table = PagedTable(right, columns, self.db.list_members_page,
+                                        lambda r: (r['member_id'], r['full_name'], r['email'], r['phone'], r['membership_date']),
+                                        key=lambda r: r['member_id'], height=18, executor=self.bg, name="members")
+        self.members_tree = self.members_table.tree
+        self.members_table.pack(fill='both', expand=True)
         ttk.Button(right, text="Refresh", command=self.load_members).pack(pady=6)
-        self.load_members()
 
     def add_member(self):
         name = self.m_name.get().strip()
@@ -385,23 +4479,15 @@ class LibraryGUI:
             return
         email = self.m_email.get().strip() or None
         phone = self.m_phone.get().strip() or None
-        try:
-            mid = self.db.add_member(name, email, phone)
+
+        def done(mid):
             messagebox.showinfo("ok", f"Member added, member_id={mid}")
             self.m_name.delete(0, 'end'); self.m_email.delete(0, 'end'); self.m_phone.delete(0, 'end')
             self.load_members(); self.load_dashboard()
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.bg.submit(self.db.add_member, name, email, phone, on_done=done)
 
     def load_members(self):
-        for r in self.members_tree.get_children():
-            self.members_tree.delete(r)
-        try:
-            rows = self.db.list_members()
-            for r in rows:
-                self.members_tree.insert('', 'end', values=(r['member_id'], r['full_name'], r['email'], r['phone'], r['membership_date']))
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.members_table.reload()
 
     # ----- Books tab -----
     def setup_books_tab(self):
@@ -429,14 +4515,19 @@ class LibraryGUI:
 
         # Books listing
         ttk.Label(right, text="Books", font=("Segoe UI", 12)).pack(anchor='w')
+        search = ttk.Frame(right); search.pack(fill='x', pady=(0, 4))
+        self.b_search = ttk.Entry(search, width=40); self.b_search.pack(side='left')
+        self.b_search.bind('<Return>', lambda e: self.search_books())
+        ttk.Button(search, text="Search", command=self.search_books).pack(side='left', padx=6)
+        ttk.Button(search, text="Clear", command=self.clear_book_search).pack(side='left')
         cols = ("book_id", "title", "authors", "publisher_name", "publication_year", "genre", "total_copies", "available_copies")
-        self.books_tree = ttk.Treeview(right, columns=cols, show='headings', height=12)
-        for c in cols: self.books_tree.heading(c, text=c)
-        self.books_tree.pack(fill='both', expand=True)
+        self.books_table = PagedTable(right, cols, lambda after, limit: self.db.list_books_page(after, limit),
+                                      self._book_values, key=lambda r: r['book_id'], height=12, executor=self.bg, name="books")
+        self.books_tree = self.books_table.tree
+        self.books_table.pack(fill='both', expand=True)
         btn_frame = ttk.Frame(right); btn_frame.pack(fill='x')
         ttk.Button(btn_frame, text="Refresh", command=self.load_books).pack(side='left')
         ttk.Button(btn_frame, text="View Copies", command=self.view_copies_selected).pack(side='left', padx=6)
-        self.load_books()
 
     def add_book(self):
         title = self.b_title.get().strip()
@@ -448,28 +4539,33 @@ class LibraryGUI:
         genre = self.b_genre.get().strip() or None
         authors = self.b_authors.get().strip() or None
         copies = self.b_copies.get().strip() or "1"
-        try:
-            book_id = self.db.add_book(title, pub, year, genre, authors, copies)
+
+        def done(book_id):
             messagebox.showinfo("ok", f"Book added with book_id={book_id}")
             for w in (self.b_title, self.b_publisher, self.b_year, self.b_genre, self.b_authors):
                 w.delete(0, 'end')
             self.b_copies.delete(0, 'end'); self.b_copies.insert(0, "1")
             self.load_books(); self.load_dashboard()
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.bg.submit(self.db.add_book, title, pub, year, genre, authors, copies, on_done=done)
+
+    @staticmethod
+    def _book_values(r):
+        return (r['book_id'], r['title'], r.get('authors') or '', r.get('publisher_name') or '', r.get('publication_year'),
+                r.get('genre') or '', r.get('total_copies') or 0, r.get('available_copies') or 0)
 
     def load_books(self):
-        for r in self.books_tree.get_children():
-            self.books_tree.delete(r)
-        try:
-            rows = self.db.list_books()
-            for r in rows:
-                self.books_tree.insert('', 'end', values=(
-                    r['book_id'], r['title'], r.get('authors') or '', r.get('publisher_name') or '', r.get('publication_year'),
-                    r.get('genre') or '', r.get('total_copies') or 0, r.get('available_copies') or 0
-                ))
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.books_table.reload()
+
+    def search_books(self):
+        q = self.b_search.get().strip()
+        if not q:
+            self.load_books()
+            return
+        self.bg.submit(self.db.search_catalog, q, key="book_search", on_done=self.books_table.show_rows)
+
+    def clear_book_search(self):
+        self.b_search.delete(0, 'end')
+        self.load_books()
 
     def view_copies_selected(self):
         sel = self.books_tree.selection()
@@ -477,9 +4573,11 @@ class LibraryGUI:
             messagebox.showerror("error", "Select a book")
             return
         book_id = self.books_tree.item(sel[0])['values'][0]
-        copies = self.db.list_copies_for_book(book_id)
-        text = "\n".join([f"Copy ID: {c['copy_id']}  Availability: {c['availability']}" for c in copies]) or "No copies found"
-        messagebox.showinfo("Copies", text)
+
+        def done(copies):
+            text = "\n".join([f"Copy ID: {c['copy_id']}  Availability: {c['availability']}" for c in copies]) or "No copies found"
+            messagebox.showinfo("Copies", text)
+        self.bg.submit(self.db.list_copies_for_book, book_id, key="view_copies", on_done=done)
 
     # ----- Issue / Return tab -----
     def setup_issue_tab(self):
@@ -492,6 +4590,16 @@ class LibraryGUI:
         ttk.Label(left, text="Issue Book", font=("Segoe UI", 12)).pack(anchor='w')
         ttk.Label(left, text="Member ID").pack(anchor='w')
         self.i_member = ttk.Entry(left, width=20); self.i_member.pack(anchor='w')
+        ttk.Label(left, text="Find book (title / author)").pack(anchor='w')
+        self.i_search = ttk.Entry(left, width=30); self.i_search.pack(anchor='w')
+        self.i_search.bind('<KeyRelease>', lambda e: self.issue_search())
+        self.i_search_results = tk.Listbox(left, height=4, width=40); self.i_search_results.pack(anchor='w')
+        self.i_search_results.bind('<<ListboxSelect>>', self.pick_search_result)
+        self.i_search_ids = []
+        ttk.Label(left, text="Also borrowed (double-click to pick)").pack(anchor='w')
+        self.i_also = tk.Listbox(left, height=3, width=40); self.i_also.pack(anchor='w')
+        self.i_also.bind('<Double-Button-1>', self.pick_also_borrowed)
+        self.i_also_ids = []
         ttk.Label(left, text="Book ID").pack(anchor='w')
         self.i_book = ttk.Entry(left, width=20); self.i_book.pack(anchor='w')
         ttk.Label(left, text="Loan days (default 14)").pack(anchor='w')
@@ -499,46 +4607,167 @@ class LibraryGUI:
         ttk.Button(left, text="Find available copies", command=self.find_available_copies).pack(pady=6)
         self.available_copies_list = tk.Listbox(left, height=6); self.available_copies_list.pack()
         ttk.Button(left, text="Issue selected copy", command=self.issue_selected_copy).pack(pady=6)
+        ttk.Button(left, text="Issue any available copy", command=self.issue_any_copy).pack()
 
         # Return form
         ttk.Separator(left, orient='horizontal').pack(fill='x', pady=10)
         ttk.Label(left, text="Return Book", font=("Segoe UI", 12)).pack(anchor='w')
         ttk.Button(left, text="Show issued (not returned)", command=self.load_issued_list).pack(pady=6)
-        self.issued_list = ttk.Treeview(left, columns=("issue_id","copy_id","member_id","book_title","issue_date","due_date"), show='headings', height=8)
-        for c in ("issue_id","copy_id","member_id","book_title","issue_date","due_date"):
-            self.issued_list.heading(c, text=c)
-        self.issued_list.pack()
+        self.issued_table = PagedTable(left, ("issue_id","copy_id","member_id","book_title","issue_date","due_date"),
+                                       lambda after, limit: self.db.list_open_loans(after, limit),
+                                       lambda r: (r['issue_id'], r['copy_id'], r['member_id'], r.get('book_title') or '', r['issue_date'], r['due_date']),
+                                       key=lambda r: r['issue_id'], height=8, executor=self.bg, name="issued")
+        self.issued_list = self.issued_table.tree
+        self.issued_table.pack()
         ttk.Button(left, text="Return selected issue", command=self.return_selected_issue).pack(pady=6)
 
+        # Right — scan queue: collect barcodes (copy ids), then issue/return them as one batch
+        ttk.Label(right, text="Scan Queue", font=("Segoe UI", 12)).pack(anchor='w')
+        bar = ttk.Frame(right); bar.pack(fill='x')
+        self.scan_mode = tk.StringVar(value="issue")
+        ttk.Radiobutton(bar, text="Checkout (to Member ID)", variable=self.scan_mode, value="issue").pack(side='left')
+        ttk.Radiobutton(bar, text="Returns", variable=self.scan_mode, value="return").pack(side='left', padx=6)
+        self.scan_entry = ttk.Entry(bar, width=16); self.scan_entry.pack(side='left', padx=6)
+        self.scan_entry.bind('<Return>', lambda e: self.add_scans())
+        ttk.Button(bar, text="Submit batch", command=self.submit_scans).pack(side='left')
+        ttk.Button(bar, text="Remove", command=self.remove_scan).pack(side='left', padx=4)
+        ttk.Button(bar, text="Clear", command=lambda: self.set_scan_queue([])).pack(side='left')
+        self.scan_list = tk.Listbox(right, height=6); self.scan_list.pack(fill='x', pady=(2, 8))
+        self.scan_queue = []
+
         # Right — display area / debug
         ttk.Label(right, text="Activity Log", font=("Segoe UI", 12)).pack(anchor='w')
-        self.activity = tk.Text(right, height=30)
+        self.activity = tk.Text(right, height=20)
         self.activity.pack(fill='both', expand=True)
 
-        self.load_issued_list()
-
     def log(self, msg):
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.activity.insert('end', f"[{ts}] {msg}\n")
         self.activity.see('end')
 
-    def find_available_copies(self):
+    def set_scan_queue(self, copy_ids):
+        self.scan_queue = list(copy_ids)
+        self.scan_list.delete(0, 'end')
+        for c in self.scan_queue:
+            self.scan_list.insert('end', c)
+
+    def add_scans(self):
+        # a scanner types the barcode and Enter; pasted lists of ids work too
+        raw = self.scan_entry.get()
+        self.scan_entry.delete(0, 'end')
+        for tok in re.split(r"[\s,;]+", raw.strip()):
+            if not tok:
+                continue
+            if not tok.isdigit():
+                messagebox.showerror("error", f"Not a copy barcode: {tok}")
+                continue
+            if int(tok) not in self.scan_queue:
+                self.scan_queue.append(int(tok))
+                self.scan_list.insert('end', int(tok))
+
+    def remove_scan(self):
+        sel = self.scan_list.curselection()
+        if sel:
+            del self.scan_queue[sel[0]]
+            self.scan_list.delete(sel[0])
+
+    def submit_scans(self):
+        if not self.scan_queue:
+            messagebox.showerror("error", "Scan queue is empty")
+            return
+        batch = list(self.scan_queue)
+        if self.scan_mode.get() == "issue":
+            member_id = self.i_member.get().strip()
+            if not member_id:
+                messagebox.showerror("error", "Enter member id")
+                return
+            try:
+                days = int(self.i_days.get().strip())
+            except ValueError:
+                days = DEFAULT_LOAN_DAYS
+            self.bg.submit(self.db.issue_many, member_id, batch, loan_days=days,
+                           on_done=lambda res: self._scans_done(res, member_id))
+        else:
+            self.bg.submit(self.db.return_copies, batch, on_done=lambda res: self._scans_done(res))
+
+    def _scans_done(self, results, member_id=None):
+        ok = [r for r in results if r['ok']]
+        failed = [r for r in results if not r['ok']]
+        for r in ok:
+            if self._queued(r, f"{'checkout' if member_id is not None else 'return'} of copy {r['copy_id']}"):
+                continue
+            if member_id is not None:
+                self.log(f"Issued copy_id={r['copy_id']} to member_id={member_id}, issue_id={r['issue_id']}")
+                self.apply_issue(r)
+            else:
+                self.log(f"Return processed issue_id={r['issue_id']} (copy {r['copy_id']}). "
+                         f"Days late: {r['days_late']}. Fine: {r['fine']}.")
+                self.apply_return(r)
+        for r in failed:
+            self.log(f"Copy {r['copy_id']}: {r['error']}")
+        # failed scans stay queued so the desk can deal with them
+        self.set_scan_queue(r['copy_id'] for r in failed)
+        msg = f"{'Issued' if member_id is not None else 'Returned'} {len(ok)} of {len(results)}."
+        if any(r.get('queued') for r in ok):
+            msg = f"Queued {len(ok)} of {len(results)} for sync."
+        elif member_id is None and ok:
+            msg += f" Total fines: {sum(r['fine'] for r in ok)}."
+        if failed:
+            msg += f" {len(failed)} failed (left in the queue, see the activity log)."
+        messagebox.showinfo("Batch done", msg)
+
+    def issue_search(self):
+        q = self.i_search.get().strip()
+        if len(q) < 2:
+            return
+
+        def done(rows):
+            self.i_search_results.delete(0, 'end')
+            self.i_search_ids = [r['book_id'] for r in rows]
+            for r in rows:
+                self.i_search_results.insert('end', f"{r['book_id']}  {r['title']}  ({r.get('authors') or '-'})  "
+                                                    f"{r['available_copies']}/{r['total_copies']} free")
+        # keyed: typing fast only runs the latest query
+        self.bg.submit(self.db.search_catalog, q, 10, key="issue_search", on_done=done)
+
+    def pick_search_result(self, event=None):
+        sel = self.i_search_results.curselection()
+        if not sel:
+            return
+        self.i_book.delete(0, 'end')
+        self.i_book.insert(0, str(self.i_search_ids[sel[0]]))
+        self.find_available_copies(quiet=True)
+
+    def find_available_copies(self, quiet=False):
         book_id = self.i_book.get().strip()
         if not book_id:
             messagebox.showerror("error", "Enter book ID")
             return
-        try:
-            copies = self.db.list_copies_for_book(book_id)
+
+        def done(copies):
             self.available_copies_list.delete(0, 'end')
-            found = False
             for c in copies:
-                if c['availability'] == 'Available':
-                    self.available_copies_list.insert('end', c['copy_id'])
-                    found = True
-            if not found:
+                self.available_copies_list.insert('end', c['copy_id'])
+            if not copies and not quiet:
                 messagebox.showinfo("no copies", "No available copies found")
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.bg.submit(self.db.list_available_copies, book_id, key="available_copies", on_done=done)
+        self.show_also_borrowed(book_id)
+
+    def show_also_borrowed(self, book_id):
+        def done(rows):
+            self.i_also.delete(0, 'end')
+            self.i_also_ids = [r['book_id'] for r in rows]
+            for r in rows:
+                self.i_also.insert('end', f"{r['book_id']}  {r['title']}  ({r['score']})")
+        self.bg.submit(self.db.also_borrowed, book_id, key="also_borrowed", on_done=done)
+
+    def pick_also_borrowed(self, event=None):
+        sel = self.i_also.curselection()
+        if not sel:
+            return
+        self.i_book.delete(0, 'end')
+        self.i_book.insert(0, str(self.i_also_ids[sel[0]]))
+        self.find_available_copies(quiet=True)
 
     def issue_selected_copy(self):
         sel = self.available_copies_list.curselection()
@@ -554,25 +4783,65 @@ class LibraryGUI:
             days = int(self.i_days.get().strip())
         except:
             days = DEFAULT_LOAN_DAYS
+
+        def done(res):
+            if self._queued(res, f"checkout of copy {copy_id} to member_id={member_id}"):
+                return
+            self.log(f"Issued copy_id={copy_id} to member_id={member_id}, issue_id={res['issue_id']}, loan_days={days}")
+            messagebox.showinfo("ok", f"Issued (issue_id={res['issue_id']})")
+            self.apply_issue(res)
+        self.bg.submit(self.db.issue_copy, copy_id, member_id, loan_days=days, on_done=done)
+
+    def issue_any_copy(self):
+        book_id = self.i_book.get().strip()
+        member_id = self.i_member.get().strip()
+        if not book_id or not member_id:
+            messagebox.showerror("error", "Enter book ID and member id")
+            return
         try:
-            issue_id = self.db.issue_book(copy_id, member_id, loan_days=days)
-            self.log(f"Issued copy_id={copy_id} to member_id={member_id}, issue_id={issue_id}, loan_days={days}")
-            messagebox.showinfo("ok", f"Issued (issue_id={issue_id})")
-            self.find_available_copies()
-            self.load_issued_list(); self.load_dashboard()
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+            days = int(self.i_days.get().strip())
+        except ValueError:
+            days = DEFAULT_LOAN_DAYS
+
+        def done(res):
+            if self._queued(res, f"checkout of book {book_id} to member_id={member_id}"):
+                return
+            self.log(f"Issued copy_id={res['copy_id']} of book_id={book_id} to member_id={member_id}, "
+                     f"issue_id={res['issue_id']}, loan_days={days}")
+            messagebox.showinfo("ok", f"Issued copy {res['copy_id']} (issue_id={res['issue_id']})")
+            self.apply_issue(res)
+        self.bg.submit(self.db.issue_any_copy, book_id, member_id, loan_days=days, on_done=done)
 
     def load_issued_list(self):
-        for r in self.issued_list.get_children():
-            self.issued_list.delete(r)
+        self.issued_table.reload()
+
+    def _shown_book_id(self):
         try:
-            rows = self.db.list_issued()
-            for r in rows:
-                if r['return_date'] is None:
-                    self.issued_list.insert('', 'end', values=(r['issue_id'], r['copy_id'], r['member_id'], r.get('book_title') or '', r['issue_date'], r['due_date']))
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+            return int(self.i_book.get().strip())
+        except ValueError:
+            return None
+
+    def apply_issue(self, res):
+        """Patch the views with a loan this desk just opened (no reloads)."""
+        if self._shown_book_id() == res['book_id']:
+            items = [int(x) for x in self.available_copies_list.get(0, 'end')]
+            if res['copy_id'] in items:
+                self.available_copies_list.delete(items.index(res['copy_id']))
+        self.issued_table.insert_row(res['loan'])
+        self.logs_table.insert_row(res['loan'])
+        self.books_table.add_to_cell(res['book_id'], 'available_copies', -1)
+        self._apply_stats(open_loans=1, available_copies=-1)
+
+    def apply_return(self, res):
+        """Patch the views with a loan this desk just closed (no reloads)."""
+        if self._shown_book_id() == res['book_id']:
+            items = [int(x) for x in self.available_copies_list.get(0, 'end')]
+            if res['copy_id'] not in items:
+                self.available_copies_list.insert(bisect.bisect(items, res['copy_id']), res['copy_id'])
+        self.issued_table.remove_row(res['issue_id'])
+        self.logs_table.set_cells(res['issue_id'], return_date=res['return_date'])
+        self.books_table.add_to_cell(res['book_id'], 'available_copies', 1)
+        self._apply_stats(open_loans=-1, available_copies=1, overdue_loans=-1 if res['was_overdue'] else 0)
 
     def return_selected_issue(self):
         sel = self.issued_list.selection()
@@ -580,15 +4849,65 @@ class LibraryGUI:
             messagebox.showerror("error", "Select an issued record")
             return
         issue_id = self.issued_list.item(sel[0])['values'][0]
-        try:
-            res = self.db.return_book(issue_id)
+
+        def done(res):
+            if self._queued(res, f"return of issue {issue_id}"):
+                return
             days_late = res['days_late']; fine = res['fine']
             msg = f"Returned. Days late: {days_late}. Fine: {fine}."
             self.log(f"Return processed issue_id={issue_id}. {msg}")
             messagebox.showinfo("Returned", msg)
-            self.load_issued_list(); self.load_dashboard()
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+            self.apply_return(res)
+        self.bg.submit(self.db.return_book, issue_id, on_done=done)
+
+    # ----- Analytics tab -----
+    def setup_analytics_tab(self):
+        f = ttk.Frame(self.tab_analytics, padding=8)
+        f.pack(fill='both', expand=True)
+        bar = ttk.Frame(f)
+        bar.pack(fill='x')
+        ttk.Label(bar, text="Circulation Analytics", font=("Segoe UI", 12)).pack(side='left')
+        ttk.Button(bar, text="Recompute", command=lambda: self.load_analytics(refresh=True)).pack(side='left', padx=8)
+        self.analytics_summary = ttk.Label(f, text="Not loaded", justify='left')
+        self.analytics_summary.pack(anchor='w', pady=6)
+        grid = ttk.Frame(f)
+        grid.pack(fill='both', expand=True)
+        group_cols = ("name", "copies", "loans", "turnover", "avg_loan_days")
+        self.analytics_trees = {}
+        for i, (key, title, cols) in enumerate((
+                ("by_genre", "Turnover by genre", group_cols),
+                ("top_titles", "Top titles", ("book_id", "title", "copies", "loans", "turnover")),
+                ("by_publisher", "Busiest publishers", group_cols),
+                ("idle_copies", f"Idle copies (no loan in {ANALYTICS_IDLE_DAYS} days)",
+                 ("copy_id", "title", "last_issued", "idle_days")))):
+            box = ttk.LabelFrame(grid, text=title, padding=4)
+            box.grid(row=i // 2, column=i % 2, sticky='nsew', padx=4, pady=4)
+            tree = ttk.Treeview(box, columns=cols, show='headings', height=8)
+            for c in cols:
+                tree.heading(c, text=c)
+                tree.column(c, width=200 if c in ("name", "title") else 80)
+            tree.pack(fill='both', expand=True)
+            self.analytics_trees[key] = (tree, cols)
+        grid.columnconfigure(0, weight=1); grid.columnconfigure(1, weight=1)
+        grid.rowconfigure(0, weight=1); grid.rowconfigure(1, weight=1)
+
+    def load_analytics(self, refresh=False):
+        self.analytics_summary.config(text="Computing…")
+        self.bg.submit(timed("gui.analytics.fetch")(self.db.analytics), refresh=refresh,
+                       key="analytics", on_done=self.show_analytics)
+
+    def show_analytics(self, a):
+        s = a["summary"]
+        avg = "n/a" if s["avg_loan_days"] is None else f"{s['avg_loan_days']} days"
+        self.analytics_summary.config(text=(
+            f"{s['loans']} loans ({s['open_loans']} open) over {s['copies']} copies of {s['books']} books   "
+            f"Loans per copy: {s['loans_per_copy']} (max {s['max_loans_per_copy']}, never loaned {s['never_loaned_copies']})\n"
+            f"Average loan: {avg}   Idle copies: {s['idle_copies']}   "
+            f"as of {s['as_of']}, computed in {s['seconds']}s ({s['engine']})"))
+        for key, (tree, cols) in self.analytics_trees.items():
+            tree.delete(*tree.get_children())
+            for row in a[key]:
+                tree.insert('', 'end', values=tuple("" if row.get(c) is None else row.get(c) for c in cols))
 
     # ----- Logs tab -----
     def setup_logs_tab(self):
@@ -596,39 +4915,391 @@ class LibraryGUI:
         f.pack(fill='both', expand=True)
         ttk.Label(f, text="All Issue/Return Records", font=("Segoe UI", 12)).pack(anchor='w')
         cols = ("issue_id","copy_id","member_id","member_name","book_title","issue_date","due_date","return_date")
-        self.logs_tree = ttk.Treeview(f, columns=cols, show='headings', height=20)
-        for c in cols:
-            self.logs_tree.heading(c, text=c)
-        self.logs_tree.pack(fill='both', expand=True)
+        self.logs_table = PagedTable(f, cols, lambda after, limit: self.db.list_issued_page(after, limit, include_archived=True),
+                                     lambda r: (r['issue_id'], r['copy_id'], r['member_id'], r.get('member_name') or '', r.get('book_title') or '',
+                                                r.get('issue_date'), r.get('due_date'), r.get('return_date')),
+                                     key=lambda r: r['issue_id'], height=12, executor=self.bg, name="logs")
+        self.logs_tree = self.logs_table.tree
+        self.logs_table.pack(fill='both', expand=True)
         ttk.Button(f, text="Refresh Logs", command=self.load_logs).pack(pady=6)
-        self.load_logs()
+        self.setup_metrics_panel(f)
 
     def load_logs(self):
-        for r in self.logs_tree.get_children():
-            self.logs_tree.delete(r)
-        try:
-            rows = self.db.list_issued()
-            for r in rows:
-                self.logs_tree.insert('', 'end', values=(
-                    r['issue_id'], r['copy_id'], r['member_id'], r.get('member_name') or '', r.get('book_title') or '',
-                    r.get('issue_date'), r.get('due_date'), r.get('return_date')
-                ))
-        except Exception as e:
-            messagebox.showerror("db error", str(e))
+        self.logs_table.reload()
+
+    def setup_metrics_panel(self, parent):
+        box = ttk.LabelFrame(parent, text="Performance metrics", padding=6)
+        box.pack(fill='both', expand=True)
+        bar = ttk.Frame(box)
+        bar.pack(fill='x')
+        self.metrics_on = tk.BooleanVar(value=_metrics is not None)
+        ttk.Checkbutton(bar, text="Collect", variable=self.metrics_on, command=self.toggle_metrics).pack(side='left')
+        ttk.Button(bar, text="Refresh", command=self.show_metrics).pack(side='left', padx=4)
+        ttk.Button(bar, text="Reset", command=self.reset_metrics).pack(side='left', padx=4)
+        ttk.Button(bar, text="Export…", command=self.export_metrics).pack(side='left', padx=4)
+        self.metrics_summary = ttk.Label(bar, text="")
+        self.metrics_summary.pack(side='left', padx=8)
+        cols = ("operation", "count", "mean_ms", "p95_le_ms", "max_ms", "errors")
+        self.metrics_tree = ttk.Treeview(box, columns=cols, show='headings', height=6)
+        for c in cols:
+            self.metrics_tree.heading(c, text=c)
+        self.metrics_tree.column("operation", width=320)
+        self.metrics_tree.pack(fill='both', expand=True)
+        self.slow_list = tk.Listbox(box, height=4)
+        self.slow_list.pack(fill='x')
+        self.show_metrics()
+
+    def toggle_metrics(self):
+        if self.metrics_on.get():
+            enable_metrics(slow_ms=SLOW_QUERY_MS)
+        else:
+            disable_metrics()
+        self.show_metrics()
+
+    def reset_metrics(self):
+        if _metrics is not None:
+            _metrics.reset()
+        self.show_metrics()
+
+    def show_metrics(self):
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        self.slow_list.delete(0, 'end')
+        m = _metrics
+        if m is None:
+            self.metrics_summary.config(text="Off")
+            return
+        snap = m.snapshot()
+        ops = sorted(snap["operations"].items(), key=lambda kv: -kv[1]["total_ms"])
+        for name, o in ops:
+            self.metrics_tree.insert('', 'end', values=(name, o['count'], o['mean_ms'], o['p95_le_ms'], o['max_ms'], o['errors']))
+        for q in reversed(snap["slow_queries"]):
+            self.slow_list.insert('end', f"{q['at']}  {q['ms']}ms  {q['op']}  {q['params']}  {q['sql']}")
+        self.metrics_summary.config(text=f"since {snap['since']}, {len(snap['slow_queries'])} slow (>{snap['slow_query_ms']}ms)")
+
+    def export_metrics(self):
+        if _metrics is None:
+            messagebox.showerror("error", "Metrics are off")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="metrics.json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            _metrics.dump(path)
+            messagebox.showinfo("ok", f"Metrics written to {path}")
 
 # ---------- RUN ----------
-def main():
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Library manager. Without a command, starts the GUI.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None, help=f"storage backend (default: {DB_BACKEND})")
+    parser.add_argument("--sqlite-path", default=None, help=f"SQLite database file or :memory: (default: {SQLITE_PATH})")
+    parser.add_argument("--metrics", action="store_true", default=METRICS_ENABLED, help="time pool/SQL/GUI operations")
+    parser.add_argument("--metrics-dump", default=None, help="write the metrics as JSON here on exit (implies --metrics)")
+    parser.add_argument("--slow-query-ms", type=float, default=SLOW_QUERY_MS, help="slow-query log threshold")
+    parser.add_argument("--slow-query-log", default=SLOW_QUERY_LOG, help="append slow queries here as JSON lines")
+    parser.add_argument("--server", default=None, help="run the GUI as a thin client of a `serve` instance (http://host:port)")
+    parser.add_argument("--token", default=SERVICE_TOKEN, help="bearer token for serve / --server")
+    parser.add_argument("--write-behind", nargs="?", const=WRITE_BEHIND_PATH, default=WRITE_BEHIND_PATH if WRITE_BEHIND else None,
+                        metavar="JOURNAL", help="GUI: queue issues/returns in a local journal and sync in the background")
+    # used by startup-bench: print the GUI's startup timings as JSON once data shows, then exit
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("import", help="bulk import a catalog from CSV or JSONL")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("csv", "jsonl"), default=None, help="default: from the file extension")
+    p.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    p.add_argument("--checkpoint", default=None, help="checkpoint file (default: <path>.checkpoint)")
+    p = sub.add_parser("overdue-report", help="overdue loans and accrued fines as of a date (e.g. nightly from cron)")
+    p.add_argument("--as-of", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--out", default=None, help="CSV path (default: overdue-<date>.csv)")
+    p.add_argument("--per-day", type=float, default=FINE_PER_DAY)
+    p.add_argument("--grace-days", type=int, default=FINE_GRACE_DAYS)
+    p.add_argument("--cap", type=float, default=FINE_CAP)
+    p.add_argument("--summary-only", action="store_true", help="only totals, computed in SQL")
+    sub.add_parser("migrate", help="create/upgrade tables and indexes")
+    sub.add_parser("check-indexes", help="EXPLAIN the hot queries and fail if any does a full scan")
+    p = sub.add_parser("bench", help="seed a synthetic library and time LibraryDB operations (JSON out)")
+    p.add_argument("--scale", default="small", help=f"{'/'.join(BENCH_SCALES)} or a number of books")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--reuse", action="store_true", help="benchmark the existing data instead of seeding")
+    p.add_argument("--only", nargs="*", help="operation name prefixes to run")
+    p.add_argument("--out", default=None, help="write results JSON here (default: stdout)")
+    p.add_argument("--baseline", default=None, help="results JSON to compare against; exit 1 on regression")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    p = sub.add_parser("startup-bench", help="time cold starts: module import and GUI to first data, in fresh processes")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="exit 1 if median time to first data is over")
+    p.add_argument("--out", default=None, help="also write the results here as JSON")
+    p = sub.add_parser("analytics", help="circulation utilization: loans per copy, turnover, top titles, idle copies")
+    p.add_argument("--as-of", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--idle-days", type=int, default=ANALYTICS_IDLE_DAYS)
+    p.add_argument("--top", type=int, default=ANALYTICS_TOP_N)
+    p.add_argument("--out", default=None, help="write the JSON here instead of stdout")
+    p = sub.add_parser("coborrow", help='update (or --rebuild) the "also borrowed" index, or query it')
+    p.add_argument("--rebuild", action="store_true", help="recount the whole loan history")
+    p.add_argument("--book-id", type=int, default=None, help="print the books most often borrowed with this one")
+    p.add_argument("--top", type=int, default=CO_BORROW_TOP_K)
+    p = sub.add_parser("sync", help="replay a desk's write-behind journal now and print its status")
+    p.add_argument("--journal", default=WRITE_BEHIND_PATH)
+    p = sub.add_parser("export", help="stream loans/members/catalog to CSV or JSONL (.gz to compress, - for stdout)")
+    p.add_argument("kind", choices=sorted(EXPORT_COLUMNS))
+    p.add_argument("out")
+    p.add_argument("--format", choices=("csv", "jsonl"), default=None, help="default: from the file extension")
+    p.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None,
+                   help="loans: issued on/after; members: joined on/after (YYYY-MM-DD)")
+    p.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None, help="inclusive end date")
+    p.add_argument("--member-id", type=int, default=None)
+    p.add_argument("--open-only", action="store_true", help="loans: only those not yet returned")
+    p.add_argument("--no-archive", action="store_true", help="loans: skip archived history")
+    p.add_argument("--year-from", type=int, default=None, help="catalog: publication year range")
+    p.add_argument("--year-to", type=int, default=None)
+    p.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK)
+    p = sub.add_parser("archive", help="move old returned loans to IssueReturnArchive in small batches")
+    p.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, help="returned more than N days ago")
+    p.add_argument("--before", type=date.fromisoformat, default=None, help="or: returned before YYYY-MM-DD")
+    p.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    p.add_argument("--pause", type=float, default=ARCHIVE_PAUSE, help="seconds between batches")
+    p.add_argument("--dry-run", action="store_true", help="only count what would move")
+    p = sub.add_parser("events", help="print circulation journal events as JSON lines")
+    p.add_argument("--after", type=int, default=0, help="start after this sequence number")
+    p.add_argument("--follow", action="store_true", help="keep tailing new events (Ctrl+C to stop)")
+    p.add_argument("--interval", type=float, default=1.0, help="poll interval with --follow (seconds)")
+    p = sub.add_parser("serve", help="headless HTTP/JSON API shared by many desks (GUI: --server URL)")
+    p.add_argument("--host", default=SERVICE_HOST)
+    p.add_argument("--port", type=int, default=SERVICE_PORT)
+    p.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    p.add_argument("--verbose", action="store_true", help="log every request")
+    p = sub.add_parser("loadtest-issue", help="concurrent issue/return load test (use a local test database)")
+    p.add_argument("--desks", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--books", type=int, default=10)
+    p.add_argument("--copies", type=int, default=3)
+    return parser
+
+def apply_backend_args(args):
+    if args.backend == "sqlite" or (args.backend is None and args.sqlite_path):
+        configure_backend("sqlite", path=args.sqlite_path)
+    elif args.backend:
+        configure_backend(args.backend)
+
+def run_cli(args):
+    if args.command == "migrate":
+        # before LibraryDB(), which refuses to start on an out-of-date schema
+        try:
+            init_schema(progress=print)
+        finally:
+            close_pool()
+        return 0
+    if args.command == "loadtest-issue":
+        configure_pool(size=max(POOL_SIZE, args.desks + 1))
+    db = LibraryDB()
     try:
-        conn = get_conn()
-        conn.close()
+        if args.command == "import":
+            importer = BulkImporter(db, batch_size=args.batch_size,
+                                    checkpoint_path=args.checkpoint or args.path + ".checkpoint")
+            importer.run(args.path, args.format)
+        elif args.command == "overdue-report":
+            policy = FinePolicy(per_day=args.per_day, grace_days=args.grace_days, cap=args.cap)
+            engine = OverdueEngine(db, policy, as_of=args.as_of)
+            if args.summary_only:
+                print(json.dumps(engine.summary()))
+            else:
+                print(json.dumps(engine.write_report(args.out or f"overdue-{engine.as_of.isoformat()}.csv")))
+        elif args.command == "check-indexes":
+            report = db.explain_hot_queries()
+            for r in report:
+                print(f"{'ok  ' if r['uses_index'] else 'SCAN'} {r['query']:<20} type={r['type']} key={r['key']} rows={r['rows']}")
+            return 0 if all(r['uses_index'] for r in report) else 1
+        elif args.command == "bench":
+            return run_bench_command(db, args)
+        elif args.command == "startup-bench":
+            return run_startup_bench(args)
+        elif args.command == "analytics":
+            db.circulation = CirculationAnalytics(db, idle_days=args.idle_days, top_n=args.top)
+            result = db.analytics(args.as_of)
+            if args.out:
+                with open(args.out, "w", encoding="utf-8") as fh:
+                    json.dump(result, fh, indent=2, default=_json_default)
+            else:
+                print(json.dumps(result, indent=2, default=_json_default))
+        elif args.command == "coborrow":
+            log = lambda msg: print(msg, file=sys.stderr)
+            if args.rebuild:
+                db.coborrow.build(log)
+            db.coborrow.ensure(log)
+            print(json.dumps(db.also_borrowed(args.book_id, args.top) if args.book_id is not None else db.coborrow.stats()))
+        elif args.command == "sync":
+            wb = WriteBehindDB(db, args.journal, start=False)
+            try:
+                try:
+                    print(f"synced {wb.flush()} ops", file=sys.stderr)
+                except Exception as e:
+                    print(f"sync stopped: {e}", file=sys.stderr)
+                status = wb.status()
+            finally:
+                wb.close()
+            print(json.dumps(status, default=_json_default))
+            return 1 if status["pending"] else 0
+        elif args.command == "export":
+            if args.kind == "loans":
+                rows = db.iter_loans(args.date_from, args.date_to, args.member_id, args.open_only,
+                                     not args.no_archive, args.chunk_size)
+            elif args.kind == "members":
+                rows = db.iter_members(args.date_from, args.date_to, args.member_id, args.chunk_size)
+            else:
+                rows = db.iter_catalog(args.year_from, args.year_to, args.chunk_size)
+            log = (lambda msg: print(msg, file=sys.stderr)) if args.out == "-" else print
+            write_export(rows, args.out, EXPORT_COLUMNS[args.kind], args.format, progress=log)
+        elif args.command == "archive":
+            before = args.before or date.today() - timedelta(days=args.older_than_days)
+            print(json.dumps(db.archive_history(before, args.batch_size, args.pause, args.dry_run), default=_json_default))
+        elif args.command == "events":
+            consumer = EventConsumer(db, args.after)
+            try:
+                if args.follow:
+                    for e in consumer.follow(args.interval):
+                        print(json.dumps(e, default=_json_default), flush=True)
+                else:
+                    while True:
+                        batch = consumer.poll()
+                        for e in batch:
+                            print(json.dumps(e, default=_json_default))
+                        if len(batch) < consumer.batch:
+                            break
+            except KeyboardInterrupt:
+                pass
+        elif args.command == "serve":
+            run_service(db, args.host, args.port, args.workers, args.token, args.verbose)
+        elif args.command == "loadtest-issue":
+            report = run_issue_load_test(db, desks=args.desks, seconds=args.seconds,
+                                         books=args.books, copies_per_book=args.copies)
+            return 0 if report["ok"] else 1
+    finally:
+        close_pool()
+
+def startup_benchmark(runs=5, gui_args=(), progress=print):
+    """Cold-start timings from fresh interpreters: importing this module, and the GUI from process
+    start to its first live data (--startup-probe; needs a display). Returns summaries per metric
+    plus the errors of GUI runs that failed."""
+    import subprocess
+    script = os.path.abspath(__file__)
+    module = os.path.splitext(os.path.basename(script))[0]
+    import_code = (f"import sys, time; sys.path.insert(0, {os.path.dirname(script)!r}); t = time.perf_counter(); "
+                   f"import {module}; print(time.perf_counter() - t)")
+    samples, errors = {}, []
+    for i in range(runs):
+        out = subprocess.run([sys.executable, "-c", import_code], capture_output=True, text=True, check=True)
+        samples.setdefault("import", []).append(float(out.stdout.split()[-1]))
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, script, *gui_args, "--startup-probe"], capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+        try:
+            probe = json.loads(out.stdout.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            probe = {"error": (out.stderr.strip().splitlines() or [f"exit code {out.returncode}"])[-1]}
+        if probe.get("error"):
+            errors.append(probe["error"])
+        else:
+            samples.setdefault("process", []).append(wall)
+            for k in ("window_ms", "snapshot_ms", "first_data_ms"):
+                if k in probe:
+                    samples.setdefault(k[:-3], []).append(probe[k] / 1000)
+        if progress:
+            progress(f"run {i + 1}/{runs}: import {samples['import'][-1] * 1000:.0f} ms, "
+                     + (f"gui failed: {errors[-1]}" if probe.get("error") else f"first data {probe.get('first_data_ms')} ms"))
+    return {"results": {k: _latency_summary(v) for k, v in samples.items()}, "errors": errors}
+
+def run_startup_bench(args):
+    gui_args = []
+    if args.server:
+        gui_args += ["--server", args.server] + (["--token", args.token] if args.token else [])
+    else:
+        backend = get_backend()
+        gui_args += ["--backend", backend.name] + (["--sqlite-path", backend.path] if backend.name == "sqlite" else [])
+    log = lambda msg: print(msg, file=sys.stderr)
+    results = startup_benchmark(args.runs, gui_args, progress=log)
+    results["budget_ms"] = args.budget_ms
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    first = results["results"].get("first_data")
+    if first is None:
+        log("no GUI run reached its first data; only import times were measured")
+        return 1
+    if first["p50_ms"] > args.budget_ms:
+        log(f"startup over budget: median {first['p50_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+def run_bench_command(db, args):
+    if args.scale in BENCH_SCALES:
+        scale = BENCH_SCALES[args.scale]
+    else:
+        n = int(args.scale)
+        scale = (n, 2, max(1, n // 5), n * 3)
+    log = lambda msg: print(msg, file=sys.stderr)
+    if not args.reuse:
+        t0 = time.perf_counter()
+        seed_synthetic_library(db, *scale, seed=args.seed, progress=log)
+        log(f"seeded in {time.perf_counter() - t0:.1f}s")
+    results = {
+        "meta": {"backend": get_backend().name, "scale": dict(zip(("books", "copies_per_book", "members", "loans"), scale)),
+                 "seed": args.seed, "repeat": args.repeat, "python": sys.version.split()[0],
+                 "timestamp": datetime.now().isoformat(timespec="seconds")},
+        "results": run_benchmarks(db, repeat=args.repeat, seed=args.seed, only=args.only, progress=log),
+    }
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare_benchmarks(results, json.load(fh), args.tolerance)
+        for r in regressions:
+            log(f"REGRESSION {r['op']}: {r['baseline']}ms -> {r['current']}ms (x{r['ratio']})")
+        return 1 if regressions else 0
+    return 0
+
+def apply_metrics_args(args):
+    if args.metrics or args.metrics_dump:
+        enable_metrics(slow_ms=args.slow_query_ms, slow_log_path=args.slow_query_log)
+
+def dump_metrics_on_exit(args):
+    if args.metrics_dump and _metrics is not None:
+        _metrics.dump(args.metrics_dump)
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    apply_backend_args(args)
+    apply_metrics_args(args)
+    if args.command:
+        try:
+            code = run_cli(args)
+        finally:
+            dump_metrics_on_exit(args)
+        sys.exit(code)
+    # the window comes up first; LibraryGUI checks the connection in the background
+    root = tk.Tk()
+    try:
+        db = RemoteLibraryDB(args.server, token=args.token) if args.server else LibraryDB(schema_check=False)
+        if args.write_behind:
+            db = WriteBehindDB(db, args.write_behind)
     except Exception as e:
-        messagebox.showerror("DB Connection Error", f"Could not connect to DB: {e}")
         print("Could not connect to DB:", e)
+        if args.startup_probe:
+            print(json.dumps({"error": str(e)}))
+        else:
+            messagebox.showerror("DB Connection Error", f"Could not connect to DB: {e}")
+        root.destroy()
         return
-
-    root = tk.Tk()
-    app = LibraryGUI(root)
-    root.mainloop()
+    app = LibraryGUI(root, db, startup_probe=args.startup_probe)
+    try:
+        root.mainloop()
+    finally:
+        close_pool()
+        dump_metrics_on_exit(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plsql_proj as lib  # noqa: E402
+
+# child tables first, so a wipe never trips a foreign key
+TABLES = ["CirculationEvents", "AppliedOps", "IssueReturnArchive", "IssueReturn", "BookCopies", "BookAuthors", "Books", "Authors", "Publishers", "Members"]
+
+
+def mysql_config():
+    """DB_CONFIG pointed at the scratch database named by LIBRARYDB_TEST_MYSQL_DATABASE (None if unset).
+    Every table in it is emptied before each test."""
+    database = os.environ.get("LIBRARYDB_TEST_MYSQL_DATABASE")
+    if not database:
+        return None
+    env = lambda name, key: os.environ.get(f"LIBRARYDB_TEST_MYSQL_{name}", lib.DB_CONFIG[key])
+    return dict(lib.DB_CONFIG, database=database, host=env("HOST", "host"), user=env("USER", "user"),
+                password=env("PASSWORD", "password"))
+
+
+def _wipe_mysql():
+    conn = lib.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in TABLES:
+            cur.execute(f"TRUNCATE TABLE {table}")
+        cur.execute("SET FOREIGN_KEY_CHECKS = 1")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def backend(request, monkeypatch):
+    """A fresh, migrated database: SQLite in memory, or the scratch MySQL database if configured."""
+    monkeypatch.setattr(lib, "_metrics", None)
+    if request.param == "sqlite":
+        lib.configure_backend("sqlite", path=":memory:")  # LibraryDB() creates the schema
+    else:
+        config = mysql_config()
+        if config is None:
+            pytest.skip("set LIBRARYDB_TEST_MYSQL_DATABASE to a scratch MySQL database to run these on MySQL")
+        if lib._mysql_connector() is None:
+            pytest.skip("mysql-connector-python is not installed")
+        monkeypatch.setattr(lib, "DB_CONFIG", config)
+        lib.configure_backend("mysql", config=config)
+        try:
+            lib.init_schema()
+        except Exception as e:
+            lib.close_pool()
+            pytest.skip(f"MySQL is not reachable: {e}")
+        _wipe_mysql()
+    yield lib.get_backend()
+    lib.close_pool()
+
+
+@pytest.fixture
+def db(backend):
+    db = lib.LibraryDB()
+    db.coborrow.path = None
+    return db
+
+
+@pytest.fixture
+def sqlite_file_db(tmp_path, monkeypatch):
+    """LibraryDB on a scratch SQLite file, for tests that need several connections at once."""
+    monkeypatch.setattr(lib, "_metrics", None)
+    lib.configure_backend("sqlite", path=str(tmp_path / "library.sqlite3"))
+    db = lib.LibraryDB()
+    db.coborrow.path = str(tmp_path / "coborrow.json")
+    yield db
+    lib.close_pool()
+
+
+@pytest.fixture
+def remote(sqlite_file_db):
+    """RemoteLibraryDB talking to a live service over sqlite_file_db."""
+    server = lib.make_http_server(("127.0.0.1", 0), lib.LibraryService(sqlite_file_db), workers=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield lib.RemoteLibraryDB(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def member(db):
+    return db.add_member("Ada Reader", "ada@example.org")
+
+
+@pytest.fixture
+def book(db):
+    return db.add_book("Dune", "Chilton", 1965, "SF", "Frank Herbert", copies=2)
+
+
+def copies_of(db, book_id):
+    return [c['copy_id'] for c in db.list_copies_for_book(book_id)]
+
+
+def scalar(sql, params=()):
+    conn = lib.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import plsql_proj as lib
+from conftest import copies_of, scalar
+
+
+def execute(sql, params=()):
+    conn = lib.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def old_loans(db, member, book, n):
+    """n loans of the book's first copy, returned two years ago; issue_ids oldest first."""
+    copy_id = copies_of(db, book)[0]
+    ids = []
+    for _ in range(n):
+        ids.append(db.issue_book(copy_id, member))
+        db.return_book(ids[-1])
+    marks = ",".join(["%s"] * n)
+    execute(f"UPDATE IssueReturn SET return_date = %s WHERE issue_id IN ({marks})",
+            (date.today() - timedelta(days=730), *ids))
+    return ids
+
+
+def test_archive_moves_old_returned_loans_in_batches(db, member, book):
+    returned = old_loans(db, member, book, 3)
+    open_id = db.issue_book(copies_of(db, book)[1], member)
+    assert db.archive_history(dry_run=True)['eligible'] == 3
+    res = db.archive_history(batch_size=2, pause=0, progress=None)
+    assert (res['archived'], res['batches']) == (3, 2)
+    assert scalar("SELECT COUNT(*) FROM IssueReturn") == 1
+    assert scalar("SELECT COUNT(*) FROM IssueReturnArchive") == 3
+    assert [e['data']['loans'] for e in db.read_events(0) if e['kind'] == "history_archived"] == [2, 1]
+    assert db.archive_history(pause=0, progress=None)['archived'] == 0
+    assert [r['issue_id'] for r in db.list_open_loans()] == [open_id]
+    assert db.stats() == db.stats(refresh=True)
+    assert [r['issue_id'] for r in db.get_loans([open_id, *returned])] == sorted([open_id, *returned])
+
+
+def test_archive_keeps_the_newest_loan_and_recent_returns(db, member, book):
+    recent = db.issue_book(copies_of(db, book)[1], member)
+    db.return_book(recent)
+    old = old_loans(db, member, book, 2)
+    # old[-1] is the newest loan: MySQL could hand a freed top issue_id out again
+    assert db.archive_history(pause=0, progress=None)['archived'] == 1
+    assert [r['issue_id'] for r in db.list_issued_page()] == [old[-1], recent]
+
+
+def test_history_reads_merge_live_and_archived_loans(db, member, book):
+    other = db.add_member("Grace Borrower")
+    returned = old_loans(db, member, book, 3)
+    open_id = db.issue_book(copies_of(db, book)[1], member)
+    db.archive_history(pause=0, progress=None)
+    everything = [open_id, *reversed(returned)]
+    assert [r['issue_id'] for r in db.list_issued_page()] == [open_id]
+    assert [r['issue_id'] for r in db.list_issued()] == everything
+    first = db.list_issued_page(limit=2, include_archived=True)
+    rest = db.list_issued_page(after_id=first[-1]['issue_id'], limit=2, include_archived=True)
+    assert [r['issue_id'] for r in first + rest] == everything
+    assert rest[0]['book_title'] == "Dune" and rest[0]['member_name'] == "Ada Reader"
+    assert [r['issue_id'] for r in db.member_history(member)] == everything
+    assert db.member_history(other) == []
+    assert db.loan_totals() == {"loans": 4, "open": 1, "returned": 3, "archived": 3}
+    assert db.loan_totals(other) == {"loans": 0, "open": 0, "returned": 0, "archived": 0}
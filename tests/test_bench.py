@@ -0,0 +1,52 @@
+import pytest
+
+import plsql_proj as lib
+
+SEEDED = ("Publishers", "Authors", "Books", "BookAuthors", "Members", "BookCopies", "IssueReturn")
+
+
+def seeded_rows(seed):
+    lib.configure_backend("sqlite", path=":memory:")
+    try:
+        db = lib.LibraryDB()
+        lib.seed_synthetic_library(db, books=60, copies_per_book=2, members=12, loans=200, seed=seed, progress=None)
+        conn = lib.get_conn()
+        cur = conn.cursor()
+        try:
+            rows = {}
+            for table in SEEDED:
+                cur.execute(f"SELECT * FROM {table} ORDER BY 1, 2")
+                rows[table] = cur.fetchall()
+            return rows
+        finally:
+            cur.close()
+            conn.close()
+    finally:
+        lib.close_pool()
+
+
+def test_seeding_is_reproducible():
+    first = seeded_rows(7)
+    sizes = {t: len(r) for t, r in first.items() if t != "BookAuthors"}
+    assert sizes == {"Publishers": 1, "Authors": 3, "Books": 60, "Members": 12, "BookCopies": 120, "IssueReturn": 200}
+    assert seeded_rows(7) == first
+    assert seeded_rows(8) != first
+
+
+def test_benchmarks_time_the_selected_operations(db):
+    lib.seed_synthetic_library(db, books=60, copies_per_book=2, members=12, loans=200, progress=None)
+    with pytest.raises(RuntimeError, match="empty database"):
+        lib.seed_synthetic_library(db, books=1, copies_per_book=1, members=1, loans=0, progress=None)
+    open_loans = int(200 * lib.BENCH_OPEN_LOAN_RATIO)
+    assert db.stats()['open_loans'] == open_loans
+    results = lib.run_benchmarks(db, repeat=3, only=["stats.", "issue_any_copy"], progress=None)
+    assert sorted(results) == ["build_search_index", "issue_any_copy+return_book", "stats.cached", "stats.uncached"]
+    assert results["stats.cached"]["n"] == 3
+    assert db.stats(refresh=True)['open_loans'] == open_loans
+
+
+def test_compare_flags_only_real_slowdowns():
+    run = lambda **p50: {"results": {name: {"p50_ms": ms} for name, ms in p50.items()}}
+    baseline = run(a=10.0, b=10.0, c=0.1, d=5.0)
+    current = run(a=12.0, b=13.0, c=0.5, e=100.0)
+    assert lib.compare_benchmarks(current, baseline) == [{"op": "b", "baseline": 10.0, "current": 13.0, "ratio": 1.3}]
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import plsql_proj as lib
+from conftest import copies_of
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def borrow(db, member, *books):
+    for book in books:
+        issue_id = db.issue_any_copy(book, member)["issue_id"]
+        db.return_book(issue_id)
+
+
+def test_catch_up_matches_a_rebuild(db):
+    books = [db.add_book(f"Book {i}", copies=1) for i in range(4)]
+    ada, bob = db.add_member("Ada"), db.add_member("Bob")
+    borrow(db, ada, books[0], books[1])
+    db.coborrow.build()
+    borrow(db, ada, books[2])
+    borrow(db, bob, books[1], books[2], books[3])
+    assert db.coborrow.catch_up() == 4
+    rebuilt = lib.CoBorrowIndex(db)
+    rebuilt.build()
+    assert db.coborrow.related == rebuilt.related
+    assert db.coborrow.top(books[2]) == [(books[1], 2), (books[0], 1), (books[3], 1)]
+
+
+def test_issuing_only_wakes_the_background_thread(db, member, book, monkeypatch):
+    other = db.add_book("Emma", copies=1)
+    index = db.coborrow
+    index.interval = 60
+    index.build()
+    calls = []
+    catch_up = index.catch_up
+    monkeypatch.setattr(index, "catch_up", lambda: calls.append(threading.current_thread().name) or catch_up())
+    db.issue_book(copies_of(db, book)[0], member)
+    assert calls == []  # nothing ran on the issuing thread
+    index.start()
+    try:
+        db.issue_book(copies_of(db, other)[0], member)
+        assert wait_for(lambda: index.top(other) == [(book, 1)])
+        assert set(calls) == {"coborrow-follow"}
+    finally:
+        index.stop()
+    assert not index.stats()["following"]
+
+
+def test_background_failures_go_to_metrics(db, member, book, capsys):
+    metrics = lib.enable_metrics()
+    index = db.coborrow
+    index.interval = 60
+    index.build()
+    index.PREVIOUS_SQL = "SELECT no_such_column FROM Books WHERE %s AND %s AND %s AND %s AND %s"
+    index.start()
+    try:
+        db.issue_book(copies_of(db, book)[0], member)
+        assert wait_for(lambda: metrics.snapshot()["operations"].get("coborrow.catch_up", {}).get("errors"))
+        assert index.stats()["last_error"]
+        position = index.events.position
+        del index.PREVIOUS_SQL
+        index.notify()
+        assert wait_for(lambda: index.stats()["last_error"] is None)
+        assert index.events.position > position
+    finally:
+        index.stop()
+    assert capsys.readouterr().err == ""
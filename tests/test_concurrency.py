@@ -0,0 +1,55 @@
+import threading
+
+import plsql_proj as lib
+from conftest import copies_of, scalar
+
+
+def race(n, fn):
+    """Run fn() on n threads released together; returns [("ok", result) | ("error", exception)]."""
+    barrier = threading.Barrier(n)
+    outcomes = []
+
+    def run():
+        barrier.wait()
+        try:
+            outcomes.append(("ok", fn()))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def test_concurrent_returns_close_a_loan_once(sqlite_file_db):
+    db = sqlite_file_db
+    member = db.add_member("Ada Reader")
+    book = db.add_book("Dune", copies=1)
+    copy_id = copies_of(db, book)[0]
+    db.stats()
+    for _ in range(20):
+        issue_id = db.issue_book(copy_id, member)
+        outcomes = race(6, lambda: db.return_book(issue_id))
+        assert [kind for kind, _ in outcomes].count("ok") == 1
+        assert all(isinstance(e, ValueError) and str(e) == "Already returned." for kind, e in outcomes if kind == "error")
+    assert scalar("SELECT COUNT(*) FROM CirculationEvents WHERE kind = 'return'") == 20
+    assert db.stats() == db.stats(refresh=True)
+
+
+def test_issue_load_test_leaves_nothing_behind(sqlite_file_db):
+    db = sqlite_file_db
+    keep = db.add_member("Ada Reader")
+    before = db.last_event_seq()
+    report = lib.run_issue_load_test(db, desks=4, seconds=1.0, books=3, copies_per_book=2, progress=None)
+    assert report['ok'], report
+    assert report['issued'] > 0 and report['returned'] > 0
+    assert report['double_issued'] == [] and report['inconsistent'] == []
+    # the scratch rows and every event they journaled are gone; nothing else is touched
+    assert [m['member_id'] for m in db.list_members()] == [keep]
+    for table in ("Books", "BookCopies", "IssueReturn"):
+        assert scalar(f"SELECT COUNT(*) FROM {table}") == 0
+    assert [e['seq'] for e in db.read_events(0)] == [before]
+    assert db.stats() == db.stats(refresh=True)
@@ -0,0 +1,79 @@
+import csv
+import gzip
+import json
+from datetime import date, timedelta
+
+import plsql_proj as lib
+from conftest import copies_of
+
+
+def execute(sql, params=()):
+    conn = lib.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def test_iter_loans_filters_and_streams_archived_history_first(db, member, book):
+    other = db.add_member("Grace Borrower")
+    a, b = copies_of(db, book)
+    old = db.issue_book(a, member)
+    db.return_book(old)
+    long_ago = date.today() - timedelta(days=800)
+    execute("UPDATE IssueReturn SET issue_date = %s, return_date = %s WHERE issue_id = %s", (long_ago, long_ago, old))
+    mine, theirs = db.issue_book(a, member), db.issue_book(b, other)  # keeps `old` from being the newest loan
+    assert db.archive_history(pause=0, progress=None)['archived'] == 1
+    assert [r['issue_id'] for r in db.iter_loans(chunk_size=1)] == [old, mine, theirs]
+    assert [r['issue_id'] for r in db.iter_loans(include_archived=False)] == [mine, theirs]
+    assert [r['issue_id'] for r in db.iter_loans(member_id=member)] == [old, mine]
+    assert [r['issue_id'] for r in db.iter_loans(open_only=True)] == [mine, theirs]
+    assert [r['issue_id'] for r in db.iter_loans(end=date.today() - timedelta(days=1))] == [old]
+    assert [r['issue_id'] for r in db.iter_loans(start=date.today())] == [mine, theirs]
+    assert next(db.iter_loans())['book_title'] == "Dune"
+
+
+def test_iter_members_and_catalog(db, member, book):
+    newcomer = db.add_member("Grace Borrower", membership_date=date.today() + timedelta(days=1))
+    emma = db.add_book("Emma", "John Murray", 1815, "Fiction", "Jane Austen, Anon", copies=3)
+    db.issue_book(copies_of(db, emma)[0], member)
+    assert [m['member_id'] for m in db.iter_members()] == [member, newcomer]
+    assert [m['member_id'] for m in db.iter_members(joined_from=date.today() + timedelta(days=1))] == [newcomer]
+    assert [m['full_name'] for m in db.iter_members(member_id=member)] == ["Ada Reader"]
+    catalog = list(db.iter_catalog(chunk_size=1))
+    assert [(r['title'], r['total_copies'], r['available_copies']) for r in catalog] == [("Dune", 2, 2), ("Emma", 3, 2)]
+    assert sorted(catalog[1]['authors'].split(", ")) == ["Anon", "Jane Austen"]
+    assert [r['book_id'] for r in db.iter_catalog(year_to=1900)] == [emma]
+    assert [r['book_id'] for r in db.iter_catalog(year_from=1900, year_to=2000)] == [book]
+
+
+def test_an_abandoned_stream_leaves_the_pool_usable(db, member, book):
+    for _ in range(3):
+        db.add_member("Another Reader")
+    rows = db.iter_members(chunk_size=1)
+    assert next(rows)['member_id'] == member
+    rows.close()
+    assert db.stats(refresh=True)['members'] == 4
+
+
+def test_write_export_formats(db, member, book, tmp_path):
+    columns = lib.EXPORT_COLUMNS["catalog"]
+    messages = []
+    assert lib.write_export(db.iter_catalog(), str(tmp_path / "catalog.csv"), columns, progress=messages.append) == 1
+    with open(tmp_path / "catalog.csv", newline="", encoding="utf-8") as fh:
+        rows = list(csv.reader(fh))
+    assert rows[0] == list(columns) and rows[1][:2] == [str(book), "Dune"]
+    assert messages[-1].startswith("Export finished: 1 rows")
+
+    path = str(tmp_path / "members.jsonl.gz")
+    db.add_member("Grace Borrower", membership_date=date(2020, 1, 2))
+    messages = []
+    assert lib.write_export(db.iter_members(), path, lib.EXPORT_COLUMNS["members"], progress=messages.append, every=1) == 2
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        records = [json.loads(line) for line in fh]
+    assert [r['full_name'] for r in records] == ["Ada Reader", "Grace Borrower"]
+    assert records[1]['membership_date'] == "2020-01-02"
+    assert [m.split(" (")[0] for m in messages[:2]] == ["exported 1 rows", "exported 2 rows"]
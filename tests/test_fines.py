@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import pytest
+
+import plsql_proj as lib
+from conftest import copies_of
+
+DAYS_LATE = [0, 1, 3, 4, 7, 100]
+
+
+def test_grace_days_and_cap():
+    policy = lib.FinePolicy(per_day=2, grace_days=3, cap=10)
+    assert [policy.fine(d) for d in DAYS_LATE] == [0, 0, 0, 2, 8, 10]
+    assert policy.fines(DAYS_LATE) == [0, 0, 0, 2, 8, 10]
+    assert lib.FinePolicy(per_day=2).fines(DAYS_LATE) == [0, 2, 6, 8, 14, 200]
+    assert lib.FinePolicy.days_late(date(2024, 1, 10), date(2024, 1, 13)) == 3
+    assert lib.FinePolicy.days_late(date(2024, 1, 10), date(2024, 1, 9)) == 0
+    assert lib.FinePolicy.days_late(None, date(2024, 1, 9)) == 0
+
+
+def test_vectorized_fines_match_the_scalar_rule():
+    np = lib._numpy()
+    if np is None:
+        pytest.skip("NumPy is not installed")
+    for policy in (lib.FinePolicy(per_day=2, grace_days=3, cap=10), lib.FinePolicy(per_day=1.5)):
+        fines = policy.fines(np.array(DAYS_LATE))
+        assert fines.tolist() == [policy.fine(d) for d in DAYS_LATE]
+
+
+@pytest.fixture
+def overdue(db, member):
+    book = db.add_book("Dune", copies=4)
+    for copy_id, loan_days in zip(copies_of(db, book), (-1, -4, -20, 5)):
+        db.issue_book(copy_id, member, loan_days=loan_days)
+
+
+def test_overdue_engine_and_sql_summary_apply_the_same_policy(db, overdue, tmp_path):
+    engine = lib.OverdueEngine(db, lib.FinePolicy(per_day=2, grace_days=3, cap=10), chunk_size=2)
+    rows = [r for chunk in engine.iter_chunks() for r in chunk]
+    assert sorted((r['days_late'], r['fine']) for r in rows) == [(1, 0), (4, 2), (20, 10)]
+    assert engine.summary() == {"as_of": date.today().isoformat(), "overdue_loans": 3, "total_fines": 12.0,
+                                "max_days_late": 20}
+    report = engine.write_report(str(tmp_path / "overdue.csv"), progress=None)
+    assert (report['overdue_loans'], report['total_fines'], report['max_days_late']) == (3, 12, 20)
+    assert len((tmp_path / "overdue.csv").read_text(encoding="utf-8").splitlines()) == 4
+
+
+def test_overdue_as_of_a_later_date(db, overdue):
+    engine = lib.OverdueEngine(db, lib.FinePolicy(per_day=1), as_of=date.today() + timedelta(days=10))
+    assert engine.summary()['overdue_loans'] == 4
+    assert sorted(r['days_late'] for chunk in engine.iter_chunks() for r in chunk) == [5, 11, 14, 30]
+
+
+def test_return_book_charges_by_the_policy(backend):
+    db = lib.LibraryDB(fine_policy=lib.FinePolicy(per_day=2, grace_days=3, cap=10))
+    member = db.add_member("Grace Borrower")
+    book = db.add_book("Dune", copies=2)
+    a, b = copies_of(db, book)
+    assert db.return_book(db.issue_book(a, member, loan_days=-4))['fine'] == 2
+    assert db.return_book(db.issue_book(b, member, loan_days=-30))['fine'] == 10
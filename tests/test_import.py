@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import plsql_proj as lib
+from conftest import scalar
+
+RECORDS = [
+    {"title": "Dune", "publisher": "Chilton", "publication_year": 1965, "genre": "SF",
+     "authors": ["Frank Herbert"], "copies": 2},
+    {"title": "", "authors": "Nobody"},  # no title: skipped
+    {"title": "Emma", "publisher": "John Murray", "publication_year": 1815, "authors": "Jane Austen"},
+    {"title": "Persuasion", "publisher": "John Murray", "publication_year": 1817, "authors": "Jane Austen"},
+    {"title": "Bad year", "publication_year": "soon"},  # malformed number: skipped
+    {"title": "Good Omens", "publication_year": 1990, "authors": "Terry Pratchett, Neil Gaiman", "copies": 3},
+    {"title": "Stardust", "authors": ["Neil Gaiman"]},
+]
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    return str(path)
+
+
+def imported_titles():
+    conn = lib.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT title FROM Books ORDER BY book_id")
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def test_import_writes_books_authors_and_copies(db, tmp_path):
+    source = write_jsonl(tmp_path / "books.jsonl", RECORDS)
+    result = lib.BulkImporter(db, batch_size=2, progress=None).run(source)
+    assert (result['imported'], result['skipped']) == (5, 2)
+    assert imported_titles() == ["Dune", "Emma", "Persuasion", "Good Omens", "Stardust"]
+    assert scalar("SELECT COUNT(*) FROM Authors") == 4
+    assert scalar("SELECT COUNT(*) FROM Publishers") == 2
+    assert scalar("SELECT COUNT(*) FROM BookCopies") == 8
+    omens = db.list_books_page(limit=2)[1]
+    assert (omens['title'], omens['authors'].split(", ")) == ("Good Omens", ["Terry Pratchett", "Neil Gaiman"])
+    # one journal event per committed batch
+    assert [e['data']['books'] for e in db.read_events(0) if e['kind'] == "books_imported"] == [2, 2, 1]
+
+
+def test_an_interrupted_import_resumes_after_the_last_committed_batch(db, tmp_path, monkeypatch):
+    source = write_jsonl(tmp_path / "books.jsonl", RECORDS)
+    checkpoint = str(tmp_path / "books.checkpoint")
+    importer = lib.BulkImporter(db, batch_size=2, checkpoint_path=checkpoint, progress=None)
+    write_batch, batches = importer._write_batch, []
+
+    def interrupted(cur, batch):
+        batches.append([r['title'] for r in batch])
+        write_batch(cur, batch)
+        if len(batches) == 2:
+            raise KeyboardInterrupt  # after the inserts, before the commit
+
+    monkeypatch.setattr(importer, "_write_batch", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        importer.run(source)
+    assert batches == [["Dune", "Emma"], ["Persuasion", "Good Omens"]]
+    assert imported_titles() == ["Dune", "Emma"]  # the second batch rolled back
+    with open(checkpoint, encoding="utf-8") as fh:
+        assert json.load(fh)['records_done'] == 3
+
+    resumed = lib.BulkImporter(db, batch_size=2, checkpoint_path=checkpoint, progress=None).run(source)
+    assert (resumed['imported'], resumed['skipped']) == (3, 1)
+    assert imported_titles() == ["Dune", "Emma", "Persuasion", "Good Omens", "Stardust"]
+    assert scalar("SELECT COUNT(*) FROM Authors") == 4
+    assert scalar("SELECT COUNT(*) FROM BookCopies") == 8
+
+
+def test_a_checkpoint_only_resumes_its_own_source(db, tmp_path):
+    checkpoint = str(tmp_path / "books.checkpoint")
+    first = write_jsonl(tmp_path / "first.jsonl", RECORDS[:1])
+    lib.BulkImporter(db, checkpoint_path=checkpoint, progress=None).run(first)
+    other = write_jsonl(tmp_path / "other.jsonl", RECORDS[2:3])
+    with pytest.raises(RuntimeError, match="belongs to"):
+        lib.BulkImporter(db, checkpoint_path=checkpoint, progress=None).run(other)
+    assert imported_titles() == ["Dune"]
+
+
+def test_csv_records_are_parsed_like_jsonl(tmp_path):
+    source = tmp_path / "books.csv"
+    source.write_text("title,publisher_name,year,genre,authors,copies\n"
+                      'Good Omens,Gollancz,1990,Fantasy,"Terry Pratchett, Neil Gaiman, Terry Pratchett",\n'
+                      "Bad year,,soon,,,\n", encoding="utf-8")
+    assert list(lib.iter_catalog_records(str(source))) == [
+        (1, {"title": "Good Omens", "publisher": "Gollancz", "publication_year": 1990, "genre": "Fantasy",
+             "authors": ["Terry Pratchett", "Neil Gaiman"], "copies": 1}),
+        (2, None),
+    ]
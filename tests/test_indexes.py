@@ -0,0 +1,39 @@
+import pytest
+
+import plsql_proj as lib
+from conftest import scalar
+
+
+def test_migrations_apply_once_on_a_fresh_database(db):
+    assert scalar("SELECT COUNT(*) FROM SchemaMigrations") == len(lib.MIGRATIONS)
+    assert lib.migrate() == []
+
+
+def test_startup_refuses_an_out_of_date_schema_unless_it_creates_it(db, backend, monkeypatch):
+    # a release that ships a new migration, on a database that hasn't run it yet
+    version = lib.MIGRATIONS[-1][0] + 1
+    monkeypatch.setattr(lib, "MIGRATIONS", lib.MIGRATIONS + [
+        (version, "no-op", ["UPDATE SchemaMigrations SET description = description WHERE 1 = 0"])])
+    assert lib.pending_migrations() == [version]
+    monkeypatch.setattr(backend, "auto_create", False)
+    with pytest.raises(RuntimeError, match=rf"pending migrations: {version}\); run `plsql_proj.py migrate`"):
+        lib.LibraryDB()
+    try:
+        assert lib.migrate() == [version]
+        lib.LibraryDB()
+    finally:
+        # SchemaMigrations outlives the MySQL wipe; forget the no-op so the next run sees it pending
+        conn = lib.get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM SchemaMigrations WHERE version = %s", (version,))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+
+def test_every_hot_query_uses_an_index(db, member, book):
+    report = db.explain_hot_queries()
+    assert sorted(r['query'] for r in report) == sorted(lib.LibraryDB.HOT_QUERIES)
+    assert [r for r in report if not r['uses_index']] == []
@@ -0,0 +1,268 @@
+from datetime import date
+
+import pytest
+
+import plsql_proj as lib
+from conftest import copies_of, scalar
+
+
+def test_add_and_list_books(db, book):
+    db.add_book("Emma", "Chilton", 1815, "Fiction", "Jane Austen, Jane Austen", copies=1)
+    rows = {r['title']: r for r in db.list_books()}
+    assert set(rows) == {"Dune", "Emma"}
+    assert rows["Dune"]['book_id'] == book
+    assert rows["Dune"]['authors'] == "Frank Herbert"
+    assert rows["Dune"]['publisher_name'] == "Chilton"
+    assert (rows["Dune"]['total_copies'], rows["Dune"]['available_copies']) == (2, 2)
+    assert rows["Emma"]['authors'] == "Jane Austen"
+    assert scalar("SELECT COUNT(*) FROM Publishers") == 1
+    assert [r['title'] for r in db.list_books(genre="SF")] == ["Dune"]
+
+
+def test_catalog_pages_are_keyset_paged_newest_first(db):
+    ids = [db.add_book(f"Book {i}", f"Press {i % 2}", 2000 + i % 3, ["SF", "Poetry"][i % 2], f"Author {i}",
+                       copies=i % 3 + 1) for i in range(7)]
+    pages, after = [], None
+    while True:
+        page = db.list_books_page(after, limit=3)
+        if not page:
+            break
+        pages.append([r['book_id'] for r in page])
+        after = page[-1]['book_id']
+    assert pages == [ids[:3:-1], ids[3:0:-1], ids[:1]]
+    first = db.list_books_page(limit=1)[0]
+    assert (first['title'], first['authors'], first['total_copies'], first['available_copies']) == ("Book 6", "Author 6", 1, 1)
+    assert [r['book_id'] for r in db.list_books_page(genre="SF")] == ids[::-2]
+    assert [r['book_id'] for r in db.list_books_page(publisher="Press 1")] == ids[5::-2]
+    assert [r['book_id'] for r in db.list_books_page(year=2001, genre="Poetry")] == [ids[1]]
+    assert [r['book_id'] for r in db.list_books_page(ids[4], genre="SF")] == [ids[2], ids[0]]
+    assert [r['book_id'] for r in db.iter_books(page_size=2, publisher="Press 0")] == ids[::-2]
+
+
+def test_add_and_list_members(db, member):
+    other = db.add_member("Grace Borrower")
+    assert [m['member_id'] for m in db.list_members()] == [other, member]
+    assert db.list_members_page(after_id=other)[0]['full_name'] == "Ada Reader"
+
+
+def test_author_names_are_matched_by_the_column_collation(db, tmp_path):
+    # which spellings are one author is up to the collation (ASCII-only NOCASE on SQLite,
+    # accent-insensitive on MySQL's default); every spelling must resolve to the row it selects
+    names = ["García Márquez", "garcía márquez", "GARCÍA MÁRQUEZ", "Garcia Marquez"]
+    db.add_book("Cien años de soledad", authors_csv=names[0])
+    book = db.add_book("El otoño del patriarca", authors_csv=", ".join(names))
+    source = tmp_path / "books.csv"
+    source.write_text("title,authors\n" + "".join(f'Book {i},"{n}"\n' for i, n in enumerate(reversed(names))),
+                      encoding="utf-8")
+    lib.BulkImporter(db, progress=None).run(str(source))
+    expected = {n: scalar("SELECT author_id FROM Authors WHERE author_name = %s", (n,)) for n in names}
+    assert None not in expected.values()
+    assert scalar("SELECT COUNT(*) FROM Authors") == len(set(expected.values()))
+    assert scalar("SELECT COUNT(*) FROM BookAuthors WHERE book_id = %s", (book,)) == len(set(expected.values()))
+    for i, n in enumerate(reversed(names)):
+        linked = scalar("SELECT ba.author_id FROM BookAuthors ba JOIN Books b ON b.book_id = ba.book_id "
+                        "WHERE b.title = %s", (f"Book {i}",))
+        assert linked == expected[n]
+    assert {n: db.get_or_create_author(n) for n in names} == expected
+
+
+def test_issue_and_return(db, member, book):
+    copy_id = copies_of(db, book)[0]
+    issue_id = db.issue_book(copy_id, member)
+    with pytest.raises(ValueError, match="not available"):
+        db.issue_book(copy_id, member)
+    with pytest.raises(ValueError, match="Copy not found"):
+        db.issue_book(999999, member)
+    assert [c['availability'] for c in db.list_copies_for_book(book)] == ["Issued", "Available"]
+
+    res = db.return_book(issue_id)
+    assert (res['issue_id'], res['copy_id'], res['book_id'], res['member_id']) == (issue_id, copy_id, book, member)
+    assert (res['fine'], res['was_overdue'], res['return_date']) == (0, False, date.today())
+    with pytest.raises(ValueError, match="Already returned"):
+        db.return_book(issue_id)
+    with pytest.raises(ValueError, match="not found"):
+        db.return_book(999999)
+    assert [c['availability'] for c in db.list_copies_for_book(book)] == ["Available", "Available"]
+
+
+def test_overdue_return_is_fined(db, member, book):
+    issue_id = db.issue_book(copies_of(db, book)[0], member, loan_days=-3)
+    res = db.return_book(issue_id)
+    assert res['was_overdue'] and res['days_late'] == 3
+    assert res['fine'] == 3 * lib.FINE_PER_DAY
+
+
+def test_issue_any_copy(db, member, book):
+    first = db.issue_any_copy(book, member)
+    second = db.issue_any_copy(book, member)
+    assert {first['copy_id'], second['copy_id']} == set(copies_of(db, book))
+    assert (first['loan']['book_title'], first['loan']['member_id']) == ("Dune", member)
+    assert [l['issue_id'] for l in db.list_open_loans(member_id=member)] == [second['issue_id'], first['issue_id']]
+    with pytest.raises(ValueError, match="No available copies"):
+        db.issue_any_copy(book, member)
+
+
+def test_issue_many(db, member, book):
+    a, b = copies_of(db, book)
+    db.issue_book(b, member)
+    results = db.issue_many(member, [a, b, 999999, a])
+    assert [(r['copy_id'], r['ok']) for r in results] == [(a, True), (b, False), (999999, False)]
+    assert results[0]['loan']['member_id'] == member
+    assert results[1]['error'] == "Copy is not available."
+    assert results[2]['error'] == "Copy not found."
+
+
+def test_issue_many_all_or_nothing_rolls_back(db, member, book):
+    a, b = copies_of(db, book)
+    db.issue_book(b, member)
+    with pytest.raises(ValueError, match=f"copy {b}"):
+        db.issue_many(member, [a, b], all_or_nothing=True)
+    assert scalar("SELECT COUNT(*) FROM IssueReturn") == 1
+    assert db.list_copies_for_book(book)[0]['availability'] == "Available"
+
+
+def test_return_many(db, member, book):
+    a, b = copies_of(db, book)
+    ia, ib = db.issue_book(a, member), db.issue_book(b, member, loan_days=-2)
+    db.return_book(ia)
+    results = db.return_many([ia, ib, 999999])
+    assert [(r['issue_id'], r['ok']) for r in results] == [(ia, False), (ib, True), (999999, False)]
+    assert results[0]['error'] == "Already returned."
+    assert results[1]['fine'] == 2 * lib.FINE_PER_DAY and results[1]['was_overdue']
+    assert results[2]['error'] == "Issue record not found."
+
+
+def test_return_copies(db, member, book):
+    a, b = copies_of(db, book)
+    issue_id = db.issue_book(a, member)
+    results = db.return_copies([a, b])
+    assert results[0]['ok'] and results[0]['issue_id'] == issue_id
+    assert results[1] == {"copy_id": b, "ok": False, "error": "Copy is not on loan."}
+
+
+def test_events_are_journaled_in_order(db, member, book):
+    consumer = lib.EventConsumer(db, None)
+    a, b = copies_of(db, book)
+    issue_id = db.issue_book(a, member)
+    db.issue_many(member, [b])
+    db.return_book(issue_id)
+    events = consumer.poll()
+    assert [e['kind'] for e in events] == ["issue", "issue", "return"]
+    assert events[0]['entity_id'] == issue_id
+    assert events[0]['data'] == {"copy_id": a, "book_id": book, "member_id": member,
+                                 "due_date": events[0]['data']['due_date']}
+    assert events[2]['data']['fine'] == 0
+    assert consumer.position == db.last_event_seq()
+    assert consumer.poll() == []
+    assert [e['kind'] for e in db.read_events(0)][:2] == ["member_added", "book_added"]
+
+
+def test_failed_issue_journals_nothing(db, member, book):
+    copy_id = copies_of(db, book)[0]
+    db.issue_book(copy_id, member)
+    before = db.last_event_seq()
+    with pytest.raises(ValueError):
+        db.issue_book(copy_id, member)
+    assert db.last_event_seq() == before
+
+
+class _Journal:
+    """read_events() over a list, for driving EventConsumer through sequence gaps."""
+    def __init__(self, seqs):
+        self.seqs = seqs
+
+    def last_event_seq(self):
+        return max(self.seqs, default=0)
+
+    def read_events(self, after_seq=0, limit=1000):
+        return [{"seq": s} for s in sorted(self.seqs) if s > after_seq][:limit]
+
+
+def test_event_consumer_waits_out_a_gap_then_skips_it(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(lib.time, "monotonic", lambda: clock[0])
+    journal = _Journal([1, 3, 5])
+    consumer = lib.EventConsumer(journal, 0, gap_grace=10)
+    assert [e['seq'] for e in consumer.poll()] == [1]
+    clock[0] += 5
+    assert consumer.poll() == []
+    journal.seqs.append(2)  # the slower writer commits within the grace period
+    assert [e['seq'] for e in consumer.poll()] == [2, 3]
+    clock[0] += 5
+    assert consumer.poll() == []  # the grace period restarts at the new gap
+    clock[0] += 10
+    assert [e['seq'] for e in consumer.poll()] == [5]  # 4 was rolled back
+    assert consumer.position == 5
+
+
+def test_issue_to_unknown_member_is_rejected(db, member, book):
+    a, b = copies_of(db, book)
+    before = db.last_event_seq()
+    with pytest.raises(ValueError, match="Member not found"):
+        db.issue_book(a, 999999)
+    with pytest.raises(ValueError, match="Member not found"):
+        db.issue_any_copy(book, 999999)
+    with pytest.raises(ValueError, match="Member not found"):
+        db.issue_many(999999, [a, b])
+    assert [c['availability'] for c in db.list_copies_for_book(book)] == ["Available", "Available"]
+    assert scalar("SELECT COUNT(*) FROM IssueReturn") == 0
+    assert db.last_event_seq() == before
+
+
+def test_stats_follow_writes(db, member, book):
+    assert db.stats() == {"books": 1, "members": 1, "open_loans": 0, "overdue_loans": 0, "available_copies": 2}
+    a, b = copies_of(db, book)
+    db.issue_book(a, member, loan_days=-1)
+    db.issue_many(member, [b])
+    db.add_book("Emma", copies=3)
+    db.add_member("Grace Borrower")
+    cached = db.stats()
+    assert cached == {"books": 2, "members": 2, "open_loans": 2, "overdue_loans": 0, "available_copies": 3}
+    # overdue loans are only counted by a recount; everything else must already agree
+    assert dict(cached, overdue_loans=1) == db.stats(refresh=True)
+    db.return_many([r['issue_id'] for r in db.list_open_loans()])
+    assert db.stats() == db.stats(refresh=True)
+
+
+def test_writes_in_an_outer_unit_touch_the_cache_only_after_it_commits(db, member, book, monkeypatch):
+    a, b = copies_of(db, book)
+    after_issue = []
+    monkeypatch.setattr(db, "_after_issue", lambda: after_issue.append(1))
+    db.build_search_index()
+    before = db.stats()
+    with lib.unit_of_work():
+        issue_id = db.issue_book(a, member)
+        db.issue_any_copy(book, member)
+        db.return_book(issue_id)
+        db.issue_many(member, [a])
+        db.return_copies([b])
+        db.add_member("Grace Borrower")
+        emma = db.add_book("Emma", None, 1815, "Fiction", "Jane Austen")
+        assert db.stats() == before and db.search_books("austen") == [] and after_issue == []
+    assert after_issue == [1, 1, 1]
+    assert db.search_books("austen") == [emma]
+    assert db.stats() == dict(before, books=2, members=2, open_loans=1, available_copies=2) == db.stats(refresh=True)
+
+
+def test_rolled_back_writes_leave_the_cache_alone(db, member, book, monkeypatch):
+    a, b = copies_of(db, book)
+    issue_id = db.issue_book(a, member)
+    after_issue = []
+    monkeypatch.setattr(db, "_after_issue", lambda: after_issue.append(1))
+    db.build_search_index()
+    before = db.stats()
+    with pytest.raises(RuntimeError):
+        with lib.unit_of_work():
+            db.issue_many(member, [b])
+            raise RuntimeError("rolled back")
+    with pytest.raises(RuntimeError):
+        with lib.unit_of_work():
+            db.return_book(issue_id)
+            raise RuntimeError("rolled back")
+    with pytest.raises(RuntimeError):
+        with lib.unit_of_work():
+            db.add_member("Grace Borrower")
+            db.add_book("Emma", None, 1815, "Fiction", "Jane Austen")
+            raise RuntimeError("rolled back")
+    assert db.search_books("austen") == [] and after_issue == []
+    assert db.stats() == before == db.stats(refresh=True)
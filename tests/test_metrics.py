@@ -0,0 +1,27 @@
+import json
+
+import plsql_proj as lib
+
+
+def test_queries_are_timed_per_caller_and_slow_ones_logged(db, book, tmp_path):
+    log = tmp_path / "slow.jsonl"
+    m = lib.enable_metrics(slow_ms=0, slow_log_path=str(log))
+    db.list_books_page(limit=5)
+    ops = m.snapshot()["operations"]
+    assert "sql.execute LibraryDB.list_books_page" in ops and "pool.acquire" in ops
+    assert m.slow and all(e["ms"] >= 0 for e in m.slow)
+    assert json.loads(log.read_text().splitlines()[0])["op"] == m.slow[0]["op"]
+    lib.disable_metrics()
+    db.list_books_page(limit=5)
+    assert m.snapshot()["operations"] == ops
+
+
+def test_timed_records_only_while_metrics_are_on(monkeypatch):
+    monkeypatch.setattr(lib, "_metrics", None)
+    work = lib.timed("job")(lambda x: x * 2)
+    assert work(2) == 4
+    m = lib.enable_metrics()
+    assert work(3) == 6
+    assert m.snapshot()["operations"]["job"]["count"] == 1
+    m.reset()
+    assert m.snapshot()["operations"] == {}
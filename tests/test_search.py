@@ -0,0 +1,28 @@
+def test_search(db, book):
+    db.add_book("Emma", None, 1815, "Fiction", "Jane Austen")
+    assert db.search_books("herbert") == [book]
+    assert [r['title'] for r in db.search_catalog("dune")] == ["Dune"]
+    db.build_search_index()
+    assert db.search_books("dun") == [book]
+    assert db.search_books("herbret") == [book]  # one typo
+    assert db.search_books("nothing like it") == []
+    emma = db.add_book("Emma", None, 1815, "Fiction", "Jane Austen")
+    assert db.search_books("austen")[0] == emma
+
+
+def test_books_committed_during_a_build_are_indexed(db, book, monkeypatch):
+    snapshot = db.iter_search_docs
+    added = []
+
+    def racing_snapshot(*args, **kwargs):
+        yield from snapshot(*args, **kwargs)
+        # committed after the build read its snapshot, but before the new index is swapped in
+        added.append(db.add_book("Emma", None, 1815, "Fiction", "Jane Austen"))
+        added.append(db.add_book("Persuasion", None, 1817, "Fiction", "Jane Austen"))
+        yield (added[-1], "Persuasion", "Jane Austen", None, "Fiction")  # this one made the snapshot too
+
+    monkeypatch.setattr(db, "iter_search_docs", racing_snapshot)
+    index = db.build_search_index()
+    assert db.search_index is index
+    assert sorted(db.search_books("austen")) == added
+    assert index.stats()["books"] == 3
@@ -0,0 +1,46 @@
+import pytest
+
+import plsql_proj as lib
+from conftest import copies_of
+
+
+def test_rule_rejections_are_409_and_bad_input_400(db, member, book):
+    service = lib.LibraryService(db)
+    a = copies_of(db, book)[0]
+    status, body = service.dispatch("POST", "/loans", {}, {"member_id": 999999, "copy_id": a})
+    assert (status, body) == (409, {"error": "Member not found."})
+    assert service.dispatch("POST", "/loans", {}, {"member_id": member, "copy_id": a})[0] == 200
+    assert service.dispatch("POST", "/loans", {}, {"member_id": member, "copy_id": a})[0] == 409
+    assert service.dispatch("POST", "/loans", {}, {"copy_id": a})[0] == 400
+    assert service.dispatch("GET", "/books", {"limit": "ten"}, {})[0] == 400
+    assert service.dispatch("POST", "/loans/batch", {}, {"member_id": member, "copy_ids": ["x"]})[0] == 400
+    assert service.dispatch("POST", "/returns", {}, {"issue_ids": ["1; DROP"]})[0] == 400
+
+
+def test_remote_client_raises_like_the_local_calls(remote):
+    member = remote.add_member("Ada Reader")
+    book = remote.add_book("Dune", copies=1)
+    issued = remote.issue_any_copy(book, member)
+    assert issued['loan']['book_title'] == "Dune"
+    with pytest.raises(lib.Conflict, match="No available copies"):
+        remote.issue_any_copy(book, member)
+    with pytest.raises(lib.BadRequest):
+        remote.issue_many(member, ["x"])
+    assert remote.return_book(issued['issue_id'])['fine'] == 0
+
+
+@pytest.mark.parametrize("error, status", [(lib.PoolTimeout("no free connection"), 503),
+                                           (ConnectionError("lost connection"), 503)])
+def test_a_busy_or_unreachable_database_is_503(db, monkeypatch, error, status):
+    def stats(**kwargs):
+        raise error
+    monkeypatch.setattr(db, "stats", stats)
+    assert lib.LibraryService(db).dispatch("GET", "/stats", {}, {}) == (status, {"error": str(error)})
+
+
+def test_other_failures_are_left_to_the_handler_as_500s(db, monkeypatch):
+    def stats(**kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(db, "stats", stats)
+    with pytest.raises(RuntimeError):
+        lib.LibraryService(db).dispatch("GET", "/stats", {}, {})
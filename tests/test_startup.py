@@ -0,0 +1,14 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_leaves_the_slow_modules_for_first_use():
+    probe = ("import json, sys, plsql_proj; "
+             "print(json.dumps([m for m in ('mysql.connector', 'numpy', 'http.server', 'urllib.request') "
+             "if m in sys.modules]))")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
@@ -0,0 +1,177 @@
+import json
+import socket
+import sqlite3
+
+import pytest
+
+import plsql_proj as lib
+from conftest import copies_of, scalar
+
+
+@pytest.fixture
+def desk(db, tmp_path):
+    wb = lib.WriteBehindDB(db, path=str(tmp_path / "desk.sqlite3"), start=False)
+    yield wb
+    wb.close()
+
+
+def outcomes(wb):
+    out = []
+    while not wb.completed.empty():
+        op, res = wb.completed.get()
+        out.append((op['kind'], res['status']))
+    return out
+
+
+def test_queued_ops_are_applied_in_order(desk, db, member, book):
+    a, b = copies_of(desk, book)
+    queued = desk.issue_copy(a, member)
+    assert queued['queued'] and scalar("SELECT COUNT(*) FROM IssueReturn") == 0
+    desk.issue_any_copy(book, member)
+    desk.return_copies([a])
+    assert desk.flush() == 3
+    assert outcomes(desk) == [("issue", "done"), ("issue_any", "done"), ("return_copy", "done")]
+    assert [(l['copy_id'], l['return_date'] is None) for l in db.list_issued_page(limit=10)] == [(b, True), (a, False)]
+    assert desk.status()['pending'] == 0 and desk.status()['synced'] == 3
+
+
+def test_a_replayed_op_is_applied_once(db, member, book):
+    op = {"key": "k-1", "kind": "issue", "args": {"copy_id": copies_of(db, book)[0], "member_id": member}}
+    first = db.apply_ops([op])
+    assert first[0]['status'] == "done"
+    assert db.apply_ops([op]) == [{"key": "k-1", "status": "done",
+                                   "result": json.loads(json.dumps(first[0]['result'], default=lib._json_default))}]
+    assert scalar("SELECT COUNT(*) FROM IssueReturn") == 1
+
+
+def test_rejected_ops_are_conflicts_and_do_not_block_the_queue(desk, db, member, book):
+    a, b = copies_of(desk, book)
+    db.issue_book(a, member)  # issued at another desk meanwhile
+    desk.issue_copy(a, member)
+    desk.issue_any_copy(book, 999999)
+    desk.return_book(424242)
+    desk.issue_copy(b, member)
+    desk.flush()
+    assert outcomes(desk) == [("issue", "conflict"), ("issue_any", "conflict"), ("return", "conflict"), ("issue", "done")]
+    assert desk.status()['conflicts'] == 3
+
+
+@pytest.mark.parametrize("error", [KeyError("copy_id"), TypeError("bad args"),
+                                   sqlite3.IntegrityError("FOREIGN KEY constraint failed")])
+def test_permanent_failures_are_recorded_as_conflicts(db, monkeypatch, error):
+    def run_op(kind, args):
+        raise error
+    monkeypatch.setattr(db, "_run_op", run_op)
+    [out] = db.apply_ops([{"key": "k-1", "kind": "issue", "args": {}}])
+    assert out['status'] == "conflict" and type(error).__name__ in out['error']
+    assert db.apply_ops([{"key": "k-1", "kind": "issue", "args": {}}]) == [out]
+
+
+@pytest.mark.parametrize("error", [sqlite3.OperationalError("database is locked"), lib.PoolTimeout("pool"),
+                                   ConnectionError("refused")])
+def test_transient_failures_propagate_unrecorded(db, monkeypatch, error):
+    def run_op(kind, args):
+        raise error
+    monkeypatch.setattr(db, "_run_op", run_op)
+    with pytest.raises(type(error)):
+        db.apply_ops([{"key": "k-1", "kind": "issue", "args": {}}])
+    assert scalar("SELECT COUNT(*) FROM AppliedOps") == 0
+
+
+def test_an_op_that_keeps_failing_is_set_aside(desk, db, member, book, monkeypatch):
+    a, b = copies_of(desk, book)
+    apply_ops = db.apply_ops
+
+    def flaky(ops):
+        if any(op['args'].get('copy_id') == b for op in ops):
+            raise TypeError("cannot apply")
+        return apply_ops(ops)
+    monkeypatch.setattr(db, "apply_ops", flaky)
+    desk.issue_copy(a, member)
+    desk.issue_copy(b, member)
+    desk.return_copies([a])
+    for _ in range(lib.WRITE_BEHIND_MAX_ATTEMPTS - 1):
+        with pytest.raises(TypeError):
+            desk.flush()
+    assert desk.status()['pending'] == 2
+    assert desk.flush() == 1
+    assert outcomes(desk) == [("issue", "done"), ("issue", "failed"), ("return_copy", "done")]
+    status = desk.status()
+    assert (status['pending'], status['synced'], status['failed'], status['last_error']) == (0, 2, 1, None)
+
+
+def test_an_unreachable_database_never_fails_ops(desk, db, member, book, monkeypatch):
+    def down(ops):
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(db, "apply_ops", down)
+    desk.issue_copy(copies_of(desk, book)[0], member)
+    for _ in range(lib.WRITE_BEHIND_MAX_ATTEMPTS + 2):
+        with pytest.raises(ConnectionError):
+            desk.flush()
+    status = desk.status()
+    assert (status['pending'], status['failed']) == (1, 0) and "unreachable" in status['last_error']
+
+
+@pytest.mark.parametrize("error, transient", [
+    (lib.ServiceUnavailable("503"), True), (lib.PoolTimeout("pool"), True), (ConnectionError("reset"), True),
+    (TimeoutError("timed out"), True), (sqlite3.OperationalError("database is locked"), True),
+    (RuntimeError("server error 500"), False), (NotImplementedError(), False), (RecursionError(), False),
+    (OSError("disk full"), False), (sqlite3.OperationalError("no such column: x"), False), (lib.Conflict("taken"), False)])
+def test_only_reaching_the_database_is_transient(error, transient):
+    assert lib.is_transient(error) is transient
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_remote_desk_keeps_ops_queued_while_the_service_is_unreachable(tmp_path, sqlite_file_db):
+    wb = lib.WriteBehindDB(lib.RemoteLibraryDB(f"http://127.0.0.1:{_closed_port()}", timeout=2),
+                           path=str(tmp_path / "desk.sqlite3"), start=False)
+    try:
+        wb.issue_copy(1, 1)
+        for _ in range(lib.WRITE_BEHIND_MAX_ATTEMPTS + 2):
+            with pytest.raises(lib.ServiceUnavailable):
+                wb.flush()
+        status = wb.status()
+        assert (status['pending'], status['failed']) == (1, 0) and "unreachable" in status['last_error']
+    finally:
+        wb.close()
+
+
+def test_remote_desk_retries_503s_and_sets_aside_other_errors(tmp_path, sqlite_file_db, remote, monkeypatch):
+    member = sqlite_file_db.add_member("Ada Reader")
+    book = sqlite_file_db.add_book("Dune", copies=2)
+    a, b = copies_of(sqlite_file_db, book)
+    wb = lib.WriteBehindDB(remote, path=str(tmp_path / "desk.sqlite3"), start=False)
+    try:
+        wb.issue_copy(a, member)
+        wb.issue_any_copy(book, 999999)
+        wb.issue_copy(b, member)
+        apply_ops = sqlite_file_db.apply_ops
+
+        def busy(ops):
+            raise lib.PoolTimeout("no free connection")
+        monkeypatch.setattr(sqlite_file_db, "apply_ops", busy)
+        for _ in range(lib.WRITE_BEHIND_MAX_ATTEMPTS + 2):
+            with pytest.raises(lib.ServiceUnavailable):
+                wb.flush()
+        assert (wb.status()['pending'], wb.status()['failed']) == (3, 0)
+
+        def broken_for_b(ops):
+            if any(op['args'].get('copy_id') == b for op in ops):
+                raise TypeError("cannot apply")
+            return apply_ops(ops)
+        monkeypatch.setattr(sqlite_file_db, "apply_ops", broken_for_b)
+        for _ in range(lib.WRITE_BEHIND_MAX_ATTEMPTS - 1):
+            with pytest.raises(RuntimeError, match="server error 500"):
+                wb.flush()
+        assert outcomes(wb) == [("issue", "done"), ("issue_any", "conflict")]
+        assert wb.flush() == 0
+        assert outcomes(wb) == [("issue", "failed")]
+        status = wb.status()
+        assert (status['pending'], status['synced'], status['conflicts'], status['failed']) == (0, 1, 1, 1)
+    finally:
+        wb.close()